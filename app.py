@@ -8,18 +8,16 @@ Run: streamlit run checklist_monitor.py
 
 from pathlib import Path
 from datetime import datetime, time, timedelta
-import json
-import shutil
-import tempfile
-import zipfile
-import os
+import uuid
 
 import numpy as np
 import pandas as pd
 import streamlit as st
-import plotly.express as px
 import plotly.graph_objects as go
 
+from checklist_core import *  # noqa: F401,F403  (storage, anomaly and backup functions)
+from checklist_core import _backup_store, _frame_cache, _journal, _registry
+
 # -------------------- Configuration --------------------
 APP_TITLE = "CheckList"
 APP_SUBTITLE = "Equipment Monitoring Platform"
@@ -606,167 +604,60 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# -------------------- Core Functions --------------------
-BASE_DIR = Path.cwd()
-LOG_DIR = BASE_DIR / "logs"
-BACKUP_DIR = BASE_DIR / "backups"
-META_FILE = BASE_DIR / "equipment_meta.json"
-LOG_DIR.mkdir(exist_ok=True)
-BACKUP_DIR.mkdir(exist_ok=True)
-
-WIDE_COLUMNS = [
-    "timestamp", "date", "hour",
-    "equipment_type", "equipment_id",
-    "pressure", "temperature", "flow_rate",
-    "valve_status", "leak_observed", "tank_level",
-    "operator", "note", "created_at", "version", "alarm_flag"
-]
-
-PLACEHOLDER_IDS = list(range(1, 11))
-
-PARAM_SPECS = {
-    "Pipeline": {
-        "pressure": ("float", "psi", 0.0, 3000.0),
-        "temperature": ("float", "°C", -40.0, 200.0),
-        "flow_rate": ("float", "bbl/hr", 0.0, 100000.0),
-        "valve_status": ("categorical", "state", None, None),
-        "leak_observed": ("categorical", "yesno", None, None),
-        "tank_level": ("float", "m", 0.0, 50.0)
-    },
-    "Vessel": {
-        "pressure": ("float", "psi", 0.0, 5000.0),
-        "temperature": ("float", "°C", -40.0, 400.0),
-        "tank_level": ("float", "m", 0.0, 50.0),
-        "vapor_o2": ("float", "%", 0.0, 100.0)
-    },
-    "Tank": {
-        "tank_level": ("float", "m", 0.0, 50.0),
-        "temperature": ("float", "°C", -20.0, 120.0),
-        "valve_status": ("categorical", "state", None, None)
-    },
-    "Separator": {
-        "pressure": ("float", "psi", 0.0, 5000.0),
-        "oil_level": ("float", "m", 0.0, 10.0),
-        "gas_flow_rate": ("float", "m³/hr", 0.0, 200000.0)
-    }
-}
-
-EQUIPMENT_TYPES = list(PARAM_SPECS.keys())
-
-def equipment_filename(equipment_type: str, equipment_id: int) -> Path:
-    safe = equipment_type.replace(" ", "_")
-    return LOG_DIR / f"{safe}_{int(equipment_id)}.csv"
-
-def load_meta():
-    if not META_FILE.exists():
-        return {}
-    try:
-        return json.loads(META_FILE.read_text())
-    except Exception:
-        return {}
-
-def save_meta(meta: dict):
-    META_FILE.write_text(json.dumps(meta, indent=2))
-
-meta = load_meta()
-
-def init_equipment(equipment_type: str, equipment_id: int):
-    fn = equipment_filename(equipment_type, equipment_id)
-    if not fn.exists():
-        pd.DataFrame(columns=WIDE_COLUMNS).to_csv(fn, index=False)
-    key = f"{equipment_type}_{equipment_id}"
-    if key not in meta:
-        params = {}
-        for p, spec in PARAM_SPECS.get(equipment_type, {}).items():
-            dtype, unit, mn, mx = spec
-            params[p] = {"dtype": dtype, "unit": unit, "min": mn, "max": mx}
-        meta[key] = {
-            "equipment_type": equipment_type,
-            "equipment_id": int(equipment_id),
-            "params": params,
-            "created": datetime.utcnow().isoformat()
-        }
-        save_meta(meta)
-    return fn
-
-def load_equipment_log(equipment_type: str, equipment_id: int) -> pd.DataFrame:
-    fn = equipment_filename(equipment_type, equipment_id)
-    if not fn.exists():
-        init_equipment(equipment_type, equipment_id)
-    try:
-        df = pd.read_csv(fn, parse_dates=["timestamp"])
-    except Exception:
-        df = pd.read_csv(fn)
-        if "timestamp" in df.columns:
-            df["timestamp"] = pd.to_datetime(df["timestamp"], errors='coerce')
-    return df
-
-def append_equipment_row(equipment_type: str, equipment_id: int, row: dict):
-    fn = init_equipment(equipment_type, equipment_id)
-    for c in WIDE_COLUMNS:
-        if c not in row:
-            row[c] = None
-    df_row = pd.DataFrame([row], columns=WIDE_COLUMNS)
-    header = not fn.exists() or fn.stat().st_size == 0
-    df_row.to_csv(fn, mode='a', header=header, index=False)
-    return True
-
-def validate_row(equipment_type: str, row: dict):
-    msgs = []
-    specs = PARAM_SPECS.get(equipment_type, {})
-    ok = True
-    for p, spec in specs.items():
-        dtype, unit, mn, mx = spec
-        val = row.get(p)
-        if val is None or (isinstance(val, str) and str(val).strip() == ""):
-            msgs.append(f"{p} is empty")
-            ok = False
-            continue
-        if dtype == "float":
-            try:
-                v = float(val)
-                if mn is not None and v < mn:
-                    msgs.append(f"{p}: {v} below min {mn}")
-                    ok = False
-                if mx is not None and v > mx:
-                    msgs.append(f"{p}: {v} above max {mx}")
-                    ok = False
-            except Exception:
-                msgs.append(f"{p}: not numeric")
-                ok = False
-    return ok, msgs
-
-def detect_anomalies(equipment_type: str, df: pd.DataFrame, param: str, z_thresh: float = 3.0, window: int = 24):
-    if df.empty or param not in df.columns:
-        return pd.Series([False] * len(df), index=df.index)
-    s = pd.to_numeric(df[param], errors='coerce')
-    if s.isna().all():
-        return pd.Series([False] * len(df), index=df.index)
-    anomalies = pd.Series(False, index=df.index)
-    key = f"{equipment_type}_{int(df['equipment_id'].iloc[0])}" if 'equipment_id' in df.columns and not df.empty else None
-    mm = load_meta()
-    static_min = static_max = None
-    if key and key in mm and param in mm[key]['params']:
-        pmeta = mm[key]['params'][param]
-        static_min, static_max = pmeta.get('min'), pmeta.get('max')
-    if static_min is not None:
-        anomalies |= (s < static_min)
-    if static_max is not None:
-        anomalies |= (s > static_max)
-    if s.dropna().shape[0] >= max(5, min(window, 5)):
-        roll_mean = s.rolling(window=min(window, len(s)), min_periods=1).mean()
-        roll_std = s.rolling(window=min(window, len(s)), min_periods=1).std().replace(0, np.nan)
-        z = (s - roll_mean) / roll_std
-        anomalies |= z.abs() > z_thresh
-    return anomalies.fillna(False)
-
 # -------------------- Session State --------------------
 if "viz_selection" not in st.session_state:
     st.session_state.viz_selection = {"type": None, "id": None, "param": None}
 if "show_details" not in st.session_state:
     st.session_state.show_details = False
+if "timings" not in st.session_state:
+    st.session_state.timings = {}
+    st.session_state.reruns = []
+    st.session_state.session_tag = uuid.uuid4().hex[:6]
+    st.session_state.profile_next = False
+    st.session_state.last_profile = None
+
+start_rerun(session=st.session_state.session_tag, profile=st.session_state.profile_next)
+st.session_state.profile_next = False
+
+def end_rerun(label: str):
+    """Close this rerun's timing trace and keep it for the Diagnostics tab."""
+    record = finish_rerun(label)
+    if record is None:
+        return
+    profile = record.pop("profile", None)
+    if profile:
+        st.session_state.last_profile = {"label": label, "started": record["started"], **profile}
+    fold_rerun(record, st.session_state.timings)
+    st.session_state.reruns = (st.session_state.reruns + [record])[-RERUN_HISTORY:]
+
+def offer_download(label: str, path: Path, file_name: str, mime: str):
+    """Download button for a prepared export; draw it only on the rerun that built the file.
+
+    Streamlit reads the whole file into memory to serve it, so a button kept in
+    session state would re-read it on every later rerun. on_click="ignore"
+    keeps the click from rerunning, so the button stays until the next interaction.
+    """
+    size = path.stat().st_size
+    if size > EXPORT_DOWNLOAD_MAX_BYTES:
+        st.warning(f"{size / 2**20:.1f} MB is over the {EXPORT_DOWNLOAD_MAX_BYTES / 2**20:.0f} MB download limit "
+                   f"(CHECKLIST_DOWNLOAD_MAX_MB); fetch it from the server at {path} within {EXPORT_TTL_S // 60} min")
+        return
+    with open(path, "rb") as fh:
+        st.download_button(label, data=fh, file_name=file_name, mime=mime, on_click="ignore", use_container_width=True)
+
+def select_equipment(equipment_type: str, key: str, search_in=st, select_in=st):
+    """Registry search box plus an ID selectbox of the matches; None when nothing matches."""
+    query = search_in.text_input("Search", key=f"{key}_search", placeholder="ID, site or tag")
+    found = find_equipment(equipment_type, query)
+    labels = {r["equipment_id"]: " · ".join(str(v) for v in (r["equipment_id"], r["site"], r["tags"]) if v) for r in found}
+    equipment_id = select_in.selectbox("Equipment ID", options=list(labels), format_func=labels.get, key=key,
+                                       placeholder="No matching equipment")
+    if len(found) == REGISTRY_PAGE:
+        select_in.caption(f"First {REGISTRY_PAGE} of {_registry().count(equipment_type, query):,} matches; refine the search")
+    return equipment_id
 
 # -------------------- Header --------------------
+section("Header")
 current_time = datetime.now().strftime("%H:%M:%S")
 st.markdown(f"""
     <div class="app-header">
@@ -790,11 +681,13 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # -------------------- Sidebar --------------------
+section("Sidebar")
 with st.sidebar:
     st.markdown('<div class="sidebar-header">', unsafe_allow_html=True)
     
-    files = list(LOG_DIR.glob("*.csv"))
-    backups = len(list(BACKUP_DIR.glob("*.csv")))
+    manifest = refresh_manifest()
+    registered = _registry().count()
+    backups = len(_backup_store().snapshot_ids())
     
     st.markdown(f"""
         <div style="text-align: center; margin-bottom: 0.75rem;">
@@ -806,7 +699,7 @@ with st.sidebar:
                 <div style="padding: 0.375rem 0.75rem; background: var(--accent-light); 
                             border-radius: var(--radius-sm); font-size: 0.7rem; font-weight: 600; 
                             color: var(--accent-primary);">
-                    {len(files)} Files
+                    {registered} Equipment
                 </div>
                 <div style="padding: 0.375rem 0.75rem; background: var(--bg-tertiary); 
                             border-radius: var(--radius-sm); font-size: 0.7rem; font-weight: 600; 
@@ -824,7 +717,7 @@ with st.sidebar:
     
     nav = st.radio(
         "nav",
-        ["Dashboard", "Data Entry", "Analytics", "Import Data", "Settings", "Administration"],
+        ["Dashboard", "Data Entry", "Analytics", "Fleet", "Import Data", "Settings", "Administration"],
         label_visibility="collapsed"
     )
     
@@ -834,13 +727,7 @@ with st.sidebar:
     st.markdown('<div class="sidebar-section">', unsafe_allow_html=True)
     st.markdown('<div class="sidebar-title">Quick Stats</div>', unsafe_allow_html=True)
     
-    total_records = 0
-    for f in files:
-        try:
-            df = pd.read_csv(f)
-            total_records += len(df)
-        except:
-            pass
+    total_records = total_record_count(manifest)
     
     st.markdown(f"""
         <div class="stats-grid">
@@ -869,6 +756,7 @@ with st.sidebar:
 
 # -------------------- Pages --------------------
 if nav == "Dashboard":
+    section("Dashboard: metrics")
     st.markdown("""
         <div class="page-header">
             <h1 class="page-title">Dashboard</h1>
@@ -877,14 +765,14 @@ if nav == "Dashboard":
     """, unsafe_allow_html=True)
     
     # Metrics
-    total_equips = len(files)
+    total_equips = registered
     
     st.markdown(f"""
         <div class="metric-grid">
             <div class="metric-card">
                 <div class="metric-label">Active Equipment</div>
                 <div class="metric-value">{total_equips}</div>
-                <div class="metric-trend">↑ {total_equips} tracked</div>
+                <div class="metric-trend">↑ {len(manifest)} with logs</div>
             </div>
             <div class="metric-card">
                 <div class="metric-label">Equipment Types</div>
@@ -905,47 +793,52 @@ if nav == "Dashboard":
     col1, col2 = st.columns([2, 1])
     
     with col1:
+        section("Dashboard: recent activity")
         st.markdown('<div class="card"><h3 class="card-title">Recent Activity</h3></div>', unsafe_allow_html=True)
         
-        latest_rows = []
-        with st.spinner("Loading..."):
-            for f in files:
-                try:
-                    df = pd.read_csv(f)
-                    if 'timestamp' in df.columns:
-                        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-                    if df.empty:
-                        continue
-                    if 'timestamp' in df.columns and df['timestamp'].notna().any():
-                        idx = df['timestamp'].idxmax()
-                        r = df.loc[[idx]].copy()
-                    else:
-                        r = df.tail(1).copy()
-                    latest_rows.append(r)
-                except:
-                    continue
+        activity = st.empty()
         
-        if latest_rows:
+        def show_activity(rows):
             try:
-                df_latest = pd.concat(latest_rows, ignore_index=True)
+                df_latest = pd.DataFrame(rows)
+                if 'equipment_id' in df_latest.columns:
+                    df_latest['equipment_id'] = pd.to_numeric(df_latest['equipment_id'], errors='coerce').astype('Int64')
                 if 'timestamp' in df_latest.columns:
                     df_latest['timestamp'] = pd.to_datetime(df_latest['timestamp'], errors='coerce')
                     df_latest = df_latest.sort_values('timestamp', ascending=False, na_position='last')
                 show_cols = [c for c in ['timestamp','equipment_type','equipment_id','operator'] if c in df_latest.columns]
-                st.dataframe(df_latest[show_cols].head(15), use_container_width=True, height=500)
+                activity.dataframe(df_latest[show_cols].head(15), use_container_width=True, height=500)
             except Exception as e:
-                st.error(f"Error: {e}")
-        else:
-            st.info("No entries available")
+                activity.error(f"Error: {e}")
+        
+        latest_rows = []
+        shown_at = 0
+        for row in iter_latest_readings(manifest):
+            latest_rows.append(row)
+            # Redraw as tail reads finish, doubling the batch each time.
+            if len(latest_rows) >= max(2 * shown_at, 15):
+                shown_at = len(latest_rows)
+                show_activity(latest_rows)
+        
+        if not latest_rows:
+            activity.info("No entries available")
+        elif shown_at != len(latest_rows):
+            show_activity(latest_rows)
+        
+        failed = load_errors()
+        if failed:
+            with st.expander(f"{len(failed)} logs could not be read"):
+                st.dataframe(pd.DataFrame([{"log": k, **v} for k, v in sorted(failed.items())]), use_container_width=True, hide_index=True)
     
     with col2:
+        section("Dashboard: distribution")
         st.markdown('<div class="card"><h3 class="card-title">Equipment Distribution</h3></div>', unsafe_allow_html=True)
         
-        eq_counts = {}
-        for eq_type in EQUIPMENT_TYPES:
-            count = len(list(LOG_DIR.glob(f"{eq_type.replace(' ', '_')}_*.csv")))
-            if count > 0:
-                eq_counts[eq_type] = count
+        eq_counts = equipment_counts()
+        site_counts = equipment_counts("site")
+        if len(site_counts) > 1 or None not in site_counts:
+            top_sites = sorted(site_counts.items(), key=lambda kv: -kv[1])[:10]
+            eq_counts = {**eq_counts, **{f"Site: {site or 'unassigned'}": count for site, count in top_sites}}
         
         if eq_counts:
             for eq_type, count in eq_counts.items():
@@ -963,6 +856,7 @@ if nav == "Dashboard":
                 """, unsafe_allow_html=True)
 
 elif nav == "Data Entry":
+    section("Data Entry")
     st.markdown("""
         <div class="page-header">
             <h1 class="page-title">Data Entry</h1>
@@ -972,22 +866,20 @@ elif nav == "Data Entry":
     
     st.markdown('<div class="card"><h3 class="card-title">Equipment Selection</h3>', unsafe_allow_html=True)
     
-    col1, col2, col3 = st.columns([2, 2, 1])
+    col1, col2, col3 = st.columns([2, 2, 2])
     
     with col1:
         equipment_type = st.selectbox("Equipment Type", options=EQUIPMENT_TYPES, key="entry_type")
     
-    with col2:
-        equipment_id = st.selectbox("Equipment ID", options=PLACEHOLDER_IDS, key="entry_id")
-    
-    with col3:
-        st.markdown('<div style="padding-top: 1.6rem;"></div>', unsafe_allow_html=True)
-        if st.button("Initialize", use_container_width=True):
-            init_equipment(equipment_type, equipment_id)
-            st.success(f"Initialized {equipment_type} {equipment_id}")
+    equipment_id = select_equipment(equipment_type, "entry_id", search_in=col2, select_in=col3)
     
     st.markdown('</div>', unsafe_allow_html=True)
     
+    if equipment_id is None:
+        st.info("No matching equipment. Register equipment under Settings.")
+        end_rerun(nav)
+        st.stop()
+    
     with st.form("entry_form", clear_on_submit=False):
         st.markdown('<div class="form-section"><h4 class="form-section-title">Entry Details</h4>', unsafe_allow_html=True)
         
@@ -1069,8 +961,11 @@ elif nav == "Data Entry":
                 st.warning("Warnings: " + "; ".join(messages))
             else:
                 st.success(f"Entry saved for {equipment_type} {equipment_id}")
+            if row["alarm_flag"]:
+                st.error(f"Alarm raised: reading is anomalous for {equipment_type} {equipment_id}")
 
 elif nav == "Analytics":
+    section("Analytics: controls")
     st.markdown("""
         <div class="page-header">
             <h1 class="page-title">Analytics Dashboard</h1>
@@ -1084,35 +979,29 @@ elif nav == "Analytics":
         st.markdown('<div class="card"><h3 class="card-title">Configuration</h3>', unsafe_allow_html=True)
         
         equipment_type = st.selectbox("Equipment Type", options=EQUIPMENT_TYPES, key="viz_type")
-        equipment_id = st.selectbox("Equipment ID", options=PLACEHOLDER_IDS, key="viz_id")
-        
-        try:
-            df = load_equipment_log(equipment_type, equipment_id)
-            if not df.empty and 'timestamp' in df.columns:
-                df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-        except Exception as e:
-            st.error(f"Failed: {e}")
-            df = pd.DataFrame()
+        equipment_id = select_equipment(equipment_type, "viz_id")
         
-        if df.empty:
+        entry = manifest.get(log_key(equipment_type, equipment_id)) if equipment_id is not None else None
+        if not entry or not entry.get("rows"):
             st.info("No data available")
             st.markdown('</div>', unsafe_allow_html=True)
+            end_rerun(nav)
             st.stop()
         
-        candidate_cols = [c for c in df.columns if c not in ["timestamp","date","hour","equipment_type","equipment_id","operator","note","created_at","version","alarm_flag"]]
+        candidate_cols = [c for c in WIDE_COLUMNS if c not in NON_PARAM_COLUMNS]
         
         if not candidate_cols:
             st.warning("No parameters found")
             st.markdown('</div>', unsafe_allow_html=True)
+            end_rerun(nav)
             st.stop()
         
         param = st.selectbox("Parameter", options=candidate_cols, key="viz_param")
         
         st.markdown("---")
         
-        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-        min_dt = df['timestamp'].min().date() if not df['timestamp'].isna().all() else datetime.now().date()
-        max_dt = df['timestamp'].max().date() if not df['timestamp'].isna().all() else datetime.now().date()
+        min_dt = pd.Timestamp(entry["first_ts"]).date() if entry.get("first_ts") else datetime.now().date()
+        max_dt = pd.Timestamp(entry["last_ts"]).date() if entry.get("last_ts") else datetime.now().date()
         
         start_date = st.date_input("Start Date", value=max(min_dt, max_dt - timedelta(days=7)), min_value=min_dt, max_value=max_dt)
         end_date = st.date_input("End Date", value=max_dt, min_value=min_dt, max_value=max_dt)
@@ -1121,6 +1010,8 @@ elif nav == "Analytics":
         
         z_thresh = st.slider("Threshold", 1.0, 5.0, 3.0, 0.5)
         window = st.slider("Window (hrs)", 3, 168, 24)
+        resolution = st.selectbox("Resolution", options=["Auto", "Raw"] + [t.capitalize() for t in ROLLUP_TIERS], key="viz_resolution",
+                                  help="Auto plots raw readings when they fit the chart, otherwise the finest rollup that does")
         
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -1129,50 +1020,204 @@ elif nav == "Analytics":
             try:
                 sdt = datetime.combine(start_date, time(0,0,0))
                 edt = datetime.combine(end_date, time(23,59,59))
-                mask = (df['timestamp'] >= sdt) & (df['timestamp'] <= edt)
-                dff = df.loc[mask].sort_values('timestamp').reset_index(drop=True)
+                tier = rollup_tier(entry, sdt, edt) if resolution == "Auto" else resolution.lower()
+                if param not in rollup_params(equipment_type):
+                    tier = "raw"
+                
+                section("Analytics: load")
+                if tier == "raw":
+                    dff = load_equipment_log(equipment_type, equipment_id, start=sdt, end=edt)
+                    dff = dff.sort_values('timestamp').reset_index(drop=True)
+                else:
+                    dff = load_rollup(equipment_type, equipment_id, tier, param, start=sdt, end=edt)
                 
                 if dff.empty:
                     st.info("No records in range")
+                elif tier != "raw":
+                    section("Analytics: chart")
+                    dff['anomaly'] = dff['alarms'] > 0
+                    
+                    fig = go.Figure()
+                    fig.add_trace(go.Scatter(x=dff['timestamp'], y=dff['max'], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+                    fig.add_trace(go.Scatter(x=dff['timestamp'], y=dff['min'], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(37,99,235,0.15)', name='Min–Max'))
+                    fig.add_trace(go.Scatter(x=dff['timestamp'], y=dff['mean'], mode='lines', name=f"{param} ({tier} mean)", line=dict(color='#2563eb', width=2.5)))
+                    
+                    if dff['anomaly'].any():
+                        fig.add_trace(go.Scatter(x=dff.loc[dff['anomaly'],'timestamp'], y=dff.loc[dff['anomaly'],'max'], mode='markers', name='Alarms', marker=dict(color='#ef4444', size=10, symbol='x')))
+                    
+                    fig.update_layout(title=f"{equipment_type} {equipment_id} — {param}", xaxis_title="Time", yaxis_title=param, template="plotly_white", height=450, font=dict(family='Montserrat'))
+                    
+                    st.plotly_chart(fig, use_container_width=True)
+                    n = int(dff['count'].sum())
+                    st.caption(f"{tier.capitalize()} rollup: {len(dff):,} buckets summarizing {n:,} readings; alarms are those raised at write time")
+                    
+                    mean = dff['sum'].sum() / n
+                    var = (dff['sumsq'].sum() - n * mean ** 2) / (n - 1) if n > 1 else float('nan')
+                    col_a, col_b, col_c, col_d = st.columns(4)
+                    col_a.metric("Mean", f"{mean:.2f}")
+                    col_b.metric("Std", f"{np.sqrt(max(var, 0)):.2f}")
+                    col_c.metric("Min", f"{dff['min'].min():.2f}")
+                    col_d.metric("Alarms", f"{int(dff['alarms'].sum())}")
+                    
+                    if n > 1:
+                        section("Analytics: histogram")
+                        edges, counts, under, over = range_histogram(equipment_type, equipment_id, param, sdt, edt)
+                        hist = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), marker_color='#2563eb', name=param))
+                        hist.update_layout(title=f"{param} Distribution", xaxis_title=param, yaxis_title="count", bargap=0, template="plotly_white", font=dict(family='Montserrat'), height=350)
+                        st.plotly_chart(hist, use_container_width=True)
+                        if under or over:
+                            st.caption(f"Outside spec range: {under:,} below, {over:,} above")
                 else:
+                    section("Analytics: anomalies")
                     dff['_val'] = pd.to_numeric(dff[param], errors='coerce')
                     has_numeric = dff['_val'].notna().any()
                     anomalies = detect_anomalies(equipment_type, dff, param, z_thresh=z_thresh, window=window) if has_numeric else pd.Series([False]*len(dff))
                     dff['anomaly'] = anomalies
                     
                     if has_numeric:
+                        section("Analytics: chart")
+                        flagged = dff['anomaly'].to_numpy(dtype=bool)
+                        n_points = int(dff['_val'].notna().sum())
+                        shown = dff.iloc[downsample_minmax(dff['timestamp'].to_numpy(), dff['_val'].to_numpy(dtype=float), keep=flagged)]
+                        Trace = go.Scattergl if n_points > WEBGL_POINTS else go.Scatter
+                        reduced = len(shown) < n_points
+                    
                         fig = go.Figure()
-                        fig.add_trace(go.Scatter(x=dff['timestamp'], y=dff['_val'], mode='lines+markers', name=param, line=dict(color='#2563eb', width=2.5)))
-                        
-                        if dff['anomaly'].any():
-                            fig.add_trace(go.Scatter(x=dff.loc[dff['anomaly'],'timestamp'], y=dff.loc[dff['anomaly'],'_val'], mode='markers', name='Anomaly', marker=dict(color='#ef4444', size=12, symbol='x')))
-                        
+                        fig.add_trace(Trace(x=shown['timestamp'], y=shown['_val'], mode='lines' if reduced else 'lines+markers', name=param, line=dict(color='#2563eb', width=2.5)))
+                    
+                        if flagged.any():
+                            fig.add_trace(Trace(x=dff.loc[flagged,'timestamp'], y=dff.loc[flagged,'_val'], mode='markers', name='Anomaly', marker=dict(color='#ef4444', size=12, symbol='x')))
+                    
                         fig.update_layout(title=f"{equipment_type} {equipment_id} — {param}", xaxis_title="Time", yaxis_title=param, template="plotly_white", height=450, font=dict(family='Montserrat'))
-                        
+                    
                         st.plotly_chart(fig, use_container_width=True)
-                        
+                        if reduced:
+                            st.caption(f"Showing {len(shown):,} of {n_points:,} points ({1 - len(shown) / n_points:.1%} reduction; min/max per time bucket, all anomalies kept)"
+                                       + (" · WebGL" if Trace is go.Scattergl else ""))
+                    
                         col_a, col_b, col_c, col_d = st.columns(4)
                         col_a.metric("Mean", f"{dff['_val'].mean():.2f}")
                         col_b.metric("Std", f"{dff['_val'].std():.2f}")
                         col_c.metric("Min", f"{dff['_val'].min():.2f}")
                         col_d.metric("Anomalies", f"{dff['anomaly'].sum()}")
-                        
+                    
                         if dff['_val'].dropna().shape[0] > 1:
-                            hist = px.histogram(dff, x='_val', nbins=30, title=f"{param} Distribution", color_discrete_sequence=['#2563eb'])
-                            hist.update_layout(template="plotly_white", font=dict(family='Montserrat'), height=350)
+                            section("Analytics: histogram")
+                            edges, counts, under, over = range_histogram(equipment_type, equipment_id, param, sdt, edt, frame=dff)
+                            hist = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), marker_color='#2563eb', name=param))
+                            hist.update_layout(title=f"{param} Distribution", xaxis_title=param, yaxis_title="count", bargap=0, template="plotly_white", font=dict(family='Montserrat'), height=350)
                             st.plotly_chart(hist, use_container_width=True)
+                            if under or over:
+                                st.caption(f"Outside spec range: {under:,} below, {over:,} above")
                     
+                if not dff.empty:
+                    section("Analytics: preview")
                     st.markdown('<div class="card"><h3 class="card-title">Data Preview</h3>', unsafe_allow_html=True)
-                    display_cols = ['timestamp', param, 'anomaly']
+                    display_cols = ['timestamp', param, 'anomaly'] if tier == "raw" else ['timestamp', 'count', 'mean', 'min', 'max', 'alarms']
                     st.dataframe(dff[display_cols].tail(25), use_container_width=True, height=400)
                     st.markdown('</div>', unsafe_allow_html=True)
                     
-                    csv_data = dff.to_csv(index=False).encode('utf-8')
-                    st.download_button("Export Data", data=csv_data, file_name=f"export_{equipment_type}_{equipment_id}.csv", use_container_width=True)
+                    exp_a, exp_b = st.columns([1, 2])
+                    export_fmt = exp_a.selectbox("Format", options=list(EXPORT_FORMATS), key="export_fmt", label_visibility="collapsed")
+                    if exp_b.button("Prepare Export", use_container_width=True):
+                        with st.spinner("Writing export..."):
+                            path = write_export(dff, export_fmt, prefix=log_key(equipment_type, equipment_id))
+                        suffix, mime = EXPORT_FORMATS[export_fmt]
+                        offer_download("Export Data", path, f"export_{equipment_type}_{equipment_id}{suffix}", mime)
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+elif nav == "Fleet":
+    section("Fleet: controls")
+    st.markdown("""
+        <div class="page-header">
+            <h1 class="page-title">Fleet Comparison</h1>
+            <p class="page-subtitle">Compare equipment of one type on a common time grid</p>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        st.markdown('<div class="card"><h3 class="card-title">Configuration</h3>', unsafe_allow_html=True)
+        
+        fleet_type = st.selectbox("Equipment Type", options=EQUIPMENT_TYPES, key="fleet_type")
+        fleet_site = st.selectbox("Site", options=[None] + _registry().sites(), format_func=lambda s: s or "All sites", key="fleet_site")
+        fleet_tag = st.selectbox("Tag", options=[None] + _registry().tags(), format_func=lambda t: t or "Any tag", key="fleet_tag")
+        fleet_manifest = manifest
+        if fleet_site or fleet_tag:
+            keys = (log_key(r["equipment_type"], r["equipment_id"]) for r in find_equipment(fleet_type, site=fleet_site, tag=fleet_tag, limit=None))
+            fleet_manifest = {k: manifest[k] for k in keys if k in manifest}
+        members = [e for e in fleet_manifest.values() if e["equipment_type"] == fleet_type and e.get("rows")]
+        fleet_params = rollup_params(fleet_type)
+        if not members or not fleet_params:
+            st.info("No data available")
+            st.markdown('</div>', unsafe_allow_html=True)
+            end_rerun(nav)
+            st.stop()
+        
+        fleet_param = st.selectbox("Parameter", options=fleet_params, key="fleet_param")
+        
+        st.markdown("---")
+        
+        firsts = [pd.Timestamp(e["first_ts"]) for e in members if e.get("first_ts")]
+        lasts = [pd.Timestamp(e["last_ts"]) for e in members if e.get("last_ts")]
+        min_dt = min(firsts).date() if firsts else datetime.now().date()
+        max_dt = max(lasts).date() if lasts else datetime.now().date()
+        
+        start_date = st.date_input("Start Date", value=max(min_dt, max_dt - timedelta(days=7)), min_value=min_dt, max_value=max_dt, key="fleet_start")
+        end_date = st.date_input("End Date", value=max_dt, min_value=min_dt, max_value=max_dt, key="fleet_end")
+        fleet_tier = st.selectbox("Grid", options=list(ROLLUP_TIERS), format_func=str.capitalize, key="fleet_tier")
+        bands = {"P5–P95": (5, 95), "P10–P90": (10, 90), "P25–P75": (25, 75)}
+        band = bands[st.select_slider("Band", options=list(bands), value="P10–P90", key="fleet_band")]
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    with col2:
+        with st.spinner("Aligning fleet..."):
+            try:
+                sdt = datetime.combine(start_date, time(0,0,0))
+                edt = datetime.combine(end_date, time(23,59,59))
+                section("Fleet: grid")
+                grid = fleet_grid(fleet_manifest, fleet_type, fleet_param, sdt, edt, tier=fleet_tier)
+                summary = fleet_summary(grid, band=band)
+                
+                if summary["reporting"].sum() == 0:
+                    st.info("No records in range")
+                else:
+                    section("Fleet: chart")
+                    fig = go.Figure()
+                    fig.add_trace(go.Scatter(x=summary.index, y=summary['high'], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+                    fig.add_trace(go.Scatter(x=summary.index, y=summary['low'], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(37,99,235,0.15)', name=f"P{band[0]}–P{band[1]}"))
+                    fig.add_trace(go.Scatter(x=summary.index, y=summary['median'], mode='lines', name='Median', line=dict(color='#2563eb', width=2.5)))
+                    fig.add_trace(go.Scatter(x=summary.index, y=summary['mean'], mode='lines', name='Mean', line=dict(color='#f59e0b', width=1.5, dash='dot')))
+                    fig.update_layout(title=f"{fleet_type} fleet — {fleet_param} ({fleet_tier})", xaxis_title="Time", yaxis_title=fleet_param, template="plotly_white", height=450, font=dict(family='Montserrat'))
+                    st.plotly_chart(fig, use_container_width=True)
+                    
+                    col_a, col_b, col_c, col_d = st.columns(4)
+                    col_a.metric("Equipment", f"{grid.shape[1]}")
+                    col_b.metric("Avg Reporting", f"{summary['reporting'].mean():.1f}")
+                    col_c.metric("Fleet Mean", f"{np.nanmean(grid.to_numpy(dtype=float)):.2f}")
+                    col_d.metric("Buckets", f"{len(summary):,}")
+                    
+                    section("Fleet: deviation")
+                    st.markdown('<div class="card"><h3 class="card-title">Most Deviating</h3>', unsafe_allow_html=True)
+                    st.dataframe(fleet_deviation(grid, summary).head(15).round(3), use_container_width=True, hide_index=True)
+                    st.markdown('</div>', unsafe_allow_html=True)
+                    
+                    if 1 < grid.shape[1] <= FLEET_CORR_MAX:
+                        section("Fleet: correlation")
+                        corr = fleet_correlation(grid)
+                        heat = go.Figure(go.Heatmap(z=corr.to_numpy(), x=[str(c) for c in corr.columns], y=[str(c) for c in corr.index], zmin=-1, zmax=1, colorscale='RdBu'))
+                        heat.update_layout(title=f"{fleet_param} Correlation", template="plotly_white", font=dict(family='Montserrat'), height=450)
+                        st.plotly_chart(heat, use_container_width=True)
+                    elif grid.shape[1] > FLEET_CORR_MAX:
+                        st.caption(f"Correlation matrix omitted above {FLEET_CORR_MAX} equipment")
             except Exception as e:
                 st.error(f"Error: {e}")
 
 elif nav == "Import Data":
+    section("Import Data")
     st.markdown("""
         <div class="page-header">
             <h1 class="page-title">Import Data</h1>
@@ -1191,44 +1236,35 @@ elif nav == "Import Data":
     
     if uploaded:
         try:
-            lf = pd.read_csv(uploaded)
-            required = {'timestamp','equipment_type','equipment_id','parameter','value'}
+            head = pd.read_csv(uploaded, nrows=15)
+            uploaded.seek(0)
+            required = set(IMPORT_COLUMNS)
             
-            if not required.issubset(set(lf.columns)):
-                st.error(f"Missing columns: {list(lf.columns)}")
+            if not required.issubset(set(head.columns)):
+                st.error(f"Missing columns: {list(head.columns)}")
             else:
                 st.markdown('<div class="card"><h3 class="card-title">Preview</h3>', unsafe_allow_html=True)
-                st.dataframe(lf.head(15), use_container_width=True)
+                st.dataframe(head, use_container_width=True)
                 st.markdown('</div>', unsafe_allow_html=True)
                 
+                streaming = st.toggle("Streaming import", value=uploaded.size >= STREAM_IMPORT_BYTES,
+                                      help=f"Read and write in chunks of {IMPORT_CHUNK_ROWS:,} rows to keep memory bounded")
+                
                 if st.button("Confirm Import", use_container_width=True):
-                    pivot = lf.pivot_table(index=['timestamp','equipment_type','equipment_id'], columns='parameter', values='value', aggfunc='first').reset_index()
-                    count = 0
                     progress = st.progress(0)
-                    
-                    for idx, r in pivot.iterrows():
-                        row = {k: None for k in WIDE_COLUMNS}
-                        row.update({
-                            'timestamp': r['timestamp'],
-                            'equipment_type': r['equipment_type'],
-                            'equipment_id': int(r['equipment_id']),
-                            'created_at': datetime.utcnow().isoformat(),
-                            'version': 'imported'
-                        })
-                        
-                        for p in PARAM_SPECS.get(r['equipment_type'], {}).keys():
-                            if p in pivot.columns:
-                                row[p] = r.get(p)
-                        
-                        append_equipment_row(r['equipment_type'], int(r['equipment_id']), row)
-                        count += 1
-                        progress.progress(min(count / len(pivot), 1.0))
+                    if streaming:
+                        count = stream_import_long(uploaded, progress=lambda r, w: progress.progress(
+                            min(uploaded.tell() / max(uploaded.size, 1), 1.0), text=f"{r:,} rows read, {w:,} written"))
+                    else:
+                        pivot = pivot_long(pd.read_csv(uploaded))
+                        count = import_pivoted(pivot, progress=lambda i, n, et, eid, k: progress.progress(i / n, text=f"{et} {eid}: {k} rows"))
                     
                     st.success(f"Imported {count} rows")
         except Exception as e:
             st.error(f"Import failed: {e}")
 
 elif nav == "Settings":
+    section("Settings")
     st.markdown("""
         <div class="page-header">
             <h1 class="page-title">Settings</h1>
@@ -1241,20 +1277,40 @@ elif nav == "Settings":
     with col1:
         st.markdown('<div class="card"><h3 class="card-title">Selection</h3>', unsafe_allow_html=True)
         etype = st.selectbox("Equipment Type", options=EQUIPMENT_TYPES)
-        eid = st.selectbox("Equipment ID", options=PLACEHOLDER_IDS)
+        eid = select_equipment(etype, "settings_id")
+        
+        if eid is not None:
+            details = _registry().get(etype, eid) or {}
+            site = st.text_input("Site", value=details.get("site") or "", key=f"site_{etype}_{eid}")
+            tags = st.text_input("Tags", value=details.get("tags", ""), key=f"tags_{etype}_{eid}", help="Comma-separated")
+            if st.button("Save Details", use_container_width=True):
+                _registry().update(etype, eid, site=site, tags=tags)
+                st.success("Saved")
+            st.caption(f"Registered {details.get('created', '')[:19].replace('T', ' ')}")
+        st.markdown('</div>', unsafe_allow_html=True)
         
-        if st.button("Initialize", use_container_width=True):
-            init_equipment(etype, eid)
-            st.success(f"Initialized {etype} {eid}")
+        st.markdown('<div class="card"><h3 class="card-title">Register Equipment</h3>', unsafe_allow_html=True)
+        new_id = int(st.number_input("New Equipment ID", min_value=1, step=1, value=_registry().next_id(etype)))
+        new_site = st.text_input("Site", key="register_site")
+        new_tags = st.text_input("Tags", key="register_tags", help="Comma-separated")
+        if st.button("Register", use_container_width=True):
+            added = register_equipment(etype, new_id, site=new_site, tags=new_tags)
+            init_equipment(etype, new_id)  # also fills in a log or metadata that is missing
+            if added:
+                st.success(f"Registered {etype} {new_id}")
+            else:
+                st.warning(f"{etype} {new_id} is already registered; its log and metadata are in place")
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
         key = f"{etype}_{eid}"
-        mm = load_meta()
-        pmeta = mm.get(key, {}).get('params', {}) if key in mm else {}
+        emeta = (get_meta(key) or {}) if eid is not None else {}
+        pmeta = emeta.get('params', {})
         
-        if not pmeta:
-            st.info("No metadata. Initialize first.")
+        if eid is None:
+            st.info("No matching equipment for this type. Add it with Register Equipment.")
+        elif not pmeta:
+            st.info(f"No parameter metadata for {etype} {eid}. Enter ID {eid} under Register Equipment to create it.")
         else:
             st.markdown('<div class="card"><h3 class="card-title">Parameters</h3>', unsafe_allow_html=True)
             
@@ -1265,20 +1321,28 @@ elif nav == "Settings":
                 mx = c2.text_input(f"Max {p}", value=str(v.get('max') if v.get('max') else ""), key=f"max_{p}")
                 
                 try:
-                    mm[key]['params'][p]['min'] = float(mn) if mn.strip() else None
+                    pmeta[p]['min'] = float(mn) if mn.strip() else None
                 except:
-                    mm[key]['params'][p]['min'] = None
+                    pmeta[p]['min'] = None
                 try:
-                    mm[key]['params'][p]['max'] = float(mx) if mx.strip() else None
+                    pmeta[p]['max'] = float(mx) if mx.strip() else None
                 except:
-                    mm[key]['params'][p]['max'] = None
+                    pmeta[p]['max'] = None
+            
+            st.markdown("**Write-time alarms**")
+            window_cfg, z_cfg = online_settings(emeta)
+            c1, c2 = st.columns(2)
+            online_window = c1.number_input("Alarm window (readings)", min_value=3, max_value=168, value=window_cfg, key="online_window")
+            online_z = c2.number_input("Alarm threshold (z)", min_value=1.0, max_value=5.0, value=z_cfg, step=0.5, key="online_z")
+            emeta["online"] = {"window": int(online_window), "z_thresh": float(online_z)}
             
             if st.button("Save Config", use_container_width=True):
-                save_meta(mm)
+                put_meta(key, emeta)
                 st.success("Saved")
             st.markdown('</div>', unsafe_allow_html=True)
 
 elif nav == "Administration":
+    section("Administration")
     st.markdown("""
         <div class="page-header">
             <h1 class="page-title">Administration</h1>
@@ -1286,45 +1350,211 @@ elif nav == "Administration":
         </div>
     """, unsafe_allow_html=True)
     
-    tab1, tab2 = st.tabs(["Files", "Backups"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Files", "Backups", "Storage", "Cache", "Diagnostics"])
     
     with tab1:
         st.markdown('<div class="card"><h3 class="card-title">Equipment Files</h3>', unsafe_allow_html=True)
         
-        if files:
-            sel = st.selectbox("Select File", options=[f.name for f in files])
+        if manifest:
+            sel = st.selectbox("Select File", options=sorted(manifest), format_func=lambda k: manifest[k]["file"])
+            sel_type, sel_id = parse_log_key(sel)
+            fn = STORAGE.path(sel_type, sel_id)
             
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("Backup", use_container_width=True):
-                    fn = LOG_DIR / sel
-                    ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-                    dest = BACKUP_DIR / f"{fn.stem}_{ts}.csv"
-                    shutil.copy(fn, dest)
-                    st.success(f"Backed up")
+                    snap = _backup_store().snapshot([sel])
+                    st.success(f"Backed up ({snap['added_bytes'] / 2**10:.1f} KB new)")
             
             with col2:
-                with open(LOG_DIR / sel, "rb") as fh:
-                    st.download_button("Download", data=fh, file_name=sel, use_container_width=True)
+                if st.button("Prepare Download", use_container_width=True):
+                    with st.spinner("Writing CSV..."):
+                        offer_download("Download", export_log_csv(sel_type, sel_id), f"{sel}.csv", "text/csv")
         else:
             st.info("No files")
         st.markdown('</div>', unsafe_allow_html=True)
     
     with tab2:
+        st.markdown('<div class="card"><h3 class="card-title">Snapshots</h3>', unsafe_allow_html=True)
+        store = _backup_store()
+        if st.button("Back Up Fleet", use_container_width=True, disabled=not manifest):
+            progress = st.progress(0)
+            snap = backup_fleet(manifest, progress=lambda i, n, key: progress.progress(i / n, text=key))
+            pruned = snap["pruned"]
+            st.success(f"Snapshot {snap['id']}: {len(snap['logs'])} logs, {snap['added_bytes'] / 2**20:.2f} MB new"
+                       + (f"; pruned {len(pruned['snapshots'])} snapshots ({pruned['freed_bytes'] / 2**20:.2f} MB)" if pruned["snapshots"] else ""))
+            for key, error in snap["errors"].items():
+                st.error(f"{key}: {error}")
+        snaps = store.snapshots()
+        col_a, col_b = st.columns(2)
+        col_a.metric("Snapshots", f"{len(snaps)}")
+        col_b.metric("Disk", f"{store.usage() / 2**20:.1f} MB" + (f" / {BACKUP_MAX_BYTES / 2**20:.0f} MB" if BACKUP_MAX_BYTES else ""))
+        if snaps:
+            st.dataframe(pd.DataFrame([{"snapshot": s["id"], "created": s["created"], "logs": len(s["logs"]),
+                                        "new MB": round(s["added_bytes"] / 2**20, 2)} for s in reversed(snaps)]),
+                         use_container_width=True, hide_index=True)
+        st.caption(f"Retention: last {BACKUP_KEEP_LAST}, plus one per day for {BACKUP_KEEP_DAYS} days")
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        if snaps:
+            st.markdown('<div class="card"><h3 class="card-title">Restore</h3>', unsafe_allow_html=True)
+            backed_up = sorted({k for s in snaps for k in s["logs"]})
+            scope = st.selectbox("Restore", options=["Whole fleet"] + backed_up, key="restore_scope")
+            c1, c2 = st.columns(2)
+            as_of_date = c1.date_input("As of (UTC)", value=datetime.utcnow().date(), key="restore_date")
+            as_of_time = c2.time_input("Time (UTC)", value=time(23, 59, 59), key="restore_time")
+            as_of = datetime.combine(as_of_date, as_of_time).replace(microsecond=999999)
+            targets = sorted(set(backed_up) | set(manifest)) if scope == "Whole fleet" else [scope]
+            plan = {k: snapshot_for(k, as_of, store)[0] for k in targets}
+            usable = {k: v for k, v in plan.items() if v}
+            kept = [k for k in targets if k in manifest and k not in usable]
+            st.caption(f"{len(usable)} of {len(targets)} logs have a snapshot at or before {as_of:%Y-%m-%d %H:%M:%S}"
+                       + (f" (newest: {max(usable.values())})" if usable else "")
+                       + (f"; {len(kept)} current logs without one are kept as they are" if kept else ""))
+            confirm = st.checkbox("Replace current data (a safety snapshot is taken first)", key="restore_confirm")
+            if st.button("Restore", use_container_width=True, disabled=not (usable and confirm)):
+                progress = st.progress(0)
+                try:
+                    done = restore_fleet(as_of, keys=None if scope == "Whole fleet" else [scope],
+                                         progress=lambda i, n, key: progress.progress(i / n, text=key))
+                    failed = [r for r in done if r.get("error")]
+                    kept = [r["key"] for r in done if r.get("kept")]
+                    st.success(f"Restored {len(done) - len(failed) - len(kept)} logs ({sum(r['bytes'] for r in done) / 2**20:.2f} MB)")
+                    if kept:
+                        st.warning(f"Not in any snapshot at that time, kept as they are: {', '.join(kept)}")
+                    for r in failed:
+                        st.error(f"{r['key']}: {r['error']}")
+                except Exception as e:
+                    st.error(f"Restore failed: {e}")
+            st.markdown('</div>', unsafe_allow_html=True)
+        
+        st.markdown('<div class="card"><h3 class="card-title">Fleet Export</h3>', unsafe_allow_html=True)
+        zip_types = st.multiselect("Equipment Types", options=EQUIPMENT_TYPES, default=EQUIPMENT_TYPES, key="zip_types")
+        zip_level = st.select_slider("Compression", options=list(ZIP_LEVELS), value="Fast", key="zip_level")
+        zip_start = zip_end = None
+        if st.checkbox("Limit to date range", key="zip_ranged"):
+            c1, c2 = st.columns(2)
+            zip_start = datetime.combine(c1.date_input("From", value=datetime.now().date() - timedelta(days=30), key="zip_from"), time(0, 0, 0))
+            zip_end = datetime.combine(c2.date_input("To", value=datetime.now().date(), key="zip_to"), time(23, 59, 59))
+        
+        zip_logs = [e for e in manifest.values() if e["equipment_type"] in zip_types]
+        st.caption(f"{len(zip_logs)} logs, {sum(e['rows'] for e in zip_logs):,} rows before any date limit")
+        
         if st.button("Export All as ZIP", use_container_width=True):
-            if any(LOG_DIR.glob("*.csv")):
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp:
-                    with zipfile.ZipFile(tmp.name, "w") as z:
-                        for f in LOG_DIR.glob("*.csv"):
-                            z.write(f, arcname=f.name)
-                    with open(tmp.name, "rb") as fh:
-                        st.download_button("Download ZIP", data=fh, file_name=f"logs_{datetime.now().strftime('%Y%m%d')}.zip", use_container_width=True)
-                    try:
-                        os.unlink(tmp.name)
-                    except:
-                        pass
+            if zip_logs:
+                progress = st.progress(0)
+                path = export_fleet_zip(manifest, equipment_types=set(zip_types), start=zip_start, end=zip_end, level=ZIP_LEVELS[zip_level],
+                                        progress=lambda i, n, name: progress.progress(i / n, text=name))
+                offer_download("Download ZIP", path, f"logs_{datetime.now().strftime('%Y%m%d')}.zip", "application/zip")
+                st.caption(f"{path.stat().st_size / 2**20:.1f} MB")
             else:
                 st.warning("No data")
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    with tab3:
+        st.markdown('<div class="card"><h3 class="card-title">Storage Backend</h3>', unsafe_allow_html=True)
+        st.markdown(f"Active backend: **{STORAGE.name}** (set `CHECKLIST_STORAGE=csv|parquet|sqlite` to change)")
+        jstats = _journal().stats()
+        st.caption(f"Append journal: {jstats['appends']} appends ({jstats['rows']} rows) in {jstats['commits']} group commits")
+        for key, failure in sorted(jstats["failures"].items()):
+            st.warning(f"{key}: derived-state update failed after append ({failure['error']})")
+        
+        migrate_to = st.radio("Migrate CSV logs to", ["parquet", "sqlite"], horizontal=True, key="migrate_to")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button(f"Migrate CSV logs to {migrate_to.title()}", use_container_width=True):
+                progress = st.progress(0)
+                try:
+                    target = STORAGE_BACKENDS[migrate_to]()
+                    moved = migrate_csv_logs(target, progress=lambda i, n: progress.progress(i / n))
+                    st.success(f"Migrated {moved} rows to the {target.name} store")
+                except Exception as e:
+                    st.error(f"Migration failed: {e}")
+        with col2:
+            if st.button("Compact Now", use_container_width=True, disabled=STORAGE.name == "csv"):
+                STORAGE.compact()
+                st.success("Compacted")
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    with tab4:
+        st.markdown('<div class="card"><h3 class="card-title">Frame Cache</h3>', unsafe_allow_html=True)
+        cstats = _frame_cache().stats()
+        lookups = cstats["hits"] + cstats["misses"]
+        col_a, col_b, col_c, col_d = st.columns(4)
+        col_a.metric("Hit Rate", f"{(cstats['hits'] / lookups * 100) if lookups else 0:.1f}%")
+        col_b.metric("Hits / Misses", f"{cstats['hits']} / {cstats['misses']}")
+        col_c.metric("Evictions", f"{cstats['evictions']}")
+        col_d.metric("Memory", f"{cstats['used'] / 2**20:.1f} / {cstats['budget'] / 2**20:.0f} MB")
+        st.caption(f"{cstats['entries']} cached frames")
+        if st.button("Clear Cache", use_container_width=True):
+            _frame_cache().clear()
+            st.success("Cache cleared")
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    with tab5:
+        section("Administration: diagnostics")
+        st.markdown('<div class="card"><h3 class="card-title">Rerun Latency</h3>', unsafe_allow_html=True)
+        diag_scope = st.radio("Scope", options=["This session", "All sessions"], horizontal=True, key="diag_scope")
+        histograms = st.session_state.timings if diag_scope == "This session" else span_histograms()
+        reruns = st.session_state.reruns if diag_scope == "This session" else recent_reruns()
+        totals = [r["total_ms"] for r in reruns]
+        col_a, col_b, col_c, col_d = st.columns(4)
+        col_a.metric("Reruns", f"{len(totals)}")
+        col_b.metric("Last", f"{totals[-1]:.0f} ms" if totals else "–")
+        col_c.metric("Median", f"{np.median(totals):.0f} ms" if totals else "–")
+        col_d.metric("Slowest", f"{max(totals):.0f} ms" if totals else "–")
+        
+        table = latency_table(histograms)
+        if table.empty:
+            st.info("No timings recorded yet")
+        else:
+            kinds = st.multiselect("Show", options=["section", "span", "rerun"], default=["section", "span"], key="diag_kinds")
+            st.dataframe(table[table["kind"].isin(kinds)].head(20).round(2), use_container_width=True, hide_index=True)
+            picked = st.selectbox("Histogram", options=list(zip(table["kind"], table["name"])), format_func=lambda k: f"{k[0]}: {k[1]}", key="diag_hist")
+            labels = [f"≤{b:g}" for b in SPAN_BUCKETS_MS] + [f">{SPAN_BUCKETS_MS[-1]:g}"]
+            hist = go.Figure(go.Bar(x=labels, y=histograms[picked].counts, marker_color='#2563eb'))
+            hist.update_layout(title=f"{picked[1]} latency", xaxis_title="ms", yaxis_title="count", template="plotly_white", font=dict(family='Montserrat'), height=300)
+            st.plotly_chart(hist, use_container_width=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        st.markdown('<div class="card"><h3 class="card-title">Recent Reruns</h3>', unsafe_allow_html=True)
+        if reruns:
+            st.dataframe(pd.DataFrame([{"started": r["started"], "session": r["session"], "page": r["label"], "total ms": round(r["total_ms"], 1),
+                                        "slowest section": max(r["sections"], key=lambda s: s[2])[0] if r["sections"] else None,
+                                        "spans": len(r["spans"]) + r["dropped_spans"]} for r in reversed(reruns)]),
+                         use_container_width=True, hide_index=True)
+            shown = st.selectbox("Breakdown", options=range(len(reruns)), key="diag_rerun",
+                                 format_func=lambda i: f"{reruns[-1 - i]['started']} · {reruns[-1 - i]['label']} · {reruns[-1 - i]['total_ms']:.0f} ms")
+            rec = reruns[-1 - shown]
+            bars = sorted([(start, ms, n) for n, start, ms in rec["sections"]] + [(start, ms, "    " * (d + 1) + n) for n, start, ms, d in rec["spans"]])[:80]
+            waterfall = go.Figure(go.Bar(y=list(range(len(bars))), x=[b[1] for b in bars], base=[b[0] for b in bars], orientation='h', marker_color='#2563eb',
+                                         hovertext=[f"{b[2].strip()}: {b[1]:.1f} ms" for b in bars], hoverinfo='text'))
+            waterfall.update_layout(title="Sections and spans (ms from rerun start)", xaxis_title="ms", template="plotly_white", font=dict(family='Montserrat'),
+                                    height=max(250, 22 * len(bars)), yaxis=dict(tickmode='array', tickvals=list(range(len(bars))), ticktext=[b[2] for b in bars], autorange='reversed'))
+            st.plotly_chart(waterfall, use_container_width=True)
+        else:
+            st.info("No reruns recorded yet")
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        st.markdown('<div class="card"><h3 class="card-title">Profiler</h3>', unsafe_allow_html=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Profile Next Rerun", use_container_width=True):
+                st.session_state.profile_next = True
+        with col2:
+            if st.button("Reset Timings", use_container_width=True):
+                reset_spans()
+                st.session_state.timings = {}
+                st.session_state.reruns = []
+                st.success("Timings cleared")
+        if st.session_state.profile_next:
+            st.caption("The next rerun of any page runs under cProfile: open that page, then come back here")
+        prof = st.session_state.last_profile
+        if prof:
+            st.caption(f"{prof['label']} at {prof['started']}, top {PROFILE_TOP} functions by cumulative time")
+            st.code(prof["text"], language=None)
+            st.download_button("Download .prof", data=prof["data"], file_name=f"rerun_{prof['label'].replace(' ', '_')}.prof", use_container_width=True)
+        st.markdown('</div>', unsafe_allow_html=True)
 
 # Footer
 st.markdown("""
@@ -1334,3 +1564,5 @@ st.markdown("""
         </div>
     </div>
 """, unsafe_allow_html=True)
+
+end_rerun(nav)
@@ -0,0 +1,199 @@
+# bench.py
+"""
+CheckList benchmarks – hot-path timings on synthetic fleets at several scales
+
+Every scale point runs in its own process against a fresh data directory,
+so caches and indexes start cold exactly as they would after a deploy.
+Results are written as JSON; compare two runs to spot regressions.
+
+Run: python benchmarks/bench.py run --scales small medium
+     python benchmarks/bench.py compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+from pathlib import Path
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parent
+RESULTS_DIR = HERE / "results"
+SCALES = {  # name -> (equipment per type, hourly rows per log)
+    "small": (2, 1_000),
+    "medium": (10, 10_000),
+    "large": (25, 50_000),
+}
+SCHEMA = 1
+
+def measure(func, repeat: int, setup=None, rows: int = None) -> dict:
+    """Time ``func(setup())`` ``repeat`` times; ``setup`` runs outside the timed region."""
+    samples = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        func(arg)
+        samples.append(time.perf_counter() - start)
+    result = {"runs": repeat, "min_s": min(samples), "median_s": statistics.median(samples),
+              "mean_s": statistics.fmean(samples), "max_s": max(samples)}
+    if rows:
+        result["rows_per_s"] = rows / result["median_s"]
+    return result
+
+def run_scale(per_type: int, rows: int, repeat: int, seed: int = 0) -> dict:
+    """Build a fleet in CHECKLIST_HOME and time the hot paths against it."""
+    sys.path.insert(0, str(ROOT))
+    import checklist_core as core
+    from synthetic_fleet import build_fleet, generate_log, long_format
+
+    start = time.perf_counter()
+    fleet = build_fleet(per_type, rows, seed=seed)
+    fleet["build_s"] = time.perf_counter() - start
+    timings = {}
+    equipment_type, equipment_id, param = "Pipeline", 1, "pressure"
+
+    def cold_frames():
+        core._frame_cache.clear()
+        core._day_index_cache.clear()
+
+    load = lambda _: core.load_equipment_log(equipment_type, equipment_id)
+    timings["load_equipment_log.cold"] = measure(load, repeat, setup=cold_frames, rows=rows)
+    timings["load_equipment_log.warm"] = measure(load, repeat, rows=rows)
+    df = core.load_equipment_log(equipment_type, equipment_id)
+    timings["detect_anomalies"] = measure(lambda _: core.detect_anomalies(equipment_type, df, param), repeat, rows=rows)
+    def cold_manifest():
+        shutil.rmtree(core.MANIFEST_DIR, ignore_errors=True)
+        core._manifest_store.clear()
+
+    count = lambda _: core.total_record_count(core.refresh_manifest())
+    timings["record_count.cold"] = measure(count, repeat, setup=cold_manifest, rows=fleet["rows"])
+    timings["record_count.warm"] = measure(count, repeat)
+    manifest = core.refresh_manifest()
+    def cold_latest():
+        shutil.rmtree(core.LATEST_INDEX_DIR, ignore_errors=True)
+        core._latest_store.clear()
+
+    latest = lambda _: core.latest_readings(manifest)
+    timings["latest_scan.cold"] = measure(latest, repeat, setup=cold_latest)
+    timings["latest_scan.warm"] = measure(latest, repeat)
+
+    last = datetime.fromisoformat(str(df["timestamp"].max()))
+    appended = iter(range(1, 10**9))
+
+    def append_one(_):
+        ts = last + timedelta(hours=next(appended))
+        core.append_equipment_row(equipment_type, equipment_id, {
+            "timestamp": ts.isoformat(), "date": ts.date().isoformat(), "hour": ts.hour,
+            "equipment_type": equipment_type, "equipment_id": equipment_id,
+            "pressure": 1500.0, "temperature": 60.0, "flow_rate": 40000.0,
+            "valve_status": "Open", "leak_observed": "No", "tank_level": 20.0,
+            "operator": "bench", "created_at": datetime.utcnow().isoformat(), "version": "bench",
+        })
+    timings["append_equipment_row"] = measure(append_one, repeat * 10)
+
+    # Each import lands in a new log, so every run does the same amount of work.
+    new_ids = iter(range(per_type + 1, 10**9))
+    import_rows = min(rows, 20_000)
+    make_import = lambda: long_format(generate_log("Tank", next(new_ids), import_rows, seed=seed)[0])
+    timings["import_pivoted"] = measure(lambda lf: core.import_pivoted(core.pivot_long(lf)), repeat,
+                                        setup=make_import, rows=import_rows)
+    with core._journal().exclusive():
+        pass
+    return {"equipment_per_type": per_type, "rows_per_log": rows, **fleet, "timings": timings}
+
+def _version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _cmd_run(args) -> int:
+    import numpy as np
+    import pandas as pd
+
+    doc = {
+        "schema": SCHEMA, "created": datetime.utcnow().isoformat(timespec="seconds"), "version": _version(),
+        "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+        "numpy": np.__version__, "pandas": pd.__version__, "storage": args.storage,
+        "repeat": args.repeat, "seed": args.seed, "scales": {},
+    }
+    for name in args.scales:
+        per_type, rows = SCALES[name]
+        print(f"{name}: {per_type} per type x {rows:,} rows ...", end="", file=sys.stderr, flush=True)
+        with tempfile.TemporaryDirectory(prefix="checklist_bench_") as home:
+            env = dict(os.environ, CHECKLIST_HOME=home, CHECKLIST_STORAGE=args.storage)
+            cmd = [sys.executable, __file__, "scale", "--per-type", str(per_type), "--rows", str(rows),
+                   "--repeat", str(args.repeat), "--seed", str(args.seed)]
+            proc = subprocess.run(cmd, env=env, cwd=home, capture_output=True, text=True)
+        if proc.returncode:
+            print(" failed", file=sys.stderr)
+            doc["scales"][name] = {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+            continue
+        doc["scales"][name] = json.loads(proc.stdout)
+        print(f" {doc['scales'][name]['build_s']:.1f}s to build", file=sys.stderr)
+        _print_table(name, doc["scales"][name]["timings"])
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{doc['version'] or 'bench'}_{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(doc, indent=2))
+    print(f"Results written to {out}", file=sys.stderr)
+    return 1 if any("error" in s for s in doc["scales"].values()) else 0
+
+def _print_table(scale: str, timings: dict):
+    for metric, t in timings.items():
+        rate = f"{t['rows_per_s']:>14,.0f} rows/s" if "rows_per_s" in t else ""
+        print(f"  {scale:<7} {metric:<26} {t['median_s'] * 1000:>10.2f} ms {rate}", file=sys.stderr)
+
+def _cmd_scale(args) -> int:
+    print(json.dumps(run_scale(args.per_type, args.rows, args.repeat, seed=args.seed)))
+    return 0
+
+def _cmd_compare(args) -> int:
+    """Median ratios new/old for every scale and metric present in both runs."""
+    old, new = (json.loads(Path(p).read_text()) for p in (args.old, args.new))
+    print(f"{old.get('version')} ({old.get('storage')}) -> {new.get('version')} ({new.get('storage')})")
+    regressions = 0
+    for scale, result in new["scales"].items():
+        before = old["scales"].get(scale, {}).get("timings", {})
+        for metric, t in result.get("timings", {}).items():
+            if metric not in before:
+                continue
+            ratio = t["median_s"] / before[metric]["median_s"]
+            flag = "  REGRESSION" if ratio >= args.threshold else ""
+            regressions += bool(flag)
+            print(f"  {scale:<7} {metric:<26} {before[metric]['median_s'] * 1000:>10.2f} ms -> "
+                  f"{t['median_s'] * 1000:>10.2f} ms  x{ratio:.2f}{flag}")
+    return 1 if regressions else 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="CheckList hot-path benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("run", help="benchmark each scale point in a fresh process and write JSON")
+    p.add_argument("--scales", nargs="+", choices=SCALES, default=["small", "medium"])
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--storage", choices=["csv", "parquet", "sqlite"], default=os.environ.get("CHECKLIST_STORAGE", "csv"))
+    p.add_argument("--out", help=f"JSON path (default: {RESULTS_DIR.relative_to(ROOT)}/<version>_<time>.json)")
+    p.set_defaults(func=_cmd_run)
+    p = sub.add_parser("scale", help="one scale point in this process against CHECKLIST_HOME (used by run)")
+    p.add_argument("--per-type", type=int, required=True)
+    p.add_argument("--rows", type=int, required=True)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=_cmd_scale)
+    p = sub.add_parser("compare", help="compare two result files; exits 1 on a regression")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=1.2, help="new/old median ratio that counts as a regression")
+    p.set_defaults(func=_cmd_compare)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
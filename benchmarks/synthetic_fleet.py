@@ -0,0 +1,121 @@
+# synthetic_fleet.py
+"""
+Synthetic fleet generator – hourly logs that follow PARAM_SPECS
+
+Each float parameter is a slow random walk inside its spec range with
+injected spikes (some beyond the spec limits); gaps are whole runs of
+missing hours and a few readings are left blank. Seeded, so the same
+arguments always produce the same fleet.
+
+Run: python benchmarks/synthetic_fleet.py --home demo_data --per-type 5 --rows 2000
+"""
+from pathlib import Path
+from datetime import datetime
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+CATEGORIES = {
+    "valve_status": (["Open", "Closed", "Partially Open"], [0.8, 0.1, 0.1]),
+    "leak_observed": (["No", "Yes", "Suspected"], [0.97, 0.01, 0.02]),
+}
+START = datetime(2024, 1, 1)
+
+def generate_log(equipment_type: str, equipment_id: int, rows: int, seed: int = 0,
+                 anomaly_rate: float = 0.002, gap_rate: float = 0.01, blank_rate: float = 0.005):
+    """Wide rows for one log plus the number of injected anomalies.
+
+    ``gap_rate`` is the fraction of hours dropped, in runs of 1-24 hours.
+    """
+    import checklist_core as core
+
+    rng = np.random.default_rng([seed, core.EQUIPMENT_TYPES.index(equipment_type), int(equipment_id)])
+    hours = rows + int(rows * gap_rate)
+    keep = np.ones(hours, dtype=bool)
+    dropped = 0
+    while dropped < hours - rows:
+        at = int(rng.integers(1, hours - 1))
+        run = int(min(rng.integers(1, 25), hours - rows - dropped))
+        newly = keep[at:at + run].sum()
+        keep[at:at + run] = False
+        dropped += int(newly)
+    stamps = pd.date_range(START, periods=hours, freq="h")[keep][:rows]
+    df = pd.DataFrame({
+        "timestamp": stamps.strftime("%Y-%m-%dT%H:%M:%S"),
+        "date": stamps.strftime("%Y-%m-%d"),
+        "hour": stamps.hour,
+        "equipment_type": equipment_type,
+        "equipment_id": int(equipment_id),
+    })
+    anomalies = 0
+    for param, (dtype, _, mn, mx) in core.PARAM_SPECS[equipment_type].items():
+        if dtype == "float":
+            span = mx - mn
+            base = mn + span * rng.uniform(0.3, 0.6)
+            walk = np.cumsum(rng.normal(0, span * 0.0005, rows))
+            values = np.clip(base + walk - walk.mean() + rng.normal(0, span * 0.005, rows), mn, mx)
+            spikes = np.flatnonzero(rng.random(rows) < anomaly_rate)
+            values[spikes] += rng.choice([-1, 1], len(spikes)) * span * rng.uniform(0.1, 0.4, len(spikes))
+            anomalies += len(spikes)
+            values = values.round(3)
+        else:
+            options, weights = CATEGORIES.get(param, (["OK"], [1.0]))
+            values = rng.choice(options, rows, p=weights).astype(object)
+        values = pd.Series(values, dtype=object)
+        values[rng.random(rows) < blank_rate] = None
+        df[param] = values
+    df["operator"] = "synthetic"
+    df["created_at"] = datetime.utcnow().isoformat()
+    df["version"] = "synthetic"
+    return df.reindex(columns=core.WIDE_COLUMNS), anomalies
+
+def long_format(df: pd.DataFrame) -> pd.DataFrame:
+    """The same readings as an import file (timestamp, equipment_type, equipment_id, parameter, value)."""
+    import checklist_core as core
+
+    params = [p for p in core.PARAM_SPECS[df["equipment_type"].iloc[0]] if p in df.columns]
+    long = df.melt(id_vars=core.IMPORT_KEYS, value_vars=params, var_name="parameter", value_name="value")
+    return long.dropna(subset=["value"])[core.IMPORT_COLUMNS]
+
+def build_fleet(per_type: int, rows: int, seed: int = 0, progress=None, **options) -> dict:
+    """Write ``per_type`` logs of ``rows`` readings for every equipment type into the current store."""
+    import checklist_core as core
+
+    summary = {"logs": 0, "rows": 0, "anomalies": 0}
+    total = per_type * len(core.EQUIPMENT_TYPES)
+    for equipment_type in core.EQUIPMENT_TYPES:
+        for equipment_id in range(1, per_type + 1):
+            df, anomalies = generate_log(equipment_type, equipment_id, rows, seed=seed, **options)
+            core.append_equipment_rows(equipment_type, equipment_id, df)
+            summary["logs"] += 1
+            summary["rows"] += len(df)
+            summary["anomalies"] += anomalies
+            if progress:
+                progress(summary["logs"], total)
+    with core._journal().exclusive():
+        pass
+    return summary
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Write a synthetic fleet into a CheckList data directory")
+    parser.add_argument("--home", required=True, help="data directory (becomes CHECKLIST_HOME)")
+    parser.add_argument("--per-type", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=2000, help="hourly readings per log")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--anomaly-rate", type=float, default=0.002)
+    parser.add_argument("--gap-rate", type=float, default=0.01)
+    args = parser.parse_args(argv)
+    Path(args.home).mkdir(parents=True, exist_ok=True)
+    os.environ["CHECKLIST_HOME"] = str(Path(args.home).resolve())
+    summary = build_fleet(args.per_type, args.rows, seed=args.seed, anomaly_rate=args.anomaly_rate,
+                          gap_rate=args.gap_rate, progress=lambda i, n: print(f"\r{i}/{n} logs", end="", file=sys.stderr))
+    print(f"\n{summary['logs']} logs, {summary['rows']:,} rows, {summary['anomalies']} injected anomalies in {args.home}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
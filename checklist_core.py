@@ -0,0 +1,3555 @@
+# checklist_core.py
+"""
+CheckList core – storage, validation, anomaly scoring and backups, without the UI
+
+Imported by app.py and usable on its own from batch jobs: it needs neither
+Streamlit nor Plotly, and NumPy/pandas are only loaded on first use.
+
+Run: python -m checklist_core --help
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from datetime import datetime, time, timedelta
+import argparse
+import bisect
+import contextlib
+import copy
+import csv
+import functools
+import gzip
+import hashlib
+import importlib
+import io
+from collections import OrderedDict, deque
+import json
+import pickle
+import re
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import types
+import warnings
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from time import perf_counter
+import os
+
+# -------------------- Lazy Imports --------------------
+class _LazyModule:
+    """Stand-in that imports a module on first attribute access and then replaces itself."""
+
+    def __init__(self, name: str, alias: str):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+np = _LazyModule("numpy", "np")
+pd = _LazyModule("pandas", "pd")
+
+def _resource(func):
+    """Process-wide, thread-safe memo per argument tuple (what st.cache_resource gave the app)."""
+    cache = {}
+    lock = threading.RLock()
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        with lock:
+            if args not in cache:
+                cache[args] = func(*args)
+            return cache[args]
+    wrapper.clear = cache.clear
+    return wrapper
+
+# -------------------- Timing Spans --------------------
+# Wall-clock spans around core functions and page sections. Every span lands
+# in a process-wide latency histogram; spans on a thread with an open rerun
+# trace (the Streamlit script thread) are also kept, in order, on that trace
+# so one rerun can be taken apart. A trace can optionally run under cProfile.
+SPAN_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+SPAN_TRACE_LIMIT = 500
+RERUN_HISTORY = 50
+PROFILE_TOP = 40
+
+class LatencyHistogram:
+    """Durations counted per SPAN_BUCKETS_MS bucket; the last bucket is open-ended."""
+
+    def __init__(self):
+        self.counts = [0] * (len(SPAN_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float):
+        self.counts[bisect.bisect_left(SPAN_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper edge of the bucket holding the ``q`` quantile, capped at the largest value seen."""
+        if not self.count:
+            return float("nan")
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= q * self.count:
+                return min(SPAN_BUCKETS_MS[i], self.max_ms) if i < len(SPAN_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def summary(self) -> dict:
+        return {"count": self.count, "total_ms": self.total_ms, "mean_ms": self.total_ms / self.count if self.count else float("nan"),
+                "p50_ms": self.quantile(0.5), "p95_ms": self.quantile(0.95), "max_ms": self.max_ms}
+
+def add_latency(histograms: dict, key, ms: float):
+    hist = histograms.get(key)
+    if hist is None:
+        hist = histograms[key] = LatencyHistogram()
+    hist.add(ms)
+
+class SpanRecorder:
+    """Process-wide histograms keyed by (kind, name), kind being span, section or rerun."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.reruns = deque(maxlen=RERUN_HISTORY)
+
+    def add(self, kind: str, name: str, ms: float):
+        with self.lock:
+            add_latency(self.histograms, (kind, name), ms)
+
+    def add_rerun(self, record: dict):
+        with self.lock:
+            for name, _, ms in record["sections"]:
+                add_latency(self.histograms, ("section", name), ms)
+            add_latency(self.histograms, ("rerun", record["label"]), record["total_ms"])
+            self.reruns.append(record)
+
+    def histogram_copy(self) -> dict:
+        with self.lock:
+            return copy.deepcopy(self.histograms)
+
+    def recent_reruns(self) -> list:
+        with self.lock:
+            return list(self.reruns)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.reruns.clear()
+
+@_resource
+def _span_recorder():
+    return SpanRecorder()
+
+_span_local = threading.local()
+
+class RerunTrace:
+    """Spans and page sections recorded on one thread between start_rerun and finish_rerun."""
+
+    def __init__(self, session: str = None, profile: bool = False):
+        self.session = session
+        self.started = datetime.utcnow()
+        self.t0 = perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self.sections = []
+        self.section_name = None
+        self.section_start = self.t0
+        self.profiler = None
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:  # another profiler is already active on this thread
+                self.profiler = None
+
+    def add_span(self, name: str, start: float, ms: float, depth: int):
+        if len(self.spans) < SPAN_TRACE_LIMIT:
+            self.spans.append((name, (start - self.t0) * 1000, ms, depth))
+        else:
+            self.dropped += 1
+
+    def section(self, name: str = None):
+        """Close the current section and, with a ``name``, open the next one."""
+        now = perf_counter()
+        if self.section_name is not None:
+            self.sections.append((self.section_name, (self.section_start - self.t0) * 1000, (now - self.section_start) * 1000))
+        self.section_name, self.section_start = name, now
+
+    def finish(self, label: str) -> dict:
+        self.section()
+        record = {"label": label, "session": self.session, "started": self.started.isoformat(timespec="seconds"),
+                  "total_ms": (perf_counter() - self.t0) * 1000, "sections": self.sections,
+                  "spans": self.spans, "dropped_spans": self.dropped}
+        if self.profiler is not None:
+            import marshal
+            import pstats
+            self.profiler.disable()
+            out = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=out)
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+            record["profile"] = {"text": out.getvalue(), "data": marshal.dumps(stats.stats)}
+        return record
+
+@contextlib.contextmanager
+def span(name: str):
+    """Time the block; nested spans on a traced thread keep their depth."""
+    depth = getattr(_span_local, "depth", 0)
+    _span_local.depth = depth + 1
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        ms = (perf_counter() - start) * 1000
+        _span_local.depth = depth
+        _span_recorder().add("span", name, ms)
+        trace = getattr(_span_local, "trace", None)
+        if trace is not None:
+            trace.add_span(name, start, ms, depth)
+
+def timed(name: str = None):
+    """Decorator form of span(), named after the function by default."""
+    def decorate(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def start_rerun(session: str = None, profile: bool = False) -> RerunTrace:
+    """Open a trace on this thread, replacing any left open by an aborted rerun."""
+    trace = RerunTrace(session, profile)
+    _span_local.trace = trace
+    _span_local.depth = 0
+    return trace
+
+def section(name: str):
+    """Start the next page section of the current rerun (no-op outside a trace)."""
+    trace = getattr(_span_local, "trace", None)
+    if trace is not None:
+        trace.section(name)
+
+def finish_rerun(label: str) -> dict:
+    """Close this thread's trace and log it; returns the record (with any profile) or None."""
+    trace = getattr(_span_local, "trace", None)
+    if trace is None:
+        return None
+    _span_local.trace = None
+    record = trace.finish(label)
+    _span_recorder().add_rerun({k: v for k, v in record.items() if k != "profile"})
+    return record
+
+def fold_rerun(record: dict, histograms: dict):
+    """Add a rerun record's spans, sections and total to a per-session histogram dict."""
+    for name, _, ms, _ in record["spans"]:
+        add_latency(histograms, ("span", name), ms)
+    for name, _, ms in record["sections"]:
+        add_latency(histograms, ("section", name), ms)
+    add_latency(histograms, ("rerun", record["label"]), record["total_ms"])
+
+def span_histograms() -> dict:
+    return _span_recorder().histogram_copy()
+
+def recent_reruns() -> list:
+    return _span_recorder().recent_reruns()
+
+def reset_spans():
+    _span_recorder().reset()
+
+def latency_table(histograms: dict) -> pd.DataFrame:
+    """One row per (kind, name) with count, mean/p50/p95/max and total milliseconds, slowest p95 first."""
+    rows = [{"kind": kind, "name": name, **hist.summary()} for (kind, name), hist in histograms.items()]
+    table = pd.DataFrame(rows, columns=["kind", "name", "count", "total_ms", "mean_ms", "p50_ms", "p95_ms", "max_ms"])
+    return table.sort_values(["p95_ms", "total_ms"], ascending=False).reset_index(drop=True)
+
+# -------------------- Core Functions --------------------
+BASE_DIR = Path(os.environ.get("CHECKLIST_HOME", Path.cwd()))
+LOG_DIR = BASE_DIR / "logs"
+BACKUP_DIR = BASE_DIR / "backups"
+META_FILE = BASE_DIR / "equipment_meta.json"
+META_DIR = BASE_DIR / "equipment_meta"
+MANIFEST_FILE = BASE_DIR / "logs_manifest.json"  # legacy single file, split into MANIFEST_DIR
+MANIFEST_DIR = BASE_DIR / "logs_manifest"
+LATEST_INDEX_FILE = BASE_DIR / "latest_index.json"  # legacy single file, split into LATEST_INDEX_DIR
+LATEST_INDEX_DIR = BASE_DIR / "latest_index"
+LOG_INDEX_DIR = BASE_DIR / "log_index"
+LOG_DIR.mkdir(exist_ok=True)
+BACKUP_DIR.mkdir(exist_ok=True)
+
+WIDE_COLUMNS = [
+    "timestamp", "date", "hour",
+    "equipment_type", "equipment_id",
+    "pressure", "temperature", "flow_rate",
+    "valve_status", "leak_observed", "tank_level",
+    "operator", "note", "created_at", "version", "alarm_flag"
+]
+
+NON_PARAM_COLUMNS = [
+    "timestamp", "date", "hour", "equipment_type", "equipment_id",
+    "operator", "note", "created_at", "version", "alarm_flag"
+]
+
+PARAM_SPECS = {
+    "Pipeline": {
+        "pressure": ("float", "psi", 0.0, 3000.0),
+        "temperature": ("float", "°C", -40.0, 200.0),
+        "flow_rate": ("float", "bbl/hr", 0.0, 100000.0),
+        "valve_status": ("categorical", "state", None, None),
+        "leak_observed": ("categorical", "yesno", None, None),
+        "tank_level": ("float", "m", 0.0, 50.0)
+    },
+    "Vessel": {
+        "pressure": ("float", "psi", 0.0, 5000.0),
+        "temperature": ("float", "°C", -40.0, 400.0),
+        "tank_level": ("float", "m", 0.0, 50.0),
+        "vapor_o2": ("float", "%", 0.0, 100.0)
+    },
+    "Tank": {
+        "tank_level": ("float", "m", 0.0, 50.0),
+        "temperature": ("float", "°C", -20.0, 120.0),
+        "valve_status": ("categorical", "state", None, None)
+    },
+    "Separator": {
+        "pressure": ("float", "psi", 0.0, 5000.0),
+        "oil_level": ("float", "m", 0.0, 10.0),
+        "gas_flow_rate": ("float", "m³/hr", 0.0, 200000.0)
+    }
+}
+
+EQUIPMENT_TYPES = list(PARAM_SPECS.keys())
+
+def log_key(equipment_type: str, equipment_id: int) -> str:
+    safe = equipment_type.replace(" ", "_")
+    return f"{safe}_{int(equipment_id)}"
+
+def parse_log_key(key: str):
+    safe, _, eid = key.rpartition("_")
+    for et in EQUIPMENT_TYPES:
+        if et.replace(" ", "_") == safe:
+            return et, int(eid)
+    return safe.replace("_", " "), int(eid)
+
+def equipment_filename(equipment_type: str, equipment_id: int) -> Path:
+    return LOG_DIR / f"{log_key(equipment_type, equipment_id)}.csv"
+
+def load_meta():
+    return _meta_store().all()
+
+def save_meta(meta: dict):
+    _meta_store().put_many(meta)
+
+def get_meta(key: str):
+    return _meta_store().get(key)
+
+def put_meta(key: str, entry: dict):
+    _meta_store().put(key, entry)
+
+def init_equipment(equipment_type: str, equipment_id: int):
+    fn = STORAGE.path(equipment_type, equipment_id)
+    if not STORAGE.exists(equipment_type, equipment_id):
+        with equipment_lock(equipment_type, equipment_id):
+            if not STORAGE.exists(equipment_type, equipment_id):
+                STORAGE.create(equipment_type, equipment_id)
+        update_manifest(log_key(equipment_type, equipment_id), fn)
+    key = f"{equipment_type}_{equipment_id}"
+    meta = get_meta(key)
+    if meta is None:
+        params = {}
+        for p, spec in PARAM_SPECS.get(equipment_type, {}).items():
+            dtype, unit, mn, mx = spec
+            params[p] = {"dtype": dtype, "unit": unit, "min": mn, "max": mx}
+        meta = {
+            "equipment_type": equipment_type,
+            "equipment_id": int(equipment_id),
+            "params": params,
+            "created": datetime.utcnow().isoformat()
+        }
+        put_meta(key, meta)
+    register_equipment(equipment_type, equipment_id, created=meta.get("created"))
+    return fn
+
+@timed()
+def load_equipment_log(equipment_type: str, equipment_id: int, columns=None, start=None, end=None) -> pd.DataFrame:
+    if not STORAGE.exists(equipment_type, equipment_id):
+        init_equipment(equipment_type, equipment_id)
+    path = STORAGE.path(equipment_type, equipment_id)
+    query = (None if columns is None else tuple(columns), start, end)
+    cache = _frame_cache()
+    signature = STORAGE.signature(path)
+    df = cache.get(path, query, signature)
+    if df is None:
+        df = STORAGE.read(equipment_type, equipment_id, columns=columns, start=start, end=end)
+        # Only cache if no write landed while we were reading.
+        if STORAGE.signature(path) == signature:
+            cache.put(path, query, signature, df)
+    return df.copy()
+
+def append_equipment_row(equipment_type: str, equipment_id: int, row: dict):
+    for c in WIDE_COLUMNS:
+        if c not in row:
+            row[c] = None
+    written = _append_rows(equipment_type, equipment_id, pd.DataFrame([row], columns=WIDE_COLUMNS))
+    row["alarm_flag"] = bool(written["alarm_flag"].iloc[0])
+    return True
+
+def append_equipment_rows(equipment_type: str, equipment_id: int, rows: pd.DataFrame):
+    """Append many rows to one equipment log with a single write."""
+    _append_rows(equipment_type, equipment_id, rows)
+    return True
+
+@timed("append")
+def _append_rows(equipment_type: str, equipment_id: int, rows: pd.DataFrame) -> pd.DataFrame:
+    init_equipment(equipment_type, equipment_id)
+    rows = rows.reindex(columns=WIDE_COLUMNS)
+    if rows.empty:
+        return rows
+    return _journal().submit(STORAGE, equipment_type, equipment_id, rows,
+                             on_applied=_after_append, prepare=score_online, lock=online_state_lock)
+
+def _after_append(equipment_type: str, equipment_id: int, fn: Path, before, after, rows: pd.DataFrame):
+    """Bring derived state up to date; runs under the equipment lock right after a write."""
+    key = log_key(equipment_type, equipment_id)
+    save_online_state(equipment_type, equipment_id)
+    try:
+        if STORAGE.name == "csv" and after is not None:
+            time_index(fn, after[0], create=False)
+        _frame_cache().extend(fn, before, after, rows)
+        update_manifest(key, fn, before=before, appended=rows)
+        update_latest_index(key, fn, before=before, appended=rows)
+        append_rollups(equipment_type, equipment_id, rows)
+    except Exception:
+        # The rest is re-derived when its signature goes stale; rollups are rebuilt from scratch.
+        drop_rollups(key)
+        raise
+
+@timed()
+def import_pivoted(pivot: pd.DataFrame, progress=None) -> int:
+    """Write a pivoted import (timestamp, equipment_type, equipment_id, <params>).
+
+    Rows are grouped per equipment, mapped onto WIDE_COLUMNS in one step and
+    written with one append per log. ``progress(done, total, equipment_type,
+    equipment_id, rows)`` is called after each group.
+    """
+    pivot = pivot[pd.to_numeric(pivot["equipment_id"], errors='coerce').notna()].copy()
+    pivot["equipment_id"] = pd.to_numeric(pivot["equipment_id"]).astype(int)
+    created = datetime.utcnow().isoformat()
+    groups = pivot.groupby(["equipment_type", "equipment_id"], sort=False)
+    count = 0
+    for i, ((equipment_type, equipment_id), group) in enumerate(groups, start=1):
+        params = [p for p in PARAM_SPECS.get(equipment_type, {}) if p in group.columns]
+        rows = group[["timestamp", "equipment_type", "equipment_id"] + params].reindex(columns=WIDE_COLUMNS)
+        rows["created_at"] = created
+        rows["version"] = "imported"
+        append_equipment_rows(equipment_type, equipment_id, rows)
+        count += len(rows)
+        if progress:
+            progress(i, groups.ngroups, equipment_type, equipment_id, len(rows))
+    return count
+
+IMPORT_KEYS = ['timestamp', 'equipment_type', 'equipment_id']
+IMPORT_COLUMNS = IMPORT_KEYS + ['parameter', 'value']
+IMPORT_CHUNK_ROWS = 200_000
+STREAM_IMPORT_BYTES = 50 * 1024 * 1024
+
+def pivot_long(lf: pd.DataFrame) -> pd.DataFrame:
+    return lf.pivot_table(index=IMPORT_KEYS, columns='parameter', values='value', aggfunc='first').reset_index()
+
+@timed()
+def stream_import_long(source, chunksize: int = IMPORT_CHUNK_ROWS, progress=None) -> int:
+    """Import a long-format CSV chunk by chunk with bounded memory.
+
+    Each chunk is pivoted and flushed to the equipment logs before the next
+    one is read. Rows sharing the chunk's last timestamp are held back and
+    prepended to the next chunk, so a (timestamp, equipment) key that spans
+    a chunk boundary still becomes one wide row. This relies on the export
+    being ordered by timestamp (or grouped per key), as historian exports
+    are. ``progress(rows_read, rows_written)`` is called after each flush.
+    """
+    carry = None
+    read = written = 0
+    for chunk in pd.read_csv(source, chunksize=chunksize, usecols=IMPORT_COLUMNS):
+        read += len(chunk)
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        held = chunk['timestamp'] == chunk['timestamp'].iloc[-1]
+        carry = chunk[held]
+        if (~held).any():
+            written += import_pivoted(pivot_long(chunk[~held]))
+        if progress:
+            progress(read, written)
+    if carry is not None and not carry.empty:
+        written += import_pivoted(pivot_long(carry))
+        if progress:
+            progress(read, written)
+    return written
+
+def validate_row(equipment_type: str, row: dict):
+    msgs = []
+    specs = PARAM_SPECS.get(equipment_type, {})
+    ok = True
+    for p, spec in specs.items():
+        dtype, unit, mn, mx = spec
+        val = row.get(p)
+        if val is None or (isinstance(val, str) and str(val).strip() == ""):
+            msgs.append(f"{p} is empty")
+            ok = False
+            continue
+        if dtype == "float":
+            try:
+                v = float(val)
+                if mn is not None and v < mn:
+                    msgs.append(f"{p}: {v} below min {mn}")
+                    ok = False
+                if mx is not None and v > mx:
+                    msgs.append(f"{p}: {v} above max {mx}")
+                    ok = False
+            except Exception:
+                msgs.append(f"{p}: not numeric")
+                ok = False
+    return ok, msgs
+
+def _window_sums(rows: np.ndarray, window: int) -> np.ndarray:
+    """Sum of each trailing ``window`` values along each row, via one cumulative sum."""
+    sums = np.cumsum(rows, axis=1)
+    if window < sums.shape[1]:
+        sums[:, window:] -= sums[:, :-window].copy()
+    return sums
+
+@timed("rolling_stats")
+def rolling_mean_std(values: np.ndarray, window: int):
+    """Trailing rolling mean and sample std down each column of a 2-D array.
+
+    NaNs are skipped and every window needs only one observation, like
+    ``Series.rolling(window, min_periods=1)``. Computed from cumulative sums
+    of the column-centred data, so all columns are handled in one pass.
+    """
+    # Work on contiguous per-parameter rows so the cumulative sums stream through memory.
+    x = np.array(values.T, dtype="float64", order="C")
+    valid = ~np.isnan(x)
+    counts = valid.sum(axis=1)
+    x[~valid] = 0.0
+    centre = np.divide(x.sum(axis=1), counts, out=np.zeros(len(x)), where=counts > 0)[:, None]
+    x -= centre
+    x[~valid] = 0.0
+    cnt = _window_sums(valid.astype("float64"), window)
+    s1 = _window_sums(x, window)
+    s2 = _window_sums(x * x, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s1 / cnt
+        var = (s2 - s1 * mean) / (cnt - 1)
+    var[cnt < 2] = np.nan
+    std = np.sqrt(np.clip(var, 0.0, None))
+    # Cancellation leaves ~1e-16 noise where the window is constant; pandas reports 0.
+    scale = np.maximum(np.abs(mean), np.abs(centre)) + 1.0
+    std[std <= 1e-12 * scale] = 0.0
+    return (mean + centre).T, std.T
+
+def numeric_params(df: pd.DataFrame) -> list:
+    return [c for c in df.columns if c not in NON_PARAM_COLUMNS and not c.startswith("_")
+            and pd.to_numeric(df[c], errors='coerce').notna().any()]
+
+@timed()
+def score_anomalies(equipment_type: str, df: pd.DataFrame, params=None, z_thresh: float = 3.0, window: int = 24):
+    """Score every numeric parameter of ``df`` at once.
+
+    Combines the static min/max from the equipment metadata with a rolling
+    z-score over ``window`` rows. Returns ``(mask, z)``: a boolean anomaly
+    frame and a z-score frame, both indexed like ``df`` with one column per
+    parameter. Parameters that are missing or non-numeric are never flagged.
+    """
+    params = numeric_params(df) if params is None else list(params)
+    present = [p for p in params if p in df.columns]
+    if df.empty or not present:
+        return (pd.DataFrame(False, index=df.index, columns=params),
+                pd.DataFrame(np.nan, index=df.index, columns=params))
+    values = np.column_stack([pd.to_numeric(df[p], errors='coerce').to_numpy(dtype="float64") for p in present])
+    flags = np.zeros(values.shape, dtype=bool)
+
+    key = f"{equipment_type}_{int(df['equipment_id'].iloc[0])}" if 'equipment_id' in df.columns else None
+    pmeta = (get_meta(key) or {}).get('params', {}) if key else {}
+    lows = np.array([np.nan if pmeta.get(p, {}).get('min') is None else pmeta[p]['min'] for p in present], dtype="float64")
+    highs = np.array([np.nan if pmeta.get(p, {}).get('max') is None else pmeta[p]['max'] for p in present], dtype="float64")
+    with np.errstate(invalid="ignore"):
+        flags |= values < lows
+        flags |= values > highs
+
+    mean, std = rolling_mean_std(values, max(1, min(window, len(df))))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        zs = (values - mean) / np.where(std > 0, std, np.nan)
+    zs[:, (~np.isnan(values)).sum(axis=0) < 5] = np.nan
+    with np.errstate(invalid="ignore"):
+        flags |= np.abs(zs) > z_thresh
+
+    mask = pd.DataFrame(flags, index=df.index, columns=present).reindex(columns=params, fill_value=False)
+    z = pd.DataFrame(zs, index=df.index, columns=present).reindex(columns=params)
+    return mask, z
+
+def detect_anomalies(equipment_type: str, df: pd.DataFrame, param: str, z_thresh: float = 3.0, window: int = 24):
+    mask, _ = score_anomalies(equipment_type, df, [param], z_thresh=z_thresh, window=window)
+    return mask[param]
+
+def _scan_log(entry: dict, z_thresh: float, window: int) -> list:
+    df = STORAGE.read(entry["equipment_type"], entry["equipment_id"])
+    if "timestamp" in df.columns:
+        df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    mask, z = score_anomalies(entry["equipment_type"], df, z_thresh=z_thresh, window=window)
+    rows = []
+    for p in mask.columns:
+        hits = mask[p]
+        rows.append({
+            "equipment_type": entry["equipment_type"], "equipment_id": entry["equipment_id"],
+            "parameter": p, "rows": len(df), "anomalies": int(hits.sum()),
+            "max_abs_z": float(z[p].abs().max()) if z[p].notna().any() else None,
+            "last_anomaly": df.loc[hits, "timestamp"].max() if hits.any() and "timestamp" in df.columns else None,
+        })
+    return rows
+
+@timed()
+def scan_fleet_anomalies(z_thresh: float = 3.0, window: int = 24, equipment_type: str = None, progress=None) -> pd.DataFrame:
+    """Anomaly counts per equipment and parameter across every stored log.
+
+    Logs are scanned in parallel; ``progress(done, total, key, error)`` is
+    called as each finishes and failed logs are left out of the result.
+    """
+    entries = [e for _, e in sorted(refresh_manifest().items())
+               if e.get("rows") and not (equipment_type and e["equipment_type"] != equipment_type)]
+    scan = functools.partial(_scan_log, z_thresh=z_thresh, window=window)
+    rows = []
+    for i, (entry, found, error) in enumerate(load_parallel(scan, entries, processes=True), start=1):
+        key = log_key(entry["equipment_type"], entry["equipment_id"])
+        record_load_error(key, error)
+        if found:
+            rows.extend(found)
+        if progress:
+            progress(i, len(entries), key, error)
+    rows.sort(key=lambda r: (r["equipment_type"], r["equipment_id"]))
+    return pd.DataFrame(rows, columns=["equipment_type", "equipment_id", "parameter", "rows",
+                                       "anomalies", "max_abs_z", "last_anomaly"])
+
+# -------------------- Chart Downsampling --------------------
+CHART_MAX_POINTS = 4000
+WEBGL_POINTS = 10_000  # raw series larger than this are drawn with WebGL traces
+
+@timed()
+def downsample_minmax(t: np.ndarray, y: np.ndarray, max_points: int = CHART_MAX_POINTS, keep=None) -> np.ndarray:
+    """Sorted row indices of a min/max-per-time-bucket reduction of (t, y).
+
+    The plotted range is split into ``max_points // 2`` equal time buckets and
+    each keeps its lowest and highest reading, so spikes survive. The first
+    and last points and every index set in the ``keep`` mask are always kept.
+    """
+    valid = ~np.isnan(y) & ~pd.isna(t)
+    idx = np.flatnonzero(valid)
+    if len(idx) > max_points:
+        buckets = max(max_points // 2, 1)
+        tv = t[idx].astype("datetime64[ns]").astype(np.int64)
+        span = max(tv[-1] - tv[0], 1)
+        b = np.minimum(((tv - tv[0]) / span * buckets).astype(np.int64), buckets - 1)
+        order = np.lexsort((y[idx], b))
+        edge = b[order][1:] != b[order][:-1]
+        ends = np.r_[True, edge] | np.r_[edge, True]
+        idx = np.union1d(idx[order[ends]], [idx[0], idx[-1]])
+    if keep is not None:
+        idx = np.union1d(idx, np.flatnonzero(keep & valid))
+    return idx
+
+# -------------------- Histograms --------------------
+# Float parameters are binned server-side into HIST_FINE_BINS fixed bins over
+# their spec range (plus under/overflow). Fixed edges make per-day counts
+# mergeable, so a long range is the sum of cached day partials, regrouped to
+# about HIST_BINS bars for display.
+HIST_FINE_BINS = 600
+HIST_BINS = 30
+HIST_CACHE_ENTRIES = 8192
+
+def spec_range(equipment_type: str, param: str):
+    spec = PARAM_SPECS.get(equipment_type, {}).get(param)
+    if spec and spec[0] == "float" and spec[2] is not None and spec[3] is not None and spec[3] > spec[2]:
+        return float(spec[2]), float(spec[3])
+    return None
+
+def fine_histogram(values, lo: float, hi: float) -> np.ndarray:
+    """Counts over [underflow, HIST_FINE_BINS bins, overflow]."""
+    v = np.asarray(values, dtype=float)
+    v = v[~np.isnan(v)]
+    pos = np.floor((v - lo) / (hi - lo) * HIST_FINE_BINS)
+    pos[v == hi] = HIST_FINE_BINS - 1
+    pos = np.clip(pos, -1, HIST_FINE_BINS).astype(np.int64) + 1
+    return np.bincount(pos, minlength=HIST_FINE_BINS + 2).astype(np.int32)
+
+def regroup_histogram(fine: np.ndarray, lo: float, hi: float, bins: int = HIST_BINS):
+    """Merge the occupied span of fine bins into about ``bins`` bars -> (edges, counts)."""
+    inner = fine[1:-1]
+    occupied = np.flatnonzero(inner)
+    if not len(occupied):
+        return np.array([lo, hi]), np.array([0])
+    first, last = occupied[0], occupied[-1] + 1
+    group = max(int(np.ceil((last - first) / bins)), 1)
+    last = min(first + group * int(np.ceil((last - first) / group)), HIST_FINE_BINS)
+    counts = np.add.reduceat(inner[first:last], np.arange(0, last - first, group))
+    width = (hi - lo) / HIST_FINE_BINS
+    edges = lo + width * np.r_[np.arange(first, last, group), last]
+    return edges, counts
+
+@_resource
+def _hist_cache():
+    return OrderedDict()
+
+def _day_partials(frame: pd.DataFrame, param: str, lo: float, hi: float) -> dict:
+    days = frame["timestamp"].dt.strftime("%Y-%m-%d")
+    values = pd.to_numeric(frame[param], errors='coerce')
+    return {day: fine_histogram(vals.to_numpy(dtype=float), lo, hi) for day, vals in values.groupby(days)}
+
+@timed()
+def range_histogram(equipment_type: str, equipment_id: int, param: str, start, end, frame: pd.DataFrame = None):
+    """Histogram of ``param`` over the whole days from ``start`` to ``end``.
+
+    Returns (edges, counts, underflow, overflow). Float parameters with a spec
+    range are assembled from cached per-day partials where the backend can
+    tell when a day changed; only uncached days are read (from ``frame`` when
+    given). Other parameters fall back to binning ``frame``, or the range
+    read from the log when no frame is given.
+    """
+    bounds = spec_range(equipment_type, param)
+    if bounds is None:
+        if frame is None:
+            frame = load_equipment_log(equipment_type, equipment_id, columns=["timestamp", param], start=start, end=end)
+        values = pd.to_numeric(frame[param], errors='coerce').dropna().to_numpy(dtype=float)
+        counts, edges = np.histogram(values, bins=HIST_BINS)
+        return edges, counts, 0, 0
+    lo, hi = bounds
+    lo_day, hi_day = pd.Timestamp(start).strftime("%Y-%m-%d"), pd.Timestamp(end).strftime("%Y-%m-%d")
+    tokens = STORAGE.day_tokens(equipment_type, equipment_id)
+    if tokens is None:
+        if frame is None:
+            frame = load_equipment_log(equipment_type, equipment_id, columns=["timestamp", param], start=start, end=end)
+        fine = fine_histogram(pd.to_numeric(frame[param], errors='coerce').to_numpy(dtype=float), lo, hi)
+    else:
+        cache = _hist_cache()
+        key = log_key(equipment_type, equipment_id)
+        fine = np.zeros(HIST_FINE_BINS + 2, dtype=np.int64)
+        missing = []
+        for day, token in tokens.items():
+            if not lo_day <= day <= hi_day:
+                continue
+            hit = cache.get((key, param, lo, hi, day, token))
+            if hit is None:
+                missing.append((day, token))
+            else:
+                cache.move_to_end((key, param, lo, hi, day, token))
+                fine += hit
+        if missing:
+            if frame is None:
+                days = [d for d, _ in missing]
+                frame = load_equipment_log(equipment_type, equipment_id, columns=["timestamp", param],
+                                           start=pd.Timestamp(min(days)), end=pd.Timestamp(max(days)) + timedelta(days=1) - timedelta(microseconds=1))
+            partials = _day_partials(frame, param, lo, hi)
+            for day, token in missing:
+                part = partials.get(day)
+                if part is None:
+                    part = np.zeros(HIST_FINE_BINS + 2, dtype=np.int32)
+                cache[(key, param, lo, hi, day, token)] = part
+                fine += part
+            while len(cache) > HIST_CACHE_ENTRIES:
+                cache.popitem(last=False)
+    edges, counts = regroup_histogram(fine, lo, hi)
+    return edges, counts, int(fine[0]), int(fine[-1])
+
+# -------------------- Export --------------------
+# Exports are written on request, chunk by chunk, to a file under EXPORT_DIR
+# that a download button serves on that rerun only; nothing is built or read
+# on ordinary reruns.
+EXPORT_DIR = BASE_DIR / "exports"
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_TTL_S = 3600
+# Streamlit holds a served download in memory; larger exports stay on disk only.
+EXPORT_DOWNLOAD_MAX_BYTES = int(os.environ.get("CHECKLIST_DOWNLOAD_MAX_MB", 256)) * 2**20
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+def _prune_exports():
+    cutoff = datetime.now().timestamp() - EXPORT_TTL_S
+    for entry in os.scandir(EXPORT_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            with contextlib.suppress(OSError):
+                os.unlink(entry.path)
+
+@timed()
+def write_export(df: pd.DataFrame, fmt: str, prefix: str = "export") -> Path:
+    """Write ``df`` in EXPORT_CHUNK_ROWS chunks as ``fmt`` and return the file."""
+    suffix, _ = EXPORT_FORMATS[fmt]
+    EXPORT_DIR.mkdir(exist_ok=True)
+    _prune_exports()
+    fd, tmp = tempfile.mkstemp(dir=EXPORT_DIR, prefix=f"{prefix}_", suffix=suffix)
+    os.close(fd)
+    chunks = (df.iloc[i:i + EXPORT_CHUNK_ROWS] for i in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS))
+    try:
+        if fmt == "Parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            writer = None
+            try:
+                for chunk in chunks:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp, table.schema)
+                    writer.write_table(table.cast(writer.schema))
+            finally:
+                # Release the file before the except below unlinks it.
+                if writer is not None:
+                    writer.close()
+        else:
+            opener = gzip.open if suffix.endswith(".gz") else open
+            with opener(tmp, "wt", encoding="utf-8", newline="") as fh:
+                for i, chunk in enumerate(chunks):
+                    chunk.to_csv(fh, index=False, header=i == 0)
+    except Exception:
+        os.unlink(tmp)
+        raise
+    return Path(tmp)
+
+# -------------------- Parallel Loading --------------------
+# Fleet-wide reads fan out over one shared thread pool, since per-file latency
+# rather than CPU dominates on network volumes. Picklable CPU-heavy work can
+# go to a process pool instead. Results come back as each item finishes, with
+# either a value or that item's error, so one unreadable log never sinks a
+# scan and the UI can render as results arrive.
+LOAD_WORKERS = int(os.environ.get("CHECKLIST_LOAD_WORKERS", 0)) or min(32, (os.cpu_count() or 1) * 4)
+LOAD_PROCESSES = int(os.environ.get("CHECKLIST_LOAD_PROCESSES", 0))  # 0 = no process pool
+_LOAD_THREAD_PREFIX = "checklist-load"
+
+@_resource
+def _load_pool():
+    return ThreadPoolExecutor(max_workers=LOAD_WORKERS, thread_name_prefix=_LOAD_THREAD_PREFIX)
+
+@_resource
+def _process_pool():
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=LOAD_PROCESSES)
+
+@_resource
+def _load_errors():
+    return {}
+
+def record_load_error(key: str, error: BaseException = None):
+    """Remember (or, with no ``error``, clear) the last failure for ``key``."""
+    errors = _load_errors()
+    if error is None:
+        errors.pop(key, None)
+    else:
+        errors[key] = {"error": f"{type(error).__name__}: {error}", "at": datetime.utcnow().isoformat()}
+
+def load_errors() -> dict:
+    return dict(_load_errors())
+
+def load_parallel(func, items, workers: int = None, processes: bool = False):
+    """Yield ``(item, result, error)`` for ``func(item)`` over ``items`` as each finishes.
+
+    At most ``workers`` (default LOAD_WORKERS) items are in flight. With
+    ``processes`` and CHECKLIST_LOAD_PROCESSES set, a picklable ``func`` runs
+    on the process pool. Calls made from inside a loader thread, or for a
+    single item, run inline so nested fan-outs cannot starve the pool.
+    """
+    items = list(items)
+    inline = len(items) <= 1 or threading.current_thread().name.startswith(_LOAD_THREAD_PREFIX)
+    if inline:
+        for item in items:
+            try:
+                yield item, func(item), None
+            except Exception as e:
+                yield item, None, e
+        return
+    pool = _load_pool()
+    if processes and LOAD_PROCESSES:
+        try:
+            pickle.dumps(func)
+            pool = _process_pool()
+        except Exception:
+            pass  # closures and script-level functions stay on threads
+    limit = max(workers or LOAD_WORKERS, 1)
+    pending = items[::-1]
+    running = {}
+    while pending or running:
+        while pending and len(running) < limit:
+            item = pending.pop()
+            running[pool.submit(func, item)] = item
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for fut in done:
+            item = running.pop(fut)
+            error = fut.exception()
+            yield item, None if error else fut.result(), error
+
+# -------------------- Fleet Archive --------------------
+# A streaming ZIP writer: each member is raw-deflated on a worker thread (zlib
+# releases the GIL) into a spooled temp file, then copied into the archive
+# with its sizes and CRC already known, so no member is held whole in memory.
+# Sizes or offsets past 4 GiB switch the entry to ZIP64 records.
+ZIP_WORKERS = int(os.environ.get("CHECKLIST_ZIP_WORKERS", 0)) or min(os.cpu_count() or 1, 8)
+ZIP_READ_BYTES = 1024 * 1024
+ZIP_SPOOL_BYTES = 8 * 1024 * 1024
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_LEVELS = {"Stored": 0, "Fast": 1, "Default": 6, "Max": 9}
+
+def log_csv_chunks(equipment_type: str, equipment_id: int, start=None, end=None):
+    """Yield a log as CSV bytes in chunks, optionally limited to [start, end]."""
+    path = STORAGE.path(equipment_type, equipment_id)
+    if start is None and end is None and path.is_file() and path.suffix == ".csv":
+        with equipment_lock(equipment_type, equipment_id):
+            committed = path.stat().st_size
+        with open_log_prefix(path, committed) as fh:
+            while chunk := fh.read(ZIP_READ_BYTES):
+                yield chunk
+        return
+    # Read the backend directly so a fleet export does not flush the frame cache.
+    df = STORAGE.read(equipment_type, equipment_id, start=start, end=end)
+    for i in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+        yield df.iloc[i:i + EXPORT_CHUNK_ROWS].to_csv(index=False, header=i == 0).encode('utf-8')
+
+def _compress_member(chunks, level: int):
+    """Compress ``chunks`` into a spool -> (spool, crc, raw_size, packed_size)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_BYTES)
+    packer = zlib.compressobj(level, zlib.DEFLATED, -15) if level else None
+    crc = raw = 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        raw += len(chunk)
+        spool.write(packer.compress(chunk) if packer else chunk)
+    if packer:
+        spool.write(packer.flush())
+    packed = spool.tell()
+    spool.seek(0)
+    return spool, crc, raw, packed
+
+def _dos_time(when: datetime):
+    return (when.hour << 11) | (when.minute << 5) | (when.second // 2), \
+           ((when.year - 1980) << 9) | (when.month << 5) | when.day
+
+def write_fleet_zip(out, members, level: int = 6, workers: int = ZIP_WORKERS, progress=None) -> int:
+    """Write ``members`` [(name, chunk_iterable_factory)] to the binary stream ``out``.
+
+    At most ``2 * workers`` members are in flight; finished members are
+    written in completion order. ``progress(done, total, name)`` is called
+    after each. Returns the archive size.
+    """
+    method = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
+    dtime, ddate = _dos_time(datetime.now())
+    central = []
+    offset = 0
+    pending = list(members)[::-1]
+    total = len(pending)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        running = {}
+        while pending or running:
+            while pending and len(running) < 2 * max(workers, 1):
+                name, factory = pending.pop()
+                running[pool.submit(_compress_member, factory(), level)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                spool, crc, raw, packed = fut.result()
+                fname = name.encode("utf-8")
+                zip64 = raw >= ZIP64_LIMIT or packed >= ZIP64_LIMIT
+                extra = struct.pack("<HHQQ", 1, 16, raw, packed) if zip64 else b""
+                out.write(struct.pack("<IHHHHHIIIHH", 0x04034B50, 45 if zip64 else 20, 0x0800, method, dtime, ddate, crc,
+                                      0xFFFFFFFF if zip64 else packed, 0xFFFFFFFF if zip64 else raw, len(fname), len(extra)))
+                out.write(fname + extra)
+                with spool:
+                    shutil.copyfileobj(spool, out, ZIP_READ_BYTES)
+                central.append((fname, crc, raw, packed, offset, method))
+                offset += 30 + len(fname) + len(extra) + packed
+                if progress:
+                    progress(total - len(pending) - len(running), total, name)
+    cd_start = offset
+    for fname, crc, raw, packed, at, meth in central:
+        big = [v for v in (raw, packed, at) if v >= ZIP64_LIMIT]
+        extra = struct.pack(f"<HH{len(big)}Q", 1, 8 * len(big), *big) if big else b""
+        # Fields that overflowed are replaced by the marker and carried in the extra.
+        fields = [0xFFFFFFFF if v >= ZIP64_LIMIT else v for v in (packed, raw, at)]
+        out.write(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, 45 | (3 << 8), 45 if big else 20, 0x0800, meth, dtime, ddate,
+                              crc, fields[0], fields[1], len(fname), len(extra), 0, 0, 0, 0o100644 << 16, fields[2]))
+        out.write(fname + extra)
+        offset += 46 + len(fname) + len(extra)
+    cd_size = offset - cd_start
+    if len(central) >= 0xFFFF or cd_start >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+        out.write(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, len(central), len(central), cd_size, cd_start))
+        out.write(struct.pack("<IIQI", 0x07064B50, 0, offset, 1))
+        offset += 56 + 20
+        out.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0))
+    else:
+        out.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(central), len(central), cd_size, cd_start, 0))
+    return offset + 22
+
+@timed()
+def export_fleet_zip(manifest: dict, equipment_types=None, start=None, end=None, level: int = 6, progress=None) -> Path:
+    """Build a ZIP of the selected logs under EXPORT_DIR and return its path."""
+    members = [(f"{key}.csv", lambda e=e: log_csv_chunks(e["equipment_type"], e["equipment_id"], start, end))
+               for key, e in sorted(manifest.items())
+               if equipment_types is None or e["equipment_type"] in equipment_types]
+    EXPORT_DIR.mkdir(exist_ok=True)
+    _prune_exports()
+    fd, tmp = tempfile.mkstemp(dir=EXPORT_DIR, prefix="fleet_", suffix=".zip")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            write_fleet_zip(out, members, level=level, progress=progress)
+    except Exception:
+        os.unlink(tmp)
+        raise
+    return Path(tmp)
+
+@timed()
+def export_log_csv(equipment_type: str, equipment_id: int) -> Path:
+    """Write one whole log as CSV under EXPORT_DIR, chunk by chunk, and return the file."""
+    EXPORT_DIR.mkdir(exist_ok=True)
+    _prune_exports()
+    fd, tmp = tempfile.mkstemp(dir=EXPORT_DIR, prefix=f"{log_key(equipment_type, equipment_id)}_", suffix=".csv")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in log_csv_chunks(equipment_type, equipment_id):
+                out.write(chunk)
+    except Exception:
+        os.unlink(tmp)
+        raise
+    return Path(tmp)
+
+# -------------------- Rollups --------------------
+# Hourly and daily count/sum/sumsq/min/max/alarms per float parameter, kept
+# under rollups/<key>/<tier>.csv. Every append adds its partial aggregates as
+# new lines; reads merge partials per bucket and cache the merged frame per
+# parameter, extending it from the bytes added since. A file is rewritten
+# merged once partials clearly outnumber buckets. A log's rollups are built
+# from the full log the first time they are asked for.
+ROLLUP_DIR = BASE_DIR / "rollups"
+ROLLUP_TIERS = {"hourly": ("h", timedelta(hours=1)), "daily": ("D", timedelta(days=1))}
+ROLLUP_FIELDS = ["bucket", "param", "count", "sum", "sumsq", "min", "max", "alarms"]
+ROLLUP_COMPACT_SLACK = 10_000
+
+def rollup_params(equipment_type: str) -> list:
+    return [p for p, spec in PARAM_SPECS.get(equipment_type, {}).items() if spec[0] == "float"]
+
+def _rollup_partials(equipment_type: str, rows: pd.DataFrame, freq: str) -> pd.DataFrame:
+    cols = [p for p in rollup_params(equipment_type) if p in rows.columns]
+    if not cols or rows.empty:
+        return pd.DataFrame(columns=ROLLUP_FIELDS)
+    ts = pd.to_datetime(rows["timestamp"], errors='coerce', format="mixed")
+    alarms = rows["alarm_flag"].fillna(False).astype(bool).astype(int) if "alarm_flag" in rows.columns else 0
+    wide = rows[cols].apply(pd.to_numeric, errors='coerce').assign(bucket=ts.dt.floor(freq), alarms=alarms)
+    long = wide.melt(id_vars=["bucket", "alarms"], var_name="param", value_name="v").dropna(subset=["bucket", "v"])
+    long["v2"] = long["v"] * long["v"]
+    out = long.groupby(["bucket", "param"], sort=False).agg(
+        count=("v", "size"), sum=("v", "sum"), sumsq=("v2", "sum"), min=("v", "min"), max=("v", "max"), alarms=("alarms", "sum"))
+    return out.reset_index()[ROLLUP_FIELDS]
+
+def _merge_partials(df: pd.DataFrame) -> pd.DataFrame:
+    return df.groupby(["param", "bucket"]).agg(
+        count=("count", "sum"), sum=("sum", "sum"), sumsq=("sumsq", "sum"), min=("min", "min"), max=("max", "max"), alarms=("alarms", "sum"))
+
+def _combine_buckets(old: pd.DataFrame, part: pd.DataFrame) -> pd.DataFrame:
+    """Fold merged buckets ``part`` into ``old`` (both indexed by bucket)."""
+    dup = part.index.intersection(old.index)
+    if len(dup):
+        both = pd.concat([old.loc[dup], part.loc[dup]]).groupby(level=0)
+        old = old.copy()  # readers may still hold the cached frame
+        additive = ["count", "sum", "sumsq", "alarms"]
+        old.loc[dup, additive] = both[additive].sum()
+        old.loc[dup, "min"] = both["min"].min()
+        old.loc[dup, "max"] = both["max"].max()
+        part = part.drop(dup)
+    if len(part):
+        old = pd.concat([old, part])
+        if not old.index.is_monotonic_increasing:
+            old = old.sort_index()
+    return old
+
+def _rollup_path(key: str, tier: str) -> Path:
+    return ROLLUP_DIR / key / f"{tier}.csv"
+
+def _write_partials(key: str, equipment_type: str, rows: pd.DataFrame, root: Path = None):
+    for tier, (freq, _) in ROLLUP_TIERS.items():
+        part = _rollup_partials(equipment_type, rows, freq)
+        if part.empty:
+            continue
+        path = (root / f"{tier}.csv") if root else _rollup_path(key, tier)
+        new = not path.exists()
+        with open(path, "a", encoding="utf-8", newline="") as fh:
+            part.to_csv(fh, header=new, index=False, date_format="%Y-%m-%dT%H:%M:%S")
+
+def append_rollups(equipment_type: str, equipment_id: int, rows: pd.DataFrame):
+    """Add an append's partial aggregates; a no-op until the log's rollups exist."""
+    key = log_key(equipment_type, equipment_id)
+    with _named_lock(f"rollup:{key}"):
+        if (ROLLUP_DIR / key).is_dir():
+            _write_partials(key, equipment_type, rows)
+
+def ensure_rollups(equipment_type: str, equipment_id: int):
+    """Build a log's rollups from the full log if they do not exist yet."""
+    key = log_key(equipment_type, equipment_id)
+    if (ROLLUP_DIR / key).is_dir():
+        return
+    # Holding the equipment lock keeps appends from slipping in between the read and the swap.
+    with equipment_lock(equipment_type, equipment_id), _named_lock(f"rollup:{key}"):
+        if (ROLLUP_DIR / key).is_dir():
+            return
+        ROLLUP_DIR.mkdir(exist_ok=True)
+        stage = Path(tempfile.mkdtemp(prefix=f".{key}.", dir=ROLLUP_DIR))
+        try:
+            cols = ["timestamp", "alarm_flag"] + rollup_params(equipment_type)
+            _write_partials(key, equipment_type, STORAGE.read(equipment_type, equipment_id, columns=cols), root=stage)
+            os.replace(stage, ROLLUP_DIR / key)
+        except BaseException:
+            shutil.rmtree(stage, ignore_errors=True)
+            raise
+
+def drop_rollups(key: str):
+    with _named_lock(f"rollup:{key}"):
+        shutil.rmtree(ROLLUP_DIR / key, ignore_errors=True)
+        cache = _rollup_cache()
+        for tier in ROLLUP_TIERS:
+            cache.pop((key, tier), None)
+
+@_resource
+def _rollup_cache():
+    return {}
+
+def _merged_rollup(key: str, tier: str) -> dict:
+    """param -> merged frame indexed by bucket, kept in step with the tier file."""
+    path = _rollup_path(key, tier)
+    cache = _rollup_cache()
+    if not path.exists():
+        cache.pop((key, tier), None)
+        return {}
+    stat = path.stat()
+    cur = cache.get((key, tier))
+    if cur and cur["inode"] == stat.st_ino and cur["size"] == stat.st_size:
+        return cur["params"]
+    if cur and cur["inode"] == stat.st_ino and cur["size"] < stat.st_size:
+        with open(path, "rb") as fh:
+            header = fh.readline()
+            fh.seek(cur["size"])
+            tail = pd.read_csv(io.BytesIO(header + fh.read(stat.st_size - cur["size"])), parse_dates=["bucket"])
+        params, lines = dict(cur["params"]), cur["lines"] + len(tail)
+        for param, part in _merge_partials(tail).groupby(level="param"):
+            part = part.droplevel("param")
+            params[param] = part if param not in params else _combine_buckets(params[param], part)
+    else:
+        raw = pd.read_csv(path, parse_dates=["bucket"])
+        lines = len(raw)
+        params = {param: part.droplevel("param") for param, part in _merge_partials(raw).groupby(level="param")}
+    buckets = sum(len(p) for p in params.values())
+    if lines > 2 * buckets + ROLLUP_COMPACT_SLACK:
+        merged = pd.concat({p: f for p, f in params.items()}, names=["param", "bucket"]).reset_index()
+        _atomic_write_text(path, merged[ROLLUP_FIELDS].to_csv(index=False, date_format="%Y-%m-%dT%H:%M:%S"))
+        stat, lines = path.stat(), buckets
+    cache[(key, tier)] = {"inode": stat.st_ino, "size": stat.st_size, "lines": lines, "params": params}
+    return params
+
+@timed()
+def load_rollup(equipment_type: str, equipment_id: int, tier: str, param: str, start=None, end=None) -> pd.DataFrame:
+    """Buckets of ``param`` in [start, end] with count, mean, std, min, max, sum, sumsq, alarms."""
+    ensure_rollups(equipment_type, equipment_id)
+    key = log_key(equipment_type, equipment_id)
+    with _named_lock(f"rollup:{key}"):
+        frame = _merged_rollup(key, tier).get(param)
+    if frame is None:
+        return pd.DataFrame(columns=["timestamp", "count", "mean", "std", "min", "max", "sum", "sumsq", "alarms"])
+    frame = frame.loc[pd.Timestamp(start) if start is not None else None:pd.Timestamp(end) if end is not None else None]
+    out = frame.reset_index().rename(columns={"bucket": "timestamp"})
+    out["mean"] = out["sum"] / out["count"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["std"] = np.sqrt(np.maximum(out["sumsq"] - out["count"] * out["mean"] ** 2, 0) / (out["count"] - 1))
+    return out[["timestamp", "count", "mean", "std", "min", "max", "sum", "sumsq", "alarms"]]
+
+def rollup_tier(entry: dict, start, end, max_points: int = CHART_MAX_POINTS) -> str:
+    """"raw" when the range holds few enough readings to plot, else the finest tier that fits."""
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    rows = entry.get("rows", 0)
+    if entry.get("first_ts") and entry.get("last_ts"):
+        covered = (pd.Timestamp(entry["last_ts"]) - pd.Timestamp(entry["first_ts"])).total_seconds()
+        rows = rows * min(span.total_seconds() / max(covered, 1.0), 1.0)
+    if rows <= max_points:
+        return "raw"
+    for tier, (_, step) in ROLLUP_TIERS.items():
+        if span / step <= max_points:
+            return tier
+    return list(ROLLUP_TIERS)[-1]
+
+# -------------------- Fleet Queries --------------------
+# Cross-equipment views built on the rollup tiers: every log of a type is
+# aligned on one bucket grid (a wide frame, one column per equipment), and
+# bands, means and correlations are computed column-wise in NumPy.
+FLEET_CORR_MAX = 200  # widest correlation matrix worth drawing
+
+@timed()
+def fleet_grid(manifest: dict, equipment_type: str, param: str, start, end, tier: str = "hourly") -> pd.DataFrame:
+    """Bucket means of ``param`` for every ``equipment_type`` log, aligned on the ``tier`` grid."""
+    freq, _ = ROLLUP_TIERS[tier]
+    ids = sorted(e["equipment_id"] for e in manifest.values() if e["equipment_type"] == equipment_type and e.get("rows"))
+    grid = pd.date_range(pd.Timestamp(start).floor(freq), pd.Timestamp(end), freq=freq, name="timestamp")
+    if not ids:
+        return pd.DataFrame(index=grid)
+    def column(eid):
+        roll = load_rollup(equipment_type, eid, tier, param, start=start, end=end)
+        return pd.Series(roll["mean"].to_numpy(), index=pd.DatetimeIndex(roll["timestamp"]), name=eid)
+    cols = {}
+    for eid, col, error in load_parallel(column, ids):
+        record_load_error(log_key(equipment_type, eid), error)
+        if error is None:
+            cols[eid] = col
+    if not cols:
+        return pd.DataFrame(index=grid)
+    return pd.concat([cols[eid] for eid in ids if eid in cols], axis=1).reindex(grid)
+
+def fleet_summary(grid: pd.DataFrame, band=(10, 90)) -> pd.DataFrame:
+    """Per-bucket reporting count, mean, median and percentile band across equipment."""
+    values = grid.to_numpy(dtype=float)
+    reporting = (~np.isnan(values)).sum(axis=1)
+    out = pd.DataFrame({"reporting": reporting}, index=grid.index)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN buckets
+        out["mean"] = np.nanmean(values, axis=1) if values.size else np.nan
+        lo, med, hi = np.nanpercentile(values, [band[0], 50, band[1]], axis=1) if values.size else (np.nan,) * 3
+    out["low"], out["median"], out["high"] = lo, med, hi
+    return out
+
+def fleet_deviation(grid: pd.DataFrame, summary: pd.DataFrame) -> pd.DataFrame:
+    """Mean distance of each equipment from the fleet median, in fleet-band widths."""
+    width = (summary["high"] - summary["low"]).replace(0, np.nan)
+    score = grid.sub(summary["median"], axis=0).div(width, axis=0)
+    return pd.DataFrame({"equipment_id": grid.columns, "deviation": score.abs().mean().to_numpy(),
+                         "bias": score.mean().to_numpy(), "buckets": grid.notna().sum().to_numpy()}) \
+        .sort_values("deviation", ascending=False, na_position="last").reset_index(drop=True)
+
+def fleet_correlation(grid: pd.DataFrame, min_periods: int = 3) -> pd.DataFrame:
+    return grid.corr(min_periods=min_periods)
+
+# -------------------- Online Anomaly Scoring --------------------
+# Every write is scored against persisted per-parameter rolling state (the
+# last ``window`` values plus their Welford mean/M2), so alarm_flag is set
+# at entry time in O(window) work regardless of history length. Scores match
+# score_anomalies over the full log with the same window and threshold.
+ANOMALY_STATE_DIR = BASE_DIR / "anomaly_state"
+ONLINE_WINDOW = 24
+ONLINE_Z_THRESH = 3.0
+ONLINE_MIN_POINTS = 5
+
+def online_settings(emeta: dict):
+    cfg = (emeta or {}).get("online", {})
+    return int(cfg.get("window") or ONLINE_WINDOW), float(cfg.get("z_thresh") or ONLINE_Z_THRESH)
+
+def _welford_add(pst: dict, x: float):
+    pst["n"] += 1
+    d = x - pst["mean"]
+    pst["mean"] += d / pst["n"]
+    pst["m2"] += d * (x - pst["mean"])
+
+def _welford_remove(pst: dict, x: float):
+    pst["n"] -= 1
+    if pst["n"] == 0:
+        pst["mean"] = pst["m2"] = 0.0
+        return
+    d = x - pst["mean"]
+    pst["mean"] -= d / pst["n"]
+    pst["m2"] = max(pst["m2"] - d * (x - pst["mean"]), 0.0)
+
+def _param_state(values: list, seen: int = 0) -> dict:
+    """Fresh Welford state over ``values`` (None marks a missing reading)."""
+    pst = {"values": list(values), "n": 0, "mean": 0.0, "m2": 0.0, "seen": seen}
+    for v in values:
+        if v is not None:
+            _welford_add(pst, v)
+    return pst
+
+def _z_from_state(pst: dict, x: float) -> float:
+    if pst["seen"] < ONLINE_MIN_POINTS or pst["n"] < 2:
+        return np.nan
+    std = float(np.sqrt(pst["m2"] / (pst["n"] - 1)))
+    if std <= 1e-12 * (abs(pst["mean"]) + 1.0):
+        return np.nan
+    return (x - pst["mean"]) / std
+
+def _score_one(pst: dict, x: float, window: int) -> float:
+    valid = not np.isnan(x)
+    pst["values"].append(float(x) if valid else None)
+    if valid:
+        _welford_add(pst, float(x))
+        pst["seen"] += 1
+    while len(pst["values"]) > window:
+        old = pst["values"].pop(0)
+        if old is not None:
+            _welford_remove(pst, old)
+    return _z_from_state(pst, x) if valid else np.nan
+
+def _score_batch(pst: dict, x: np.ndarray, window: int) -> np.ndarray:
+    prior = np.array([np.nan if v is None else v for v in pst["values"]], dtype="float64")
+    allv = np.concatenate([prior, x])
+    mean, std = rolling_mean_std(allv[:, None], window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = ((allv - mean[:, 0]) / np.where(std[:, 0] > 0, std[:, 0], np.nan))[len(prior):]
+    seen = pst["seen"] + np.cumsum(~np.isnan(x))
+    z[seen < ONLINE_MIN_POINTS] = np.nan
+    tail = [None if np.isnan(v) else float(v) for v in allv[-window:]]
+    pst.clear()
+    pst.update(_param_state(tail, int(seen[-1])))
+    return z
+
+def score_online(equipment_type: str, equipment_id: int, rows: pd.DataFrame) -> pd.DataFrame:
+    """Set ``alarm_flag`` on rows about to be written.
+
+    The advanced rolling state is only staged here; save_online_state
+    persists it once the rows are in the log, so a failed write leaves the
+    stored window in step with the log.
+    """
+    key = f"{equipment_type}_{int(equipment_id)}"
+    emeta = get_meta(key) or {}
+    window, z_thresh = online_settings(emeta)
+    store = _state_store()
+    state = store.get(key) or {}
+    flags = np.zeros(len(rows), dtype=bool)
+    for p, spec in PARAM_SPECS.get(equipment_type, {}).items():
+        if spec[0] != "float" or p not in rows.columns:
+            continue
+        x = pd.to_numeric(rows[p], errors='coerce').to_numpy(dtype="float64")
+        pst = state.get(p)
+        if pst is None:
+            pst = _param_state([])
+        elif len(pst["values"]) > window:
+            pst = _param_state(pst["values"][-window:], pst["seen"])
+        z = np.array([_score_one(pst, x[0], window)]) if len(x) == 1 else _score_batch(pst, x, window)
+        state[p] = pst
+        bounds = emeta.get("params", {}).get(p, {})
+        with np.errstate(invalid="ignore"):
+            if bounds.get("min") is not None:
+                flags |= x < bounds["min"]
+            if bounds.get("max") is not None:
+                flags |= x > bounds["max"]
+            flags |= np.abs(z) > z_thresh
+    _staged_states()[key] = state
+    rows = rows.copy()
+    rows["alarm_flag"] = flags
+    return rows
+
+def save_online_state(equipment_type: str, equipment_id: int):
+    """Persist the state score_online staged for rows that have now been written."""
+    key = f"{equipment_type}_{int(equipment_id)}"
+    state = _staged_states().pop(key, None)
+    if state is not None:
+        _state_store().put(key, state)
+
+def online_state_lock(equipment_type: str, equipment_id: int):
+    """Flock on one log's rolling state, for other processes scoring the same log.
+
+    Held from score_online until save_online_state, so two writers never
+    score against the same stale window.
+    """
+    return _open_locked(_state_store().root / f"{equipment_type}_{int(equipment_id)}.lock")
+
+@_resource
+def _staged_states():
+    return {}
+
+@_resource
+def _state_store():
+    return MetaStore(ANOMALY_STATE_DIR)
+
+# -------------------- Shared Helpers --------------------
+@_resource
+def _named_lock(name: str):
+    return threading.RLock()
+
+def equipment_lock(equipment_type: str, equipment_id: int):
+    """Process-wide lock serializing writes (and compaction) of one equipment log."""
+    return _named_lock(f"log:{log_key(equipment_type, equipment_id)}")
+
+def _read_json(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text())
+    except Exception:
+        return {}
+
+def _atomic_write_text(path: Path, text: str):
+    """Write ``text`` to a sibling temp file and rename it over ``path``."""
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+def _write_json(path: Path, obj: dict):
+    _atomic_write_text(path, json.dumps(obj, indent=2))
+
+# -------------------- Metadata Store --------------------
+# One JSON shard per equipment under equipment_meta/, written atomically, so
+# updating one equipment never re-serializes the registry. Shards are cached
+# in-process and re-read only when their mtime changes; the directory mtime
+# tells us cheaply whether anything changed at all. A legacy
+# equipment_meta.json is split into shards on first use.
+class MetaStore:
+    def __init__(self, root: Path, legacy: Path = None):
+        self.root = root
+        self.root.mkdir(exist_ok=True)
+        self.lock = threading.RLock()
+        self.entries = {}
+        self.dir_mtime = None
+        if legacy is not None and legacy.exists():
+            self._migrate(legacy)
+
+    def _shard(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _migrate(self, legacy: Path):
+        try:
+            data = json.loads(legacy.read_text())
+        except Exception:
+            return
+        for key, entry in data.items():
+            if not self._shard(key).exists():
+                _write_json(self._shard(key), entry)
+        os.replace(legacy, legacy.with_suffix(".json.migrated"))
+
+    def _refresh(self):
+        mtime = self.root.stat().st_mtime_ns
+        if mtime == self.dir_mtime:
+            return
+        seen = set()
+        for entry in os.scandir(self.root):
+            if not entry.name.endswith(".json") or entry.name.startswith("."):
+                continue
+            key = entry.name[:-len(".json")]
+            seen.add(key)
+            shard_mtime = entry.stat().st_mtime_ns
+            cached = self.entries.get(key)
+            if cached is None or cached[0] != shard_mtime:
+                try:
+                    self.entries[key] = (shard_mtime, json.loads(Path(entry.path).read_text()))
+                except Exception:
+                    continue
+        for key in set(self.entries) - seen:
+            del self.entries[key]
+        self.dir_mtime = mtime
+
+    def get(self, key: str):
+        """One entry; only its own shard is stat'ed, never the whole directory."""
+        with self.lock:
+            shard = self._shard(key)
+            try:
+                mtime = shard.stat().st_mtime_ns
+            except FileNotFoundError:
+                self.entries.pop(key, None)
+                return None
+            cached = self.entries.get(key)
+            if cached is None or cached[0] != mtime:
+                try:
+                    cached = self.entries[key] = (mtime, json.loads(shard.read_text()))
+                except Exception:
+                    pass  # mid-replace by another writer: keep what we had
+            return copy.deepcopy(cached[1]) if cached else None
+
+    def all(self) -> dict:
+        with self.lock:
+            self._refresh()
+            return {k: copy.deepcopy(v) for k, (_, v) in self.entries.items()}
+
+    @contextlib.contextmanager
+    def _own_write(self):
+        """Keep the directory mtime current across a write we cache ourselves."""
+        current = self.root.stat().st_mtime_ns == self.dir_mtime
+        yield
+        if current:
+            self.dir_mtime = self.root.stat().st_mtime_ns
+
+    def put(self, key: str, entry: dict):
+        with self.lock, self._own_write():
+            shard = self._shard(key)
+            _write_json(shard, entry)
+            self.entries[key] = (shard.stat().st_mtime_ns, copy.deepcopy(entry))
+
+    def delete(self, key: str):
+        with self.lock, self._own_write():
+            self._shard(key).unlink(missing_ok=True)
+            self.entries.pop(key, None)
+
+    def put_many(self, entries: dict):
+        """Write only the shards whose content differs from what is stored."""
+        with self.lock:
+            self._refresh()
+            for key, entry in entries.items():
+                cached = self.entries.get(key)
+                if cached is None or cached[1] != entry:
+                    self.put(key, entry)
+
+@_resource
+def _meta_store():
+    return MetaStore(META_DIR, legacy=META_FILE)
+
+def _filter_range(df: pd.DataFrame, start=None, end=None) -> pd.DataFrame:
+    if (start is None and end is None) or "timestamp" not in df.columns:
+        return df
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= df["timestamp"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= df["timestamp"] <= pd.Timestamp(end)
+    return df.loc[mask]
+
+def _wanted_columns(columns):
+    """Requested columns in schema order; timestamp is always kept for range filters."""
+    if columns is None:
+        return None
+    wanted = set(columns) | {"timestamp"}
+    return [c for c in WIDE_COLUMNS if c in wanted]
+
+# -------------------- Equipment Registry --------------------
+# Every known piece of equipment with its site, tags and creation time, in
+# SQLite so selectors can search thousands of assets and counts per type or
+# site come from an index rather than the log directory. init_equipment
+# registers new equipment; refresh_manifest picks up logs that arrive by
+# other means (copied in, restored, imported by another process).
+REGISTRY_FILE = BASE_DIR / "equipment_registry.db"
+REGISTRY_PAGE = 200
+
+def normalize_tags(tags) -> list:
+    """Sorted, lower-cased, de-duplicated tags from a comma-separated string or an iterable."""
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return sorted({t.strip().lower() for t in tags or () if t and t.strip()})
+
+def _like(token: str) -> str:
+    return token.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+class EquipmentRegistry:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS equipment (
+            equipment_type TEXT NOT NULL,
+            equipment_id INTEGER NOT NULL,
+            site TEXT,
+            tags TEXT NOT NULL DEFAULT '',
+            created TEXT NOT NULL,
+            PRIMARY KEY (equipment_type, equipment_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS equipment_by_site ON equipment (site, equipment_type, equipment_id);
+        CREATE TABLE IF NOT EXISTS equipment_tag (
+            tag TEXT NOT NULL,
+            equipment_type TEXT NOT NULL,
+            equipment_id INTEGER NOT NULL,
+            PRIMARY KEY (tag, equipment_type, equipment_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS equipment_tag_by_equipment ON equipment_tag (equipment_type, equipment_id);
+    """
+
+    def __init__(self, path: Path = REGISTRY_FILE):
+        self.path = path
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+        self.known = {log_key(t, i) for t, i in self.db.execute("SELECT equipment_type, equipment_id FROM equipment")}
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.db
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    def register_many(self, items) -> int:
+        """Add ``(equipment_type, equipment_id, site, tags, created)`` items that are new; returns how many."""
+        now = datetime.utcnow().isoformat()
+        added = []
+        with self._transaction() as db:
+            for equipment_type, equipment_id, site, tags, created in items:
+                equipment_id, tags = int(equipment_id), normalize_tags(tags)
+                cur = db.execute("INSERT OR IGNORE INTO equipment VALUES (?, ?, ?, ?, ?)",
+                                 (equipment_type, equipment_id, (site or "").strip() or None, ",".join(tags), created or now))
+                if cur.rowcount:
+                    db.executemany("INSERT OR IGNORE INTO equipment_tag VALUES (?, ?, ?)",
+                                   [(t, equipment_type, equipment_id) for t in tags])
+                    added.append(log_key(equipment_type, equipment_id))
+        self.known.update(added)
+        return len(added)
+
+    def register(self, equipment_type: str, equipment_id: int, site: str = None, tags=(), created: str = None) -> bool:
+        if log_key(equipment_type, equipment_id) in self.known:
+            return False
+        return self.register_many([(equipment_type, equipment_id, site, tags, created)]) == 1
+
+    def ensure(self, keys) -> int:
+        """Register any log keys not yet known, taking the creation time from their metadata."""
+        missing = set(keys) - self.known
+        items = []
+        for key in sorted(missing):
+            equipment_type, equipment_id = parse_log_key(key)
+            items.append((equipment_type, equipment_id, None, (), (get_meta(key) or {}).get("created")))
+        return self.register_many(items) if items else 0
+
+    def update(self, equipment_type: str, equipment_id: int, site: str = None, tags=None):
+        """Set the site and/or tags of registered equipment; None leaves a field unchanged."""
+        ident = (equipment_type, int(equipment_id))
+        with self._transaction() as db:
+            if site is not None:
+                db.execute("UPDATE equipment SET site = ? WHERE equipment_type = ? AND equipment_id = ?", (site.strip() or None, *ident))
+            if tags is not None:
+                tags = normalize_tags(tags)
+                db.execute("UPDATE equipment SET tags = ? WHERE equipment_type = ? AND equipment_id = ?", (",".join(tags), *ident))
+                db.execute("DELETE FROM equipment_tag WHERE equipment_type = ? AND equipment_id = ?", ident)
+                db.executemany("INSERT INTO equipment_tag VALUES (?, ?, ?)", [(t, *ident) for t in tags])
+
+    def get(self, equipment_type: str, equipment_id: int):
+        with self.lock:
+            row = self.db.execute("SELECT * FROM equipment WHERE equipment_type = ? AND equipment_id = ?",
+                                  (equipment_type, int(equipment_id))).fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _where(equipment_type: str = None, query: str = "", site: str = None, tag: str = None):
+        """SQL filter for the equipment alias ``e``; every word of ``query`` must match an ID prefix, site or tag."""
+        clauses, args = [], []
+        if equipment_type:
+            clauses.append("e.equipment_type = ?")
+            args.append(equipment_type)
+        if site:
+            clauses.append("e.site = ?")
+            args.append(site)
+        if tag:
+            clauses.append("EXISTS (SELECT 1 FROM equipment_tag t WHERE t.tag = ? "
+                           "AND t.equipment_type = e.equipment_type AND t.equipment_id = e.equipment_id)")
+            args.append(tag.strip().lower())
+        for word in (query or "").lower().split():
+            clauses.append("(CAST(e.equipment_id AS TEXT) LIKE ? ESCAPE '\\' OR lower(e.site) LIKE ? ESCAPE '\\' "
+                           "OR EXISTS (SELECT 1 FROM equipment_tag t WHERE t.equipment_type = e.equipment_type "
+                           "AND t.equipment_id = e.equipment_id AND t.tag LIKE ? ESCAPE '\\'))")
+            word = _like(word)
+            args += [f"{word}%", f"%{word}%", f"{word}%"]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def search(self, equipment_type: str = None, query: str = "", site: str = None, tag: str = None,
+               limit: int = REGISTRY_PAGE, offset: int = 0) -> list:
+        """Matching equipment ordered by type and ID; ``limit=None`` returns every match."""
+        limit = -1 if limit is None else limit
+        where, args = self._where(equipment_type, query, site, tag)
+        with self.lock:
+            rows = self.db.execute(f"SELECT * FROM equipment e{where} ORDER BY e.equipment_type, e.equipment_id LIMIT ? OFFSET ?",
+                                   args + [limit, offset]).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self, equipment_type: str = None, query: str = "", site: str = None, tag: str = None) -> int:
+        where, args = self._where(equipment_type, query, site, tag)
+        with self.lock:
+            return self.db.execute(f"SELECT COUNT(*) FROM equipment e{where}", args).fetchone()[0]
+
+    def counts(self, by: str = "equipment_type", **filters) -> dict:
+        """Equipment per type or per site (None for equipment without a site)."""
+        if by not in ("equipment_type", "site"):
+            raise ValueError(f"Cannot group equipment by {by!r}")
+        where, args = self._where(**filters)
+        with self.lock:
+            return dict(self.db.execute(f"SELECT e.{by}, COUNT(*) FROM equipment e{where} GROUP BY e.{by} ORDER BY e.{by}", args).fetchall())
+
+    def next_id(self, equipment_type: str) -> int:
+        with self.lock:
+            return (self.db.execute("SELECT MAX(equipment_id) FROM equipment WHERE equipment_type = ?", (equipment_type,)).fetchone()[0] or 0) + 1
+
+    def sites(self) -> list:
+        with self.lock:
+            return [r[0] for r in self.db.execute("SELECT DISTINCT site FROM equipment WHERE site IS NOT NULL ORDER BY site")]
+
+    def tags(self) -> list:
+        with self.lock:
+            return [r[0] for r in self.db.execute("SELECT DISTINCT tag FROM equipment_tag ORDER BY tag")]
+
+@_resource
+def _registry():
+    registry = EquipmentRegistry()
+    if not registry.known:
+        # First open: adopt the equipment that predates the registry, from its
+        # metadata shards and its logs, the way MetaStore migrates a legacy file.
+        keys = {log_key(*parse_log_key(key)) for key in _meta_store().all()}
+        registry.ensure(keys | {key for key, _, _ in STORAGE.entries()})
+    return registry
+
+def register_equipment(equipment_type: str, equipment_id: int, site: str = None, tags=(), created: str = None) -> bool:
+    """Add equipment to the registry; returns False if it was already there."""
+    return _registry().register(equipment_type, equipment_id, site=site, tags=tags, created=created)
+
+def find_equipment(equipment_type: str = None, query: str = "", site: str = None, tag: str = None, limit: int = REGISTRY_PAGE) -> list:
+    return _registry().search(equipment_type, query, site=site, tag=tag, limit=limit)
+
+def equipment_counts(by: str = "equipment_type", **filters) -> dict:
+    return _registry().counts(by, **filters)
+
+# -------------------- Backups --------------------
+# Content-addressed, incremental snapshots. Each snapshot manifest lists, per
+# log file, its size and the ordered chunks that rebuild it; chunks live once
+# under objects/<sha256> (zlib-compressed). Logs are append-only, so when the
+# bytes just before the last snapshot's end are unchanged only the new tail
+# is stored. Retention keeps the newest snapshots, one per day for a while,
+# and drops the oldest past a disk cap; unreferenced objects are then swept.
+BACKUP_CHUNK_BYTES = 16 * 1024 * 1024
+BACKUP_TAIL_BYTES = 4096
+BACKUP_MAX_CHUNKS = 64  # a file's chunk chain is rewritten once it gets longer than this
+BACKUP_KEEP_LAST = int(os.environ.get("CHECKLIST_BACKUP_KEEP", 10))
+BACKUP_KEEP_DAYS = int(os.environ.get("CHECKLIST_BACKUP_DAYS", 14))
+BACKUP_MAX_BYTES = int(os.environ.get("CHECKLIST_BACKUP_MAX_MB", 0)) * 1024 * 1024  # 0 = no cap
+
+def _log_files(path: Path) -> list:
+    """(name, path) of every file making up a log, named relative to LOG/STORE dir."""
+    if path.is_dir():
+        return sorted((f"{path.name}/{p.relative_to(path).as_posix()}", p) for p in path.rglob("*")
+                      if p.is_file() and not p.name.startswith("."))
+    return [(path.name, path)] if path.exists() else []
+
+def _hash_range(path: Path, start: int, end: int) -> str:
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        return hashlib.sha256(fh.read(end - start)).hexdigest()
+
+class BackupStore:
+    def __init__(self, root: Path = BACKUP_DIR):
+        self.root = root
+        self.objects = root / "objects"
+        self.snaps = root / "snapshots"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.snaps.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+
+    # ---- objects
+    def _object_path(self, sha: str) -> Path:
+        return self.objects / sha[:2] / sha
+
+    def _put(self, data: bytes) -> tuple:
+        """Store ``data`` once; returns (sha, length, new_bytes_on_disk)."""
+        sha = hashlib.sha256(data).hexdigest()
+        target = self._object_path(sha)
+        if target.exists():
+            return sha, len(data), 0
+        target.parent.mkdir(exist_ok=True)
+        packed = zlib.compress(data, 1)
+        fd, tmp = tempfile.mkstemp(prefix=f".{sha}.", dir=target.parent)
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(packed)
+        os.replace(tmp, target)
+        return sha, len(data), len(packed)
+
+    def read_object(self, sha: str) -> bytes:
+        """Chunk bytes, verified against their checksum."""
+        data = zlib.decompress(self._object_path(sha).read_bytes())
+        if hashlib.sha256(data).hexdigest() != sha:
+            raise ValueError(f"Backup object {sha[:12]} is corrupt")
+        return data
+
+    def _put_range(self, path: Path, start: int, end: int) -> tuple:
+        chunks, added = [], 0
+        with open(path, "rb") as fh:
+            fh.seek(start)
+            pos = start
+            while pos < end:
+                data = fh.read(min(BACKUP_CHUNK_BYTES, end - pos))
+                if not data:
+                    raise ValueError(f"{path.name} shrank during backup")
+                sha, length, new = self._put(data)
+                chunks.append([sha, length])
+                added += new
+                pos += length
+        return chunks, added
+
+    def _rechunk(self, chunks: list) -> tuple:
+        """Coalesce a long chain of small chunks into BACKUP_CHUNK_BYTES pieces."""
+        out, added, buf = [], 0, bytearray()
+        for sha, _ in chunks:
+            buf += self.read_object(sha)
+            while len(buf) >= BACKUP_CHUNK_BYTES:
+                sha2, length, new = self._put(bytes(buf[:BACKUP_CHUNK_BYTES]))
+                out.append([sha2, length])
+                added += new
+                del buf[:BACKUP_CHUNK_BYTES]
+        if buf:
+            sha2, length, new = self._put(bytes(buf))
+            out.append([sha2, length])
+            added += new
+        return out, added
+
+    # ---- snapshots
+    def snapshot_ids(self) -> list:
+        return sorted(p.stem for p in self.snaps.glob("*.json"))
+
+    def load(self, snap_id: str) -> dict:
+        return _read_json(self.snaps / f"{snap_id}.json")
+
+    def snapshots(self) -> list:
+        return [self.load(s) for s in self.snapshot_ids()]
+
+    def _previous(self, keys: list) -> dict:
+        """Latest backed-up entry per key, walking snapshots newest first."""
+        found = {}
+        for snap_id in reversed(self.snapshot_ids()):
+            if len(found) == len(keys):
+                break
+            logs = self.load(snap_id).get("logs", {})
+            for key in keys:
+                if key not in found and key in logs:
+                    found[key] = logs[key]
+        return found
+
+    def _backup_file(self, path: Path, committed: int, previous: dict) -> tuple:
+        """Return (file_entry, new_bytes) for the first ``committed`` bytes of ``path``."""
+        prev_size = previous.get("size", -1)
+        inode = path.stat().st_ino
+        reuse = 0 <= prev_size <= committed and previous.get("inode") == inode and previous.get("tail") == \
+            _hash_range(path, max(prev_size - BACKUP_TAIL_BYTES, 0), prev_size)
+        if reuse:
+            chunks, added = self._put_range(path, prev_size, committed)
+            chunks = previous["chunks"] + chunks
+        else:
+            chunks, added = self._put_range(path, 0, committed)
+        if len(chunks) > BACKUP_MAX_CHUNKS:
+            chunks, more = self._rechunk(chunks)
+            added += more
+        entry = {"size": committed, "inode": inode, "tail": _hash_range(path, max(committed - BACKUP_TAIL_BYTES, 0), committed),
+                 "chunks": chunks}
+        return entry, added
+
+    def _backup_log(self, key: str, previous: dict) -> tuple:
+        equipment_type, equipment_id = parse_log_key(key)
+        path = STORAGE.path(equipment_type, equipment_id)
+        prev_files = previous.get("files", {})
+        files, added = {}, 0
+        if not STORAGE.files:
+            # Rows live in one shared database; back up an export of this log.
+            name = f"{key}.csv"
+            with tempfile.TemporaryDirectory(prefix=".export_", dir=self.root) as tmp:
+                export = Path(tmp) / name
+                with equipment_lock(equipment_type, equipment_id):
+                    STORAGE.read(equipment_type, equipment_id).to_csv(export, index=False)
+                files[name], added = self._backup_file(export, export.stat().st_size, prev_files.get(name, {}))
+        elif path.is_file():
+            # Append-only: the committed prefix is stable without holding the lock.
+            with equipment_lock(equipment_type, equipment_id):
+                committed = path.stat().st_size
+            files[path.name], added = self._backup_file(path, committed, prev_files.get(path.name, {}))
+        else:
+            # Compaction rewrites partition files in place; hold the log still.
+            with equipment_lock(equipment_type, equipment_id):
+                for name, p in _log_files(path):
+                    files[name], new = self._backup_file(p, p.stat().st_size, prev_files.get(name, {}))
+                    added += new
+        return {"backend": STORAGE.name, "equipment_type": equipment_type, "equipment_id": equipment_id,
+                "files": files}, added
+
+    @timed("backup.snapshot")
+    def snapshot(self, keys, progress=None) -> dict:
+        """Back up ``keys`` into one new snapshot; ``progress(done, total, key)``."""
+        keys = sorted(keys)
+        with self.lock:
+            previous = self._previous(keys)
+            logs, errors, added = {}, {}, 0
+            backup = lambda key: self._backup_log(key, previous.get(key, {}))
+            for i, (key, result, error) in enumerate(load_parallel(backup, keys), start=1):
+                record_load_error(key, error)
+                if error is None:
+                    logs[key], new = result
+                    added += new
+                else:
+                    errors[key] = f"{type(error).__name__}: {error}"
+                if progress:
+                    progress(i, len(keys), key)
+            now = datetime.utcnow()
+            snap = {"id": now.strftime("%Y%m%dT%H%M%S%fZ"), "created": now.isoformat(), "added_bytes": added,
+                    "logs": dict(sorted(logs.items())), "errors": errors}
+            _write_json(self.snaps / f"{snap['id']}.json", snap)
+        return snap
+
+    # ---- retention
+    def usage(self) -> int:
+        return sum(e.stat().st_size for d in os.scandir(self.objects) if d.is_dir() for e in os.scandir(d.path))
+
+    def _newest_per_log(self) -> set:
+        """Snapshots holding the newest backup of at least one log."""
+        seen, pinned = set(), set()
+        for snap_id in reversed(self.snapshot_ids()):
+            logs = set(self.load(snap_id).get("logs", {}))
+            if logs - seen:
+                pinned.add(snap_id)
+                seen |= logs
+        return pinned
+
+    def prune(self, keep_last: int = BACKUP_KEEP_LAST, keep_days: int = BACKUP_KEEP_DAYS, max_bytes: int = BACKUP_MAX_BYTES) -> dict:
+        """Apply retention, then sweep unreferenced objects; returns what was removed.
+
+        The newest snapshot of every log is always kept, even past the cap.
+        """
+        with self.lock:
+            ids = self.snapshot_ids()
+            pinned = self._newest_per_log()
+            keep = set(ids[-keep_last:]) | pinned if keep_last else set(pinned)
+            cutoff = (datetime.utcnow() - timedelta(days=keep_days)).strftime("%Y%m%d")
+            newest_per_day = {}
+            for snap_id in ids:
+                newest_per_day[snap_id[:8]] = snap_id
+            keep |= {s for day, s in newest_per_day.items() if day >= cutoff}
+            dropped = [s for s in ids if s not in keep]
+            for snap_id in dropped:
+                (self.snaps / f"{snap_id}.json").unlink()
+            freed = self._sweep()
+            # Past the cap, drop the oldest remaining unpinned snapshots.
+            for snap_id in [s for s in self.snapshot_ids() if s not in pinned]:
+                if not max_bytes or self.usage() <= max_bytes:
+                    break
+                (self.snaps / f"{snap_id}.json").unlink()
+                dropped.append(snap_id)
+                freed += self._sweep()
+        return {"snapshots": dropped, "freed_bytes": freed}
+
+    def _sweep(self) -> int:
+        live = {sha for snap in self.snapshots() for log in snap.get("logs", {}).values()
+                for f in log.get("files", {}).values() for sha, _ in f["chunks"]}
+        freed = 0
+        for d in os.scandir(self.objects):
+            if not d.is_dir():
+                continue
+            for e in os.scandir(d.path):
+                if e.name not in live:
+                    freed += e.stat().st_size
+                    os.unlink(e.path)
+        return freed
+
+@_resource
+def _backup_store():
+    return BackupStore()
+
+def backup_fleet(manifest: dict, progress=None) -> dict:
+    """Snapshot every log in ``manifest`` and apply the retention policy."""
+    store = _backup_store()
+    snap = store.snapshot(manifest.keys(), progress=progress)
+    snap["pruned"] = store.prune()
+    return snap
+
+# -------------------- Restore --------------------
+# Rebuild logs as of a point in time from the newest snapshot taken at or
+# before it. Chunks are streamed into a staging area next to the log, each
+# verified against its sha256, and the result is swapped in with os.replace
+# while writers are held off. Derived state for the log is then dropped.
+def snapshot_for(key: str, as_of: datetime = None, store: "BackupStore" = None):
+    """(snapshot_id, log_entry) of the newest backup of ``key`` at or before ``as_of`` (UTC)."""
+    store = store or _backup_store()
+    bound = as_of.strftime("%Y%m%dT%H%M%S%fZ") if as_of else None
+    for snap_id in reversed(store.snapshot_ids()):
+        if bound and snap_id > bound:
+            continue
+        entry = store.load(snap_id).get("logs", {}).get(key)
+        if entry:
+            return snap_id, entry
+    return None, None
+
+def _stage_file(store: "BackupStore", target: Path, spec: dict):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    size = 0
+    with open(target, "wb") as fh:
+        for sha, length in spec["chunks"]:
+            data = store.read_object(sha)
+            if len(data) != length:
+                raise ValueError(f"Backup chunk {sha[:12]} has the wrong length")
+            fh.write(data)
+            size += length
+        fh.flush()
+        os.fsync(fh.fileno())
+    if size != spec["size"]:
+        raise ValueError(f"Restored {target.name} is {size} bytes, expected {spec['size']}")
+
+def _forget_log(key: str, path: Path):
+    """Drop every derived view of a log that was replaced wholesale, and only of that log."""
+    _frame_cache().forget(path)
+    _day_index_cache().pop(path, None)
+    hist = _hist_cache()
+    for k in [k for k in hist if k[0] == key]:
+        hist.pop(k, None)
+    _manifest_store().delete(key)
+    _latest_store().delete(key)
+    _staged_states().pop(key, None)
+    _state_store().delete(key)
+    drop_rollups(key)
+    update_manifest(key, path)
+
+@timed()
+def restore_log(key: str, as_of: datetime = None, safety: bool = True) -> dict:
+    """Restore one log to its newest snapshot at or before ``as_of``.
+
+    With ``safety`` the current state is snapshotted first, so the restore
+    itself can be undone.
+    """
+    store = _backup_store()
+    snap_id, entry = snapshot_for(key, as_of, store)
+    if entry is None:
+        raise ValueError(f"No backup of {key} at or before {as_of}")
+    if entry["backend"] != STORAGE.name:
+        raise ValueError(f"{key} was backed up from the {entry['backend']} backend, active is {STORAGE.name}")
+    equipment_type, equipment_id = entry["equipment_type"], entry["equipment_id"]
+    path = STORAGE.path(equipment_type, equipment_id)
+    if safety and STORAGE.exists(equipment_type, equipment_id):
+        store.snapshot([key])
+    stage = Path(tempfile.mkdtemp(prefix=f".restore_{key}_", dir=path.parent if STORAGE.files else store.root))
+    try:
+        with store.lock:  # keep retention from sweeping chunks mid-restore
+            for name, spec in entry["files"].items():
+                _stage_file(store, stage / name, spec)
+        staged = stage / (path.name if STORAGE.files else f"{key}.csv")
+        if not staged.exists():  # a store directory that had no files yet
+            staged.mkdir()
+        with _journal().exclusive(), equipment_lock(equipment_type, equipment_id):
+            if not STORAGE.files:
+                with pd.read_csv(staged, chunksize=SQLITE_BATCH_ROWS) as chunks:
+                    STORAGE.replace(equipment_type, equipment_id, chunks)
+            elif path.is_dir():
+                retired = stage / f".{path.name}.replaced"
+                os.replace(path, retired)
+                os.replace(staged, path)
+            else:
+                os.replace(staged, path)
+            _forget_log(key, path)
+    finally:
+        shutil.rmtree(stage, ignore_errors=True)
+    return {"key": key, "snapshot": snap_id, "bytes": sum(f["size"] for f in entry["files"].values())}
+
+def restore_fleet(as_of: datetime = None, keys=None, progress=None) -> list:
+    """Restore every backed-up log (or ``keys``) as of ``as_of``; staging runs in parallel.
+
+    One safety snapshot of the logs about to be replaced is taken first. A
+    log that fails to restore is reported with an ``error`` and left as it
+    was. Restore never deletes a log: current logs (all of them, when
+    ``keys`` is None) that have no snapshot at or before ``as_of`` are left
+    as they are and reported with ``kept`` set, so the caller can tell the
+    fleet is not exactly as it was at ``as_of``.
+    """
+    store = _backup_store()
+    current = {key for key, _, _ in STORAGE.entries()}
+    if keys is None:
+        keys = sorted({k for s in store.snapshot_ids() for k in store.load(s).get("logs", {})} | current)
+    restorable = [key for key in keys if snapshot_for(key, as_of, store)[0]]
+    results = [{"key": key, "snapshot": None, "kept": True, "bytes": 0}
+               for key in keys if key in current and key not in restorable]
+    replaced = [key for key in restorable if key in current]
+    if replaced:
+        store.snapshot(replaced)
+    for i, (key, result, error) in enumerate(load_parallel(lambda k: restore_log(k, as_of, safety=False), restorable), start=1):
+        results.append(result if error is None else {"key": key, "error": f"{type(error).__name__}: {error}", "bytes": 0})
+        if progress:
+            progress(i, len(restorable), key)
+    return results
+
+# -------------------- Storage Backends --------------------
+# All persistence goes through STORAGE. The CSV backend is the original one
+# wide file per equipment; the Parquet backend partitions each equipment by
+# month and buffers appends in a small CSV delta that is compacted in the
+# background; the SQLite backend keeps every log in one indexed WAL-mode
+# database. Select with CHECKLIST_STORAGE=csv|parquet|sqlite.
+STORE_DIR = BASE_DIR / "store"
+SQLITE_FILE = BASE_DIR / "checklist_store.db"
+SQLITE_BATCH_ROWS = 5000
+STORAGE_BACKEND = os.environ.get("CHECKLIST_STORAGE", "csv").lower()
+DELTA_COMPACT_BYTES = 256 * 1024
+COMPACT_INTERVAL_S = 30
+FLOAT_COLUMNS = [c for c in WIDE_COLUMNS
+                 if any(spec.get(c, ("",))[0] == "float" for spec in PARAM_SPECS.values())]
+
+def typed_log_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Coerce a log frame to the storage schema (datetime, floats, strings)."""
+    out = df.reindex(columns=WIDE_COLUMNS).copy()
+    out["timestamp"] = pd.to_datetime(out["timestamp"], errors='coerce')
+    for c in FLOAT_COLUMNS + ["hour"]:
+        out[c] = pd.to_numeric(out[c], errors='coerce').astype("float64")
+    out["equipment_id"] = pd.to_numeric(out["equipment_id"], errors='coerce').astype("Int64")
+    out["alarm_flag"] = out["alarm_flag"].map(
+        lambda v: None if pd.isna(v) else str(v).strip().lower() in ("true", "1", "yes")).astype("boolean")
+    for c in WIDE_COLUMNS:
+        if c not in FLOAT_COLUMNS and c not in ("timestamp", "hour", "equipment_id", "alarm_flag"):
+            out[c] = out[c].astype(str).where(out[c].notna(), None).astype(object)
+    return out
+
+class StorageBackend:
+    """Interface every storage engine implements.
+
+    ``path`` is the on-disk location of one equipment log (a file or a
+    directory, or just a name when ``files`` is False); ``signature`` is a
+    cheap (size, mtime)-like pair used by the manifest and latest-reading
+    index to detect changes.
+    """
+    name = "base"
+    files = True  # logs are plain files that backups copy as they are
+
+    def path(self, equipment_type: str, equipment_id: int) -> Path:
+        raise NotImplementedError
+
+    def exists(self, equipment_type: str, equipment_id: int) -> bool:
+        return self.path(equipment_type, equipment_id).exists()
+
+    def create(self, equipment_type: str, equipment_id: int):
+        raise NotImplementedError
+
+    def read(self, equipment_type: str, equipment_id: int, columns=None, start=None, end=None) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def append(self, equipment_type: str, equipment_id: int, frame: pd.DataFrame):
+        raise NotImplementedError
+
+    def append_file(self, equipment_type: str, equipment_id: int, nrows: int):
+        """CSV file that ``nrows`` new rows can be appended to as text, or None.
+
+        The append journal writes through this file; backends returning None
+        are written with ``append`` under the equipment lock instead.
+        """
+        return None
+
+    def after_append(self, equipment_type: str, equipment_id: int):
+        pass
+
+    def replace(self, equipment_type: str, equipment_id: int, frames):
+        """Swap a log's rows for those of the ``frames`` chunks in one step (restore, when ``files`` is False)."""
+        raise NotImplementedError
+
+    def entries(self):
+        """Yield (key, path, signature) for every stored equipment log."""
+        raise NotImplementedError
+
+    def signature(self, path: Path):
+        raise NotImplementedError
+
+    def summarize(self, path: Path, signature, previous: dict = None) -> dict:
+        """Return rows, first_ts and last_ts for a log."""
+        raise NotImplementedError
+
+    def latest_row(self, path: Path):
+        raise NotImplementedError
+
+    def day_tokens(self, equipment_type: str, equipment_id: int):
+        """Map day -> token that changes whenever that day's rows change, or None."""
+        return None
+
+    def compact_path(self, path: Path):
+        pass
+
+    def compact(self):
+        for _, path, _ in self.entries():
+            self.compact_path(path)
+
+class CsvBackend(StorageBackend):
+    name = "csv"
+
+    def path(self, equipment_type: str, equipment_id: int) -> Path:
+        return equipment_filename(equipment_type, equipment_id)
+
+    def create(self, equipment_type: str, equipment_id: int):
+        pd.DataFrame(columns=WIDE_COLUMNS).to_csv(self.path(equipment_type, equipment_id), index=False)
+
+    def read(self, equipment_type: str, equipment_id: int, columns=None, start=None, end=None) -> pd.DataFrame:
+        fn = self.path(equipment_type, equipment_id)
+        wanted = _wanted_columns(columns)
+        usecols = None if wanted is None else (lambda c: c in wanted)
+        # Appends only ever add bytes, so the prefix committed when we look is
+        # a consistent snapshot even while writers keep going.
+        with equipment_lock(equipment_type, equipment_id):
+            committed = fn.stat().st_size
+        if start is None and end is None:
+            opener = lambda: open_log_prefix(fn, committed)
+        else:
+            # Parse only the byte spans of the days in range, per the sidecar index.
+            data = read_day_spans(fn, committed, start, end)
+            opener = lambda: io.BytesIO(data)
+        with span("csv.parse"):
+            try:
+                with opener() as fh:
+                    df = pd.read_csv(fh, parse_dates=["timestamp"], usecols=usecols)
+            except Exception:
+                with opener() as fh:
+                    df = pd.read_csv(fh, usecols=usecols)
+        if "timestamp" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["timestamp"]):
+            # Midnight readings are written date-only, which defeats parse_dates.
+            with span("csv.to_datetime"):
+                df["timestamp"] = pd.to_datetime(df["timestamp"], errors='coerce', format="mixed")
+        return _filter_range(df, start, end)
+
+    def append(self, equipment_type: str, equipment_id: int, frame: pd.DataFrame):
+        fn = self.path(equipment_type, equipment_id)
+        header = not fn.exists() or fn.stat().st_size == 0
+        frame.to_csv(fn, mode='a', header=header, index=False)
+
+    def append_file(self, equipment_type: str, equipment_id: int, nrows: int):
+        return self.path(equipment_type, equipment_id)
+
+    def entries(self):
+        for entry in os.scandir(LOG_DIR):
+            if entry.name.endswith(".csv") and entry.is_file():
+                stat = entry.stat()
+                yield Path(entry.name).stem, LOG_DIR / entry.name, (stat.st_size, stat.st_mtime)
+
+    def signature(self, path: Path):
+        if not path.exists():
+            return None
+        stat = path.stat()
+        return stat.st_size, stat.st_mtime
+
+    def summarize(self, path: Path, signature, previous: dict = None) -> dict:
+        if previous and previous.get("backend") == self.name and 0 < previous["size"] <= signature[0] \
+                and previous["mtime"] <= signature[1]:
+            # Logs are append-only: only the bytes written since the last scan are new.
+            added, first, last = scan_log_rows(path, previous["size"], previous.get("first_ts"), previous.get("last_ts"))
+            return {"rows": previous["rows"] + added, "first_ts": first, "last_ts": last}
+        rows, first, last = scan_log_rows(path)
+        return {"rows": rows, "first_ts": first, "last_ts": last}
+
+    def latest_row(self, path: Path):
+        return read_latest_row(path)
+
+    def day_tokens(self, equipment_type: str, equipment_id: int):
+        fn = self.path(equipment_type, equipment_id)
+        with equipment_lock(equipment_type, equipment_id):
+            committed = fn.stat().st_size
+        index = time_index(fn, committed)
+        return {day: (index.inode, tuple(map(tuple, spans))) for day, spans in index.days.items() if day != "undated"}
+
+class ParquetBackend(StorageBackend):
+    name = "parquet"
+
+    def __init__(self, root: Path = STORE_DIR):
+        import pyarrow  # noqa: F401  (fail at selection time, not on first read)
+        self.root = root
+        self.root.mkdir(exist_ok=True)
+
+    def path(self, equipment_type: str, equipment_id: int) -> Path:
+        return self.root / log_key(equipment_type, equipment_id)
+
+    def create(self, equipment_type: str, equipment_id: int):
+        self.path(equipment_type, equipment_id).mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _schema():
+        import pyarrow as pa
+        fields = []
+        for c in WIDE_COLUMNS:
+            if c == "timestamp":
+                fields.append((c, pa.timestamp("us")))
+            elif c in FLOAT_COLUMNS or c == "hour":
+                fields.append((c, pa.float64()))
+            elif c == "equipment_id":
+                fields.append((c, pa.int64()))
+            elif c == "alarm_flag":
+                fields.append((c, pa.bool_()))
+            else:
+                fields.append((c, pa.string()))
+        return pa.schema(fields)
+
+    @staticmethod
+    def _partitions(path: Path, start=None, end=None):
+        parts = sorted(path.glob("*.parquet"))
+        lo = pd.Timestamp(start).strftime("%Y-%m") if start is not None else None
+        hi = pd.Timestamp(end).strftime("%Y-%m") if end is not None else None
+        if lo is None and hi is None:
+            return parts
+        # Undated rows can never satisfy a time range.
+        return [p for p in parts if p.stem != "undated"
+                and (lo is None or p.stem >= lo) and (hi is None or p.stem <= hi)]
+
+    @staticmethod
+    def _read_delta(path: Path, columns=None) -> pd.DataFrame:
+        delta = path / "delta.csv"
+        if not delta.exists() or delta.stat().st_size == 0:
+            return pd.DataFrame(columns=columns or WIDE_COLUMNS)
+        df = pd.read_csv(delta, usecols=None if columns is None else (lambda c: c in columns))
+        return typed_log_frame(df)[columns or WIDE_COLUMNS]
+
+    @timed("parquet.read")
+    def read(self, equipment_type: str, equipment_id: int, columns=None, start=None, end=None) -> pd.DataFrame:
+        import pyarrow.parquet as pq
+        path = self.path(equipment_type, equipment_id)
+        cols = _wanted_columns(columns)
+        filters = []
+        if start is not None:
+            filters.append(("timestamp", ">=", pd.Timestamp(start).to_pydatetime()))
+        if end is not None:
+            filters.append(("timestamp", "<=", pd.Timestamp(end).to_pydatetime()))
+        with _named_lock(f"log:{path.name}"):
+            frames = [pq.read_table(p, columns=cols, filters=filters or None).to_pandas()
+                      for p in self._partitions(path, start, end)]
+            frames.append(_filter_range(self._read_delta(path, cols), start, end))
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame(columns=cols or WIDE_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def append(self, equipment_type: str, equipment_id: int, frame: pd.DataFrame):
+        path = self.path(equipment_type, equipment_id)
+        path.mkdir(parents=True, exist_ok=True)
+        with _named_lock(f"log:{path.name}"):
+            delta = self.append_file(equipment_type, equipment_id, len(frame))
+            if delta is None:
+                # Bulk writes skip the delta and go straight to the partitions.
+                self._merge_partitions(path, typed_log_frame(frame))
+                return
+            header = not delta.exists() or delta.stat().st_size == 0
+            frame.reindex(columns=WIDE_COLUMNS).to_csv(delta, mode='a', header=header, index=False)
+        self.after_append(equipment_type, equipment_id)
+
+    def append_file(self, equipment_type: str, equipment_id: int, nrows: int):
+        if nrows * 200 >= DELTA_COMPACT_BYTES:
+            return None
+        path = self.path(equipment_type, equipment_id)
+        path.mkdir(parents=True, exist_ok=True)
+        return path / "delta.csv"
+
+    def after_append(self, equipment_type: str, equipment_id: int):
+        path = self.path(equipment_type, equipment_id)
+        delta = path / "delta.csv"
+        if delta.exists() and delta.stat().st_size >= DELTA_COMPACT_BYTES:
+            _compactor().request(path)
+
+    def _merge_partitions(self, path: Path, frame: pd.DataFrame):
+        """Merge typed rows into their month partitions (caller holds the log lock)."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = self._schema()
+        months = frame["timestamp"].dt.strftime("%Y-%m").fillna("undated")
+        staged = []
+        for month, part in frame.groupby(months, sort=False):
+            target = path / f"{month}.parquet"
+            if target.exists():
+                part = pd.concat([pq.read_table(target).to_pandas(), part], ignore_index=True)
+            part = part.sort_values("timestamp", kind="stable")
+            tmp = target.with_suffix(".parquet.tmp")
+            pq.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False), tmp)
+            staged.append((tmp, target))
+        for tmp, target in staged:
+            os.replace(tmp, target)
+
+    def compact_path(self, path: Path):
+        delta = path / "delta.csv"
+        if not delta.exists():
+            return
+        # Deleting the delta invalidates journal offsets, so checkpoint first.
+        with _journal().exclusive(), _named_lock(f"log:{path.name}"):
+            if not delta.exists():
+                return
+            with _open_locked(delta, "rb"):  # and hold off other processes' appends
+                frame = self._read_delta(path)
+                if not frame.empty:
+                    self._merge_partitions(path, frame)
+                delta.unlink()
+
+    def entries(self):
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                path = self.root / entry.name
+                yield entry.name, path, self.signature(path)
+
+    def signature(self, path: Path):
+        if not path.is_dir():
+            return None
+        size, mtime = 0, path.stat().st_mtime
+        for entry in os.scandir(path):
+            stat = entry.stat()
+            size += stat.st_size
+            mtime = max(mtime, stat.st_mtime)
+        return size, mtime
+
+    def summarize(self, path: Path, signature, previous: dict = None) -> dict:
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+        rows, first, last = 0, None, None
+        for part in self._partitions(path):
+            ts = pq.read_table(part, columns=["timestamp"])["timestamp"]
+            rows += len(ts)
+            bounds = pc.min_max(ts).as_py()
+            if bounds["min"] is not None:
+                first, last = _merge_ts_bounds(first, last, [bounds["min"], bounds["max"]])
+        delta = path / "delta.csv"
+        if delta.exists() and delta.stat().st_size:
+            added, first, last = scan_log_rows(delta, 0, first, last)
+            rows += added
+        return {"rows": rows, "first_ts": first, "last_ts": last}
+
+    def latest_row(self, path: Path):
+        import pyarrow.parquet as pq
+        dated = [p for p in self._partitions(path) if p.stem != "undated"]
+        frames = [self._read_delta(path)]
+        if dated:
+            frames.append(pq.read_table(dated[-1]).to_pandas())
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return None
+        df = pd.concat(frames, ignore_index=True)
+        return _row_record(df, _latest_of(df))
+
+class DeltaCompactor:
+    """Background thread that folds Parquet delta segments into partitions."""
+
+    def __init__(self, compact_fn):
+        self.compact_fn = compact_fn
+        self.pending = set()
+        self.cv = threading.Condition()
+        threading.Thread(target=self._run, name="checklist-compactor", daemon=True).start()
+
+    def request(self, path: Path):
+        with self.cv:
+            self.pending.add(path)
+            self.cv.notify()
+
+    def _run(self):
+        while True:
+            with self.cv:
+                self.cv.wait_for(lambda: self.pending, timeout=COMPACT_INTERVAL_S)
+                batch, self.pending = self.pending, set()
+            for path in batch:
+                try:
+                    self.compact_fn(path)
+                except Exception:
+                    # Leave the delta in place; the next request retries it.
+                    pass
+
+@_resource
+def _compactor():
+    return DeltaCompactor(lambda path: STORAGE.compact_path(path))
+
+class SqliteBackend(StorageBackend):
+    """Every log in one SQLite table, in WAL mode so readers never block the writer.
+
+    ``readings`` is clustered on (equipment_type, equipment_id, timestamp,
+    seq), so that key is a covering index: a range read or a latest-row
+    lookup is one contiguous scan. ``seq`` keeps duplicate timestamps and
+    insertion order; undated rows are stored with an empty timestamp and
+    sort first. ``logs`` keeps rows, first and last timestamp and a change
+    stamp per log, so signatures, manifest summaries and existence checks
+    are a single primary-key lookup.
+    """
+    name = "sqlite"
+    files = False
+    TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"  # fixed width, so text order is time order
+
+    def __init__(self, path: Path = SQLITE_FILE):
+        self.file = path
+        self.local = threading.local()
+        decl = {c: "REAL" if c in FLOAT_COLUMNS or c == "hour" else "TEXT" for c in WIDE_COLUMNS}
+        decl.update(timestamp="TEXT NOT NULL", equipment_type="TEXT NOT NULL", equipment_id="INTEGER NOT NULL",
+                    alarm_flag="INTEGER", seq="INTEGER NOT NULL")
+        db = self._conn()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(f"""
+            CREATE TABLE IF NOT EXISTS readings (
+                {', '.join(f'{c} {t}' for c, t in decl.items())},
+                PRIMARY KEY (equipment_type, equipment_id, timestamp, seq)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS logs (
+                equipment_type TEXT NOT NULL,
+                equipment_id INTEGER NOT NULL,
+                rows INTEGER NOT NULL DEFAULT 0,
+                first_ts TEXT,
+                last_ts TEXT,
+                changed REAL NOT NULL,
+                PRIMARY KEY (equipment_type, equipment_id)
+            ) WITHOUT ROWID;
+        """)
+        self.insert = f"INSERT INTO readings ({', '.join(WIDE_COLUMNS)}, seq) VALUES ({', '.join('?' * (len(WIDE_COLUMNS) + 1))})"
+
+    def _conn(self) -> sqlite3.Connection:
+        """This thread's connection (a forked worker opens its own)."""
+        db = getattr(self.local, "db", None)
+        if db is None or self.local.pid != os.getpid():
+            db = sqlite3.connect(self.file, timeout=30, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db, self.local.pid = db, os.getpid()
+        return db
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def path(self, equipment_type: str, equipment_id: int) -> Path:
+        # Not a file: names the log for locks, caches and the manifest.
+        return self.file / log_key(equipment_type, equipment_id)
+
+    def exists(self, equipment_type: str, equipment_id: int) -> bool:
+        return self._log(equipment_type, equipment_id) is not None
+
+    def create(self, equipment_type: str, equipment_id: int):
+        self._conn().execute("INSERT OR IGNORE INTO logs (equipment_type, equipment_id, changed) VALUES (?, ?, ?)",
+                             (equipment_type, int(equipment_id), datetime.now().timestamp()))
+
+    def _log(self, equipment_type: str, equipment_id: int):
+        return self._conn().execute(
+            "SELECT rows, changed, first_ts, last_ts FROM logs WHERE equipment_type = ? AND equipment_id = ?",
+            (equipment_type, int(equipment_id))).fetchone()
+
+    def _bound(self, value) -> str:
+        return pd.Timestamp(value).strftime(self.TS_FORMAT)
+
+    def _frame(self, cursor, columns: list) -> pd.DataFrame:
+        df = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+        for c in columns:
+            if c == "timestamp":
+                df[c] = pd.to_datetime(df[c], format=self.TS_FORMAT, errors='coerce')
+            elif c in FLOAT_COLUMNS or c == "hour":
+                df[c] = df[c].astype("float64")
+            elif c == "equipment_id":
+                df[c] = df[c].astype("Int64")
+            elif c == "alarm_flag":
+                df[c] = df[c].astype("boolean")
+        return df
+
+    @timed("sqlite.read")
+    def read(self, equipment_type: str, equipment_id: int, columns=None, start=None, end=None) -> pd.DataFrame:
+        cols = _wanted_columns(columns) or WIDE_COLUMNS
+        sql = f"SELECT {', '.join(cols)} FROM readings WHERE equipment_type = ? AND equipment_id = ?"
+        params = [equipment_type, int(equipment_id)]
+        if start is not None:
+            sql += " AND timestamp >= ?"
+            params.append(self._bound(start))
+        elif end is not None:
+            sql += " AND timestamp > ''"  # undated rows never match a range
+        if end is not None:
+            sql += " AND timestamp <= ?"
+            params.append(self._bound(end))
+        return self._frame(self._conn().execute(sql + " ORDER BY timestamp, seq", params), cols)
+
+    def _records(self, equipment_type: str, equipment_id: int, frame: pd.DataFrame, seq: int) -> list:
+        """Parameter tuples for the prepared INSERT, in WIDE_COLUMNS order plus ``seq``."""
+        typed = typed_log_frame(frame)
+        typed["equipment_type"], typed["equipment_id"] = equipment_type, int(equipment_id)
+        # strftime is ~30x slower than numpy for the same fixed-width text.
+        stamps = np.datetime_as_string(typed["timestamp"].to_numpy("datetime64[us]"), unit="us")
+        out = typed.astype(object).where(typed.notna(), None)
+        out["timestamp"] = np.where(stamps == "NaT", "", stamps)
+        out["seq"] = range(seq, seq + len(out))
+        return list(out.itertuples(index=False, name=None))
+
+    def _write(self, db, equipment_type: str, equipment_id: int, frame: pd.DataFrame, seq: int = 0):
+        """Insert ``frame`` in batches; returns (rows, first, last) of what was written."""
+        rows, first, last = 0, None, None
+        with span("sqlite.insert"):
+            for i in range(0, len(frame), SQLITE_BATCH_ROWS):
+                records = self._records(equipment_type, equipment_id, frame.iloc[i:i + SQLITE_BATCH_ROWS], seq + i)
+                db.executemany(self.insert, records)
+                stamps = [r[0] for r in records if r[0]]
+                if stamps:
+                    lo, hi = min(stamps), max(stamps)
+                    first = lo if first is None else min(first, lo)
+                    last = hi if last is None else max(last, hi)
+                rows += len(records)
+        return rows, first, last
+
+    def append(self, equipment_type: str, equipment_id: int, frame: pd.DataFrame):
+        key = (equipment_type, int(equipment_id))
+        with self._transaction() as db:
+            db.execute("INSERT OR IGNORE INTO logs (equipment_type, equipment_id, changed) VALUES (?, ?, 0)", key)
+            seq = db.execute("SELECT rows FROM logs WHERE equipment_type = ? AND equipment_id = ?", key).fetchone()[0]
+            rows, first, last = self._write(db, equipment_type, equipment_id, frame, seq)
+            db.execute("""
+                UPDATE logs SET rows = rows + ?, changed = ?,
+                    first_ts = min(coalesce(first_ts, ?), coalesce(?, first_ts)),
+                    last_ts = max(coalesce(last_ts, ?), coalesce(?, last_ts))
+                WHERE equipment_type = ? AND equipment_id = ?
+            """, (rows, datetime.now().timestamp(), first, first, last, last, *key))
+
+    def replace(self, equipment_type: str, equipment_id: int, frames):
+        key = (equipment_type, int(equipment_id))
+        rows, first, last = 0, None, None
+        with self._transaction() as db:
+            db.execute("DELETE FROM readings WHERE equipment_type = ? AND equipment_id = ?", key)
+            for frame in frames:
+                n, lo, hi = self._write(db, equipment_type, equipment_id, frame, rows)
+                rows += n
+                first = lo if first is None else min(first, lo or first)
+                last = hi if last is None else max(last, hi or last)
+            db.execute("INSERT OR REPLACE INTO logs (equipment_type, equipment_id, rows, first_ts, last_ts, changed) "
+                       "VALUES (?, ?, ?, ?, ?, ?)", (*key, rows, first, last, datetime.now().timestamp()))
+
+    def entries(self):
+        for equipment_type, equipment_id, rows, changed in self._conn().execute(
+                "SELECT equipment_type, equipment_id, rows, changed FROM logs"):
+            yield log_key(equipment_type, equipment_id), self.path(equipment_type, equipment_id), (rows, changed)
+
+    def signature(self, path: Path):
+        log = self._log(*parse_log_key(path.name))
+        return None if log is None else (log[0], log[1])
+
+    def summarize(self, path: Path, signature, previous: dict = None) -> dict:
+        log = self._log(*parse_log_key(path.name))
+        if log is None:
+            raise FileNotFoundError(path.name)
+        iso = lambda v: None if v is None else pd.Timestamp(v).isoformat()
+        return {"rows": log[0], "first_ts": iso(log[2]), "last_ts": iso(log[3])}
+
+    def latest_row(self, path: Path):
+        equipment_type, equipment_id = parse_log_key(path.name)
+        cursor = self._conn().execute(
+            f"SELECT {', '.join(WIDE_COLUMNS)} FROM readings WHERE equipment_type = ? AND equipment_id = ? "
+            "ORDER BY timestamp DESC, seq DESC LIMIT 1", (equipment_type, int(equipment_id)))
+        df = self._frame(cursor, WIDE_COLUMNS)
+        return None if df.empty else _row_record(df, df.index[0])
+
+    def compact(self):
+        # Fold the WAL back into the database and refresh the planner's statistics.
+        db = self._conn()
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.execute("PRAGMA optimize")
+
+STORAGE_BACKENDS = {"csv": CsvBackend, "parquet": ParquetBackend, "sqlite": SqliteBackend}
+STORAGE = STORAGE_BACKENDS.get(STORAGE_BACKEND, CsvBackend)()
+
+def migrate_csv_logs(target: StorageBackend, progress=None) -> int:
+    """Copy every ``logs/*.csv`` into ``target``; equipment already present is skipped."""
+    source = CsvBackend()
+    logs = sorted((key, path) for key, path, _ in source.entries())
+    moved = 0
+    for i, (key, path) in enumerate(logs, start=1):
+        equipment_type, equipment_id = parse_log_key(key)
+        if not target.exists(equipment_type, equipment_id):
+            df = source.read(equipment_type, equipment_id)
+            target.create(equipment_type, equipment_id)
+            if not df.empty:
+                target.append(equipment_type, equipment_id, df)
+            target.compact_path(target.path(equipment_type, equipment_id))
+            moved += len(df)
+        if progress:
+            progress(i, len(logs))
+    return moved
+
+# -------------------- Append Journal --------------------
+# Concurrent writers queue their rows; whichever writer gets the commit lock
+# first commits everything queued so far. The batch goes to the journal with
+# one fsync, then each log is appended under its equipment lock (plus an
+# flock where available, for other processes). Logs are fsynced and the
+# journal truncated at checkpoints. Every process keeps its own journal
+# (append_journal.<pid>.<random>.log); those left by a crashed process are
+# replayed.
+JOURNAL_FILE = BASE_DIR / "append_journal.log"
+JOURNAL_CHECKPOINT_BYTES = 4 * 1024 * 1024
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+class _PrefixReader(io.RawIOBase):
+    def __init__(self, fh, limit: int):
+        self.fh = fh
+        self.remaining = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        n = min(len(buf), self.remaining)
+        if n <= 0:
+            return 0
+        data = self.fh.read(n)
+        buf[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self.fh.close()
+        super().close()
+
+def open_log_prefix(fn: Path, size: int):
+    """Binary reader over the first ``size`` bytes of ``fn``."""
+    return io.BufferedReader(_PrefixReader(open(fn, "rb"), size))
+
+def _open_locked(path: Path, mode: str = "ab"):
+    """Open ``path`` holding an exclusive flock (released on close).
+
+    If another process replaced or unlinked the file while we waited for
+    the lock, the new file is opened instead.
+    """
+    while True:
+        fh = open(path, mode)
+        if fcntl is None:
+            return fh
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        try:
+            if os.fstat(fh.fileno()).st_ino == os.stat(path).st_ino:
+                return fh
+        except FileNotFoundError:
+            pass
+        fh.close()
+
+class _PendingAppend:
+    def __init__(self, storage, equipment_type, equipment_id, rows, on_applied, prepare, lock):
+        self.storage = storage
+        self.equipment_type = equipment_type
+        self.equipment_id = int(equipment_id)
+        self.rows = rows
+        self.on_applied = on_applied
+        self.prepare = prepare
+        self.lock = lock
+        self.done = False
+        self.error = None
+
+class AppendJournal:
+    def __init__(self, base: Path):
+        self.base = base
+        self.queue = []
+        self.queue_lock = threading.Lock()
+        self.commit_lock = threading.Lock()
+        self.dirty = set()
+        self.commits = self.appends = self.rows = 0
+        self.failures = {}  # log key -> last derived-state update that raised
+        self.recover()
+        fd, path = tempfile.mkstemp(prefix=f"{base.stem}.{os.getpid()}.", suffix=base.suffix, dir=base.parent)
+        os.close(fd)
+        self.path = Path(path)
+        self.fh = _open_locked(self.path, "a")
+
+    def submit(self, storage, equipment_type: str, equipment_id: int, rows: pd.DataFrame,
+               on_applied=None, prepare=None, lock=None) -> pd.DataFrame:
+        """Append ``rows`` and return them as written.
+
+        ``prepare(equipment_type, equipment_id, rows)`` runs under the
+        equipment lock in commit order and may rewrite the rows (e.g. to set
+        ``alarm_flag``); ``on_applied`` runs right after the write. The context
+        manager ``lock(equipment_type, equipment_id)`` returns is held from
+        before ``prepare`` until ``on_applied`` has run.
+        """
+        item = _PendingAppend(storage, equipment_type, equipment_id, rows, on_applied, prepare, lock)
+        with self.queue_lock:
+            self.queue.append(item)
+        with self.commit_lock:
+            if not item.done:
+                with self.queue_lock:
+                    batch, self.queue = self.queue, []
+                self._commit(batch)
+        if item.error is not None:
+            raise item.error
+        return item.rows
+
+    def _commit(self, batch: list):
+        """Commit a batch; each log's group succeeds or fails on its own."""
+        groups = {}
+        for item in batch:
+            groups.setdefault((item.storage.name, log_key(item.equipment_type, item.equipment_id)), []).append(item)
+        failed = False
+        try:
+            with contextlib.ExitStack() as stack:
+                # Sorted, so processes committing overlapping logs take the flocks in one order.
+                groups = [items for _, items in sorted(groups.items())]
+                for items in groups:
+                    stack.enter_context(_named_lock(f"log:{log_key(items[0].equipment_type, items[0].equipment_id)}"))
+                plan = []
+                for items in groups:
+                    try:
+                        plan.append(self._plan(items, stack))
+                    except Exception as e:
+                        failed = self._fail(items, e)
+                try:
+                    self._write_journal([r for _, _, _, r in plan if r is not None])
+                except Exception as e:
+                    for items, *_ in plan:
+                        failed = self._fail(items, e)
+                    plan = []
+                for items, rows, fh, record in plan:
+                    try:
+                        self._apply(items, rows, fh, record)
+                    except Exception as e:
+                        failed = self._fail(items, e)
+            self.commits += 1
+            self.appends += sum(item.error is None for item in batch)
+        finally:
+            for item in batch:
+                item.done = True
+            if failed:
+                # Those writers see an error, so a later recovery must not replay their rows.
+                self._checkpoint()
+        if self.fh.tell() >= JOURNAL_CHECKPOINT_BYTES:
+            self._checkpoint()
+
+    def _plan(self, items: list, stack: contextlib.ExitStack) -> tuple:
+        """Prepare one log's rows and its journal record (None for ``append`` backends).
+
+        A text target is opened and flocked here and stays locked until the
+        commit ends, so its offset and header are those the write will see.
+        """
+        head = items[0]
+        rows = pd.concat([i.rows for i in items], ignore_index=True) if len(items) > 1 else head.rows
+        if head.lock is not None:
+            stack.enter_context(head.lock(head.equipment_type, head.equipment_id))
+        if head.prepare is not None:
+            rows = head.prepare(head.equipment_type, head.equipment_id, rows)
+            start = 0
+            for item in items:
+                item.rows, start = rows.iloc[start:start + len(item.rows)], start + len(item.rows)
+        target = head.storage.append_file(head.equipment_type, head.equipment_id, len(rows))
+        fh = record = None
+        if target is not None:
+            fh = stack.enter_context(_open_locked(target))
+            offset = fh.seek(0, os.SEEK_END)
+            record = {"path": str(target), "offset": offset,
+                      "data": rows.to_csv(index=False, header=offset == 0)}
+        return items, rows, fh, record
+
+    @staticmethod
+    def _fail(items: list, error: Exception) -> bool:
+        for item in items:
+            item.error = error
+            item.done = True
+        return True
+
+    def _write_journal(self, records: list):
+        if not records:
+            return
+        for record in records:
+            self.fh.write(json.dumps(record) + "\n")
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+
+    def _apply(self, items: list, rows: pd.DataFrame, fh, record):
+        head = items[0]
+        fn = head.storage.path(head.equipment_type, head.equipment_id)
+        before = head.storage.signature(fn)
+        if fh is None:
+            head.storage.append(head.equipment_type, head.equipment_id, rows)
+        else:
+            try:
+                fh.write(record["data"].encode("utf-8"))
+                fh.flush()
+            except BaseException:
+                fh.truncate(record["offset"])  # leave no torn rows behind a failed append
+                raise
+            self.dirty.add(Path(record["path"]))
+        # The rows are in the log: from here on the append has succeeded.
+        for item in items:
+            item.done = True
+        self.rows += len(rows)
+        key = log_key(head.equipment_type, head.equipment_id)
+        try:
+            if fh is not None:
+                head.storage.after_append(head.equipment_type, head.equipment_id)
+            if head.on_applied is not None:
+                after = head.storage.signature(fn)
+                head.on_applied(head.equipment_type, head.equipment_id, fn, before, after, rows)
+            self.failures.pop(key, None)
+        except Exception as e:
+            # The rows are safely written; derived state catches up on its next read.
+            self.failures[key] = {"error": f"{type(e).__name__}: {e}", "at": datetime.utcnow().isoformat()}
+
+    def _checkpoint(self):
+        for target in self.dirty:
+            try:
+                with open(target, "rb") as fh:
+                    os.fsync(fh.fileno())
+            except OSError:
+                pass
+        self.dirty.clear()
+        self.fh.seek(0)
+        self.fh.truncate()
+        os.fsync(self.fh.fileno())
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """Block this process's writers and checkpoint, for operations that rewrite logs in place."""
+        with self.commit_lock:
+            self._checkpoint()
+            yield
+
+    def close(self):
+        """Checkpoint and remove this process's journal; later appends are refused."""
+        with self.commit_lock:
+            self._checkpoint()
+            self.path.unlink(missing_ok=True)
+            self.fh.close()
+
+    def recover(self):
+        """Replay journals that a crashed process left partly or wholly unapplied.
+
+        Each process writes its own journal and holds its flock while alive,
+        so only journals whose lock can be taken are replayed; each record is
+        replayed under the target's flock.
+        """
+        for path in sorted(self.base.parent.glob(f"{self.base.stem}*{self.base.suffix}")):
+            try:
+                journal = open(path, "r+", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with journal:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # a live process's journal
+                for line in journal.readlines():
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn final write: that commit was never acknowledged
+                    self._replay(record)
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _replay(record: dict):
+        target, offset = Path(record["path"]), record["offset"]
+        data = record["data"].encode("utf-8")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with _open_locked(target) as fh:
+            size = fh.seek(0, os.SEEK_END)
+            if size >= offset + len(data) or size < offset:
+                return
+            fh.truncate(offset)
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def stats(self) -> dict:
+        return {"commits": self.commits, "appends": self.appends, "rows": self.rows,
+                "failures": dict(self.failures)}
+
+@_resource
+def _journal():
+    return AppendJournal(JOURNAL_FILE)
+
+# -------------------- Time Index --------------------
+# Sparse sidecar per CSV log mapping each day to the byte spans holding its
+# rows, so a date-range read parses only those bytes. The .idx file is
+# append-only ("day,start,end" lines after an "#inode,header_end" line) and
+# is extended from the last indexed offset on every append; a changed inode
+# or a shrunken log means the log was replaced and the index is rebuilt.
+INDEX_SCAN_BATCH = 50_000
+_DAY_PREFIX = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+class _DayIndex:
+    def __init__(self, inode: int, header_end: int):
+        self.inode = inode
+        self.header_end = header_end
+        self.indexed = header_end
+        self.days = {}
+        self.lines = 0
+
+    def add(self, day: str, start: int, end: int):
+        spans = self.days.setdefault(day, [])
+        if spans and spans[-1][1] == start:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+        self.indexed = max(self.indexed, end)
+        self.lines += 1
+
+    def spans(self, start=None, end=None) -> list:
+        lo = pd.Timestamp(start).strftime("%Y-%m-%d") if start is not None else None
+        hi = pd.Timestamp(end).strftime("%Y-%m-%d") if end is not None else None
+        out = [span for day, spans in self.days.items()
+               if day != "undated" and (lo is None or day >= lo) and (hi is None or day <= hi)
+               for span in spans]
+        out.sort()
+        merged = []
+        for s0, e0 in out:
+            if merged and merged[-1][1] == s0:
+                merged[-1][1] = e0
+            else:
+                merged.append([s0, e0])
+        return merged
+
+def _record_days(firsts: list) -> list:
+    """Day keys for raw timestamp fields; ISO prefixes are taken as-is."""
+    days = [f[:10] if _DAY_PREFIX.match(f) else None for f in firsts]
+    odd = [i for i, d in enumerate(days) if d is None]
+    if odd:
+        parsed = pd.to_datetime(pd.Series([firsts[i] for i in odd], dtype=object), errors='coerce', format="mixed")
+        for i, ts in zip(odd, parsed):
+            days[i] = ts.strftime("%Y-%m-%d") if pd.notna(ts) else "undated"
+    return days
+
+def _scan_record_spans(fn: Path, offset: int, limit: int):
+    """Yield batches of (day, start, end) for the CSV records in fn[offset:limit]."""
+    batch = []
+    with open(fn, "rb") as fh:
+        fh.seek(offset)
+        pos = rec_start = offset
+        in_quotes = False
+        first = None
+        for line in fh:
+            if pos >= limit:
+                break
+            if first is None:
+                first = line.split(b",", 1)[0].strip().strip(b'"').decode("utf-8", "replace")
+            if line.count(b'"') % 2:
+                in_quotes = not in_quotes
+            pos += len(line)
+            if not in_quotes:
+                batch.append((first, rec_start, pos))
+                rec_start, first = pos, None
+                if len(batch) >= INDEX_SCAN_BATCH:
+                    yield [(d, s0, e0) for d, (_, s0, e0) in zip(_record_days([b[0] for b in batch]), batch)]
+                    batch = []
+    if batch:
+        yield [(d, s0, e0) for d, (_, s0, e0) in zip(_record_days([b[0] for b in batch]), batch)]
+
+def _index_path(fn: Path) -> Path:
+    return LOG_INDEX_DIR / f"{fn.stem}.idx"
+
+def _load_day_index(fn: Path, inode: int):
+    path = _index_path(fn)
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as fh:
+        head = fh.readline().strip()
+        if not head.startswith("#"):
+            return None
+        ino, header_end = (int(v) for v in head[1:].split(","))
+        if ino != inode:
+            return None
+        index = _DayIndex(ino, header_end)
+        for line in fh:
+            day, s0, e0 = line.rstrip("\n").split(",")
+            index.add(day, int(s0), int(e0))
+    return index
+
+def _write_day_index(fn: Path, index: _DayIndex):
+    lines = [f"#{index.inode},{index.header_end}\n"]
+    lines += [f"{day},{s0},{e0}\n" for day, spans in index.days.items() for s0, e0 in spans]
+    LOG_INDEX_DIR.mkdir(exist_ok=True)
+    _atomic_write_text(_index_path(fn), "".join(lines))
+    index.lines = len(lines) - 1
+
+def time_index(fn: Path, committed: int, create: bool = True):
+    """Day index of ``fn`` covering its first ``committed`` bytes.
+
+    With ``create=False`` only an existing index is extended (the append
+    path), leaving the initial build to the first range read.
+    """
+    with _named_lock(f"idx:{fn.stem}"):
+        cache = _day_index_cache()
+        inode = fn.stat().st_ino
+        index = cache.get(fn)
+        if index is None or index.inode != inode:
+            index = _load_day_index(fn, inode)
+        if index is None and not create:
+            return None
+        if index is None or index.indexed > committed:
+            with open(fn, "rb") as fh:
+                header_end = len(fh.readline())
+            index = _DayIndex(inode, header_end)
+            _write_day_index(fn, index)
+        if index.indexed < committed:
+            with open(_index_path(fn), "a", encoding="utf-8") as out:
+                for batch in _scan_record_spans(fn, index.indexed, committed):
+                    for day, s0, e0 in batch:
+                        index.add(day, s0, e0)
+                    out.write("".join(f"{d},{s0},{e0}\n" for d, s0, e0 in batch))
+            if index.lines > 2 * sum(len(v) for v in index.days.values()) + 1000:
+                _write_day_index(fn, index)
+        cache[fn] = index
+        return index
+
+@_resource
+def _day_index_cache():
+    return {}
+
+def read_day_spans(fn: Path, committed: int, start=None, end=None) -> bytes:
+    """Header plus the raw CSV bytes of every record dated within [start, end]."""
+    index = time_index(fn, committed)
+    parts = []
+    with open(fn, "rb") as fh:
+        parts.append(fh.read(index.header_end))
+        for s0, e0 in index.spans(start, end):
+            fh.seek(s0)
+            parts.append(fh.read(e0 - s0))
+    return b"".join(parts)
+
+# -------------------- Frame Cache --------------------
+# Parsed logs shared by every session, keyed by (path, query) and valid only
+# while the log's (size, mtime) signature is unchanged. Least recently used
+# frames are evicted once CHECKLIST_CACHE_MB is exceeded.
+FRAME_CACHE_MB = float(os.environ.get("CHECKLIST_CACHE_MB", "256"))
+
+def _cast_like(new: pd.DataFrame, like: pd.DataFrame):
+    """``new`` with ``like``'s dtypes, or None if that would change a value.
+
+    An empty ``like`` has only placeholder dtypes, so it never matches.
+    """
+    if like.empty:
+        return None
+    try:
+        cast = new.astype(like.dtypes.to_dict())
+    except (TypeError, ValueError):
+        return None
+    for c, dtype in like.dtypes.items():
+        # astype truncates 2.5 -> 2 silently; a fresh parse would have kept floats.
+        if dtype.kind in "iub" and not np.array_equal(cast[c].to_numpy(dtype="float64"),
+                                                      pd.to_numeric(new[c]).to_numpy(dtype="float64")):
+            return None
+    return cast
+
+class FrameCache:
+    def __init__(self, budget_bytes: int):
+        self.budget = budget_bytes
+        self.frames = OrderedDict()
+        self.lock = threading.Lock()
+        self.used = 0
+        self.hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def _nbytes(df: pd.DataFrame) -> int:
+        return int(df.memory_usage(index=True, deep=True).sum())
+
+    def get(self, path: Path, query, signature):
+        with self.lock:
+            item = self.frames.get((path, query))
+            if item is None or item[0] != signature:
+                self.misses += 1
+                return None
+            self.frames.move_to_end((path, query))
+            self.hits += 1
+            return item[1]
+
+    def put(self, path: Path, query, signature, df: pd.DataFrame):
+        nbytes = self._nbytes(df)
+        if signature is None or nbytes > self.budget:
+            return
+        with self.lock:
+            self._store((path, query), (signature, df, nbytes))
+
+    def _store(self, key, item):
+        old = self.frames.pop(key, None)
+        if old is not None:
+            self.used -= old[2]
+        self.frames[key] = item
+        self.used += item[2]
+        while self.used > self.budget and self.frames:
+            _, (_, _, nbytes) = self.frames.popitem(last=False)
+            self.used -= nbytes
+            self.evictions += 1
+
+    def extend(self, path: Path, before, after, rows: pd.DataFrame):
+        """Fold appended rows into every cached query on ``path`` that was current at ``before``."""
+        if before is None or after is None:
+            return
+        with self.lock:
+            keys = [k for k in self.frames if k[0] == path]
+        if not keys:
+            return
+        typed = typed_log_frame(rows)
+        with self.lock:
+            for key in [k for k in keys if k in self.frames]:
+                signature, df, nbytes = self.frames.pop(key)
+                self.used -= nbytes
+                if signature != before:
+                    continue
+                columns, start, end = key[1]
+                new = _filter_range(typed, start, end)
+                new = new[list(df.columns)] if columns is not None else new.reindex(columns=df.columns)
+                if not new.empty:
+                    new = _cast_like(new, df)
+                    if new is None:
+                        continue  # dropped: the next read reloads with the right dtypes
+                    df = pd.concat([df, new], ignore_index=True)
+                self._store(key, (after, df, nbytes + self._nbytes(new)))
+
+    def forget(self, path: Path):
+        """Drop every cached query on ``path``."""
+        with self.lock:
+            for key in [k for k in self.frames if k[0] == path]:
+                self.used -= self.frames.pop(key)[2]
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.used = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.frames), "used": self.used, "budget": self.budget,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+@_resource
+def _frame_cache():
+    return FrameCache(int(FRAME_CACHE_MB * 1024 * 1024))
+
+# -------------------- Record Manifest --------------------
+# Per-log row count, size, mtime and first/last timestamp, persisted so the
+# sidebar and Dashboard never have to parse the logs just to count records.
+# One shard per log (a MetaStore), so an append rewrites only its own entry.
+MANIFEST_TS_CHUNK = 100_000
+
+@_resource
+def _manifest_store():
+    return MetaStore(MANIFEST_DIR, legacy=MANIFEST_FILE)
+
+def load_manifest() -> dict:
+    return _manifest_store().all()
+
+def _merge_ts_bounds(first, last, stamps):
+    ts = pd.to_datetime(pd.Series(stamps, dtype=object), errors='coerce').dropna()
+    if ts.empty:
+        return first, last
+    lo, hi = ts.min().isoformat(), ts.max().isoformat()
+    first = lo if first is None else min(first, lo)
+    last = hi if last is None else max(last, hi)
+    return first, last
+
+def scan_log_rows(fn: Path, offset: int = 0, first=None, last=None):
+    """Count CSV records from a byte offset (0 = start, header skipped).
+
+    Returns (rows, first_ts, last_ts) with timestamps as ISO strings. Uses the
+    csv module so quoted multi-line notes count as one record.
+    """
+    rows = 0
+    stamps = []
+    with open(fn, "rb") as raw:
+        raw.seek(offset)
+        reader = csv.reader(io.TextIOWrapper(raw, encoding="utf-8", newline=""))
+        if offset == 0:
+            next(reader, None)
+        for rec in reader:
+            if not rec:
+                continue
+            rows += 1
+            stamps.append(rec[0])
+            if len(stamps) >= MANIFEST_TS_CHUNK:
+                first, last = _merge_ts_bounds(first, last, stamps)
+                stamps = []
+    if stamps:
+        first, last = _merge_ts_bounds(first, last, stamps)
+    return rows, first, last
+
+def _manifest_entry(key: str, path: Path, signature, previous: dict = None) -> dict:
+    equipment_type, equipment_id = parse_log_key(key)
+    entry = {
+        "file": path.name,
+        "equipment_type": equipment_type,
+        "equipment_id": equipment_id,
+        "backend": STORAGE.name,
+        "size": signature[0],
+        "mtime": signature[1],
+    }
+    entry.update(STORAGE.summarize(path, signature, previous))
+    return entry
+
+def _is_current(entry: dict, signature) -> bool:
+    return bool(entry) and entry.get("backend") == STORAGE.name \
+        and (entry["size"], entry["mtime"]) == tuple(signature)
+
+@timed("manifest.refresh")
+def refresh_manifest() -> dict:
+    """Return the manifest, rescanning only logs whose size or mtime changed.
+
+    Changed logs are summarized in parallel; a log that cannot be read is
+    dropped from the manifest and its error kept for load_errors().
+    """
+    store = _manifest_store()
+    with _named_lock("manifest"):
+        manifest = store.all()
+        seen = set()
+        stale = []
+        for key, path, signature in STORAGE.entries():
+            seen.add(key)
+            cur = manifest.get(key)
+            if not _is_current(cur, signature):
+                stale.append((key, path, signature, cur))
+        for (key, *_), entry, error in load_parallel(lambda args: _manifest_entry(*args), stale):
+            record_load_error(key, error)
+            if error is None:
+                manifest[key] = entry
+                store.put(key, entry)
+            else:
+                manifest.pop(key, None)
+                store.delete(key)
+        for key in set(manifest) - seen:
+            del manifest[key]
+            store.delete(key)
+        _registry().ensure(seen)
+        return manifest
+
+def update_manifest(key: str, path: Path, before=None, appended: pd.DataFrame = None):
+    """Record a write to a log; ``before`` is its signature prior to appending ``appended``."""
+    store = _manifest_store()
+    with _named_lock(f"manifest:{key}"):
+        cur = store.get(key)
+        signature = STORAGE.signature(path)
+        if signature is None:
+            return
+        if appended is not None and before is not None and _is_current(cur, before):
+            first, last = _merge_ts_bounds(cur.get("first_ts"), cur.get("last_ts"), list(appended["timestamp"]))
+            cur.update(rows=cur["rows"] + len(appended), size=signature[0], mtime=signature[1],
+                       first_ts=first, last_ts=last)
+        else:
+            try:
+                cur = _manifest_entry(key, path, signature, cur)
+            except Exception:
+                store.delete(key)
+                return
+        store.put(key, cur)
+
+def total_record_count(manifest: dict) -> int:
+    return sum(e.get("rows", 0) for e in manifest.values())
+
+def type_counts(manifest: dict) -> dict:
+    counts = {}
+    for e in manifest.values():
+        counts[e["equipment_type"]] = counts.get(e["equipment_type"], 0) + 1
+    return counts
+
+# -------------------- Latest Reading Index --------------------
+# Newest row per log, keyed like the manifest and validated against the same
+# size/mtime, so Recent Activity never parses a whole log. Sharded per log
+# like the manifest, so an append rewrites only its own entry.
+TAIL_READ_BYTES = 8192
+
+@_resource
+def _latest_store():
+    return MetaStore(LATEST_INDEX_DIR, legacy=LATEST_INDEX_FILE)
+
+def load_latest_index() -> dict:
+    return _latest_store().all()
+
+def _row_record(df: pd.DataFrame, idx) -> dict:
+    return json.loads(df.loc[[idx]].to_json(orient="records", date_format="iso"))[0]
+
+def _latest_of(df: pd.DataFrame):
+    """Index label of the newest row by timestamp, falling back to the last row."""
+    if df.empty:
+        return None
+    if "timestamp" in df.columns:
+        ts = pd.to_datetime(df["timestamp"], errors='coerce')
+        if ts.notna().any():
+            return ts.idxmax()
+    return df.index[-1]
+
+def read_tail_rows(fn: Path, nbytes: int = TAIL_READ_BYTES) -> pd.DataFrame:
+    """Parse only the last ``nbytes`` of a log (grown until a full record fits)."""
+    size = fn.stat().st_size
+    with open(fn, "rb") as fh:
+        header = fh.readline()
+        while True:
+            start = max(len(header), size - nbytes)
+            fh.seek(start)
+            chunk = fh.read(size - start)
+            if start > len(header):
+                # Drop the partial record the seek landed in.
+                chunk = chunk[chunk.find(b"\n") + 1:]
+            try:
+                df = pd.read_csv(io.BytesIO(header + chunk), on_bad_lines="skip")
+            except Exception:
+                df = pd.DataFrame()
+            if "timestamp" in df.columns and not df.empty:
+                # A seek inside a quoted note can yield garbage rows; keep real readings.
+                ok = pd.to_datetime(df["timestamp"], errors='coerce', format="mixed").notna()
+                if "equipment_id" in df.columns:
+                    ok &= pd.to_numeric(df["equipment_id"], errors='coerce').notna()
+                df = df[ok]
+            if not df.empty or start == len(header):
+                return df
+            nbytes *= 4
+
+def read_latest_row(fn: Path):
+    df = read_tail_rows(fn)
+    idx = _latest_of(df)
+    return None if idx is None else _row_record(df, idx)
+
+def update_latest_index(key: str, path: Path, before=None, appended: pd.DataFrame = None):
+    """Record an append to a log; the newest row is re-read if the entry was stale."""
+    store = _latest_store()
+    with _named_lock(f"latest:{key}"):
+        cur = store.get(key)
+        signature = STORAGE.signature(path)
+        if cur and before is not None and _is_current(cur, before):
+            idx = _latest_of(appended)
+            row = _row_record(appended, idx)
+            old_ts = pd.to_datetime(cur["row"].get("timestamp") if cur["row"] else None, errors='coerce')
+            new_ts = pd.to_datetime(row.get("timestamp"), errors='coerce')
+            if cur["row"] is None or pd.isna(old_ts) or (pd.notna(new_ts) and new_ts >= old_ts):
+                cur["row"] = row
+        else:
+            try:
+                cur = {"row": STORAGE.latest_row(path), "backend": STORAGE.name}
+            except Exception:
+                store.delete(key)
+                return
+        cur.update(size=signature[0], mtime=signature[1])
+        store.put(key, cur)
+
+def iter_latest_readings(manifest: dict):
+    """Yield the newest row of every log in ``manifest`` as it becomes available.
+
+    Current index entries come first; stale ones are re-read from the tail in
+    parallel and yielded as they finish. Each is saved to its own shard once all are in.
+    """
+    store = _latest_store()
+    index = store.all()
+    stale = []
+    for key, entry in manifest.items():
+        cur = index.get(key)
+        if _is_current(cur, (entry["size"], entry["mtime"])):
+            if cur["row"]:
+                yield cur["row"]
+        else:
+            stale.append(key)
+    fresh = {}
+    read = lambda key: STORAGE.latest_row(STORAGE.path(manifest[key]["equipment_type"], manifest[key]["equipment_id"]))
+    for key, row, error in load_parallel(read, stale):
+        record_load_error(key, error)
+        if error is not None:
+            continue
+        fresh[key] = {"row": row, "backend": STORAGE.name, "size": manifest[key]["size"], "mtime": manifest[key]["mtime"]}
+        if row:
+            yield row
+    for key, cur in fresh.items():
+        with _named_lock(f"latest:{key}"):
+            # An append may have refreshed the entry meanwhile; keep the newer one.
+            old = store.get(key)
+            if not old or old.get("size", 0) <= cur["size"]:
+                store.put(key, cur)
+    for key in set(index) - set(manifest):
+        store.delete(key)
+
+def latest_readings(manifest: dict) -> list:
+    """Newest row of every log in ``manifest``; stale entries are re-read from the tail."""
+    return list(iter_latest_readings(manifest))
+
+# -------------------- CLI --------------------
+def _print_progress(text: str):
+    print(f"\r{text:<60}", end="", file=sys.stderr, flush=True)
+
+def _cmd_status(args) -> int:
+    manifest = refresh_manifest()
+    print(f"backend: {STORAGE.name}  equipment: {_registry().count()}  logs: {len(manifest)}  records: {total_record_count(manifest)}")
+    for equipment_type, count in equipment_counts().items():
+        print(f"  {equipment_type}: {count}")
+    for site, count in equipment_counts("site").items():
+        print(f"  site {site or '(none)'}: {count}")
+    for key, failure in sorted(load_errors().items()):
+        print(f"  unreadable {key}: {failure['error']}", file=sys.stderr)
+    return 0
+
+def _cmd_import(args) -> int:
+    path = Path(args.csv)
+    if args.stream or path.stat().st_size >= STREAM_IMPORT_BYTES:
+        count = stream_import_long(path, chunksize=args.chunk_rows,
+                                   progress=lambda r, w: _print_progress(f"{r:,} rows read, {w:,} written"))
+    else:
+        count = import_pivoted(pivot_long(pd.read_csv(path)),
+                               progress=lambda i, n, et, eid, k: _print_progress(f"{i}/{n} {et} {eid}: {k} rows"))
+    print(f"\nImported {count} rows", file=sys.stderr)
+    return 0
+
+def _cmd_scan(args) -> int:
+    found = scan_fleet_anomalies(z_thresh=args.z, window=args.window, equipment_type=args.type,
+                                 progress=lambda i, n, key, error: _print_progress(f"{i}/{n} {key}"))
+    print(file=sys.stderr)
+    if args.only_anomalies:
+        found = found[found["anomalies"] > 0]
+    if args.json:
+        print(found.to_json(orient="records", date_format="iso"))
+    else:
+        print(found.to_string(index=False) if not found.empty else "No logs scanned")
+    return 1 if any(load_errors()) else 0
+
+def _cmd_backup(args) -> int:
+    manifest = refresh_manifest()
+    keys = args.keys or list(manifest)
+    store = _backup_store()
+    snap = store.snapshot(keys, progress=lambda i, n, key: _print_progress(f"{i}/{n} {key}"))
+    print(f"\nSnapshot {snap['id']}: {len(snap['logs'])} logs, {snap['added_bytes'] / 2**20:.2f} MB new")
+    if not args.no_prune:
+        pruned = store.prune()
+        print(f"Pruned {len(pruned['snapshots'])} snapshots, freed {pruned['freed_bytes'] / 2**20:.2f} MB")
+    for key, error in snap["errors"].items():
+        print(f"  failed {key}: {error}", file=sys.stderr)
+    return 1 if snap["errors"] else 0
+
+def _cmd_restore(args) -> int:
+    as_of = datetime.fromisoformat(args.as_of) if args.as_of else None
+    done = restore_fleet(as_of, keys=args.keys or None, progress=lambda i, n, key: _print_progress(f"{i}/{n} {key}"))
+    print(file=sys.stderr)
+    failed = [r for r in done if r.get("error")]
+    for r in done:
+        if r.get("kept"):
+            print(f"{r['key']}: kept as is, no snapshot at or before {args.as_of or 'now'}")
+        else:
+            print(f"{r['key']}: {r.get('error') or 'restored from ' + r['snapshot']}")
+    return 1 if failed else 0
+
+def _cmd_compact(args) -> int:
+    with _journal().exclusive():
+        pass  # fsync logs and truncate the journal
+    STORAGE.compact()
+    print(f"Compacted {STORAGE.name} store")
+    return 0
+
+def _cmd_migrate(args) -> int:
+    target = STORAGE_BACKENDS[args.to]()
+    moved = migrate_csv_logs(target, progress=lambda i, n: _print_progress(f"{i}/{n} logs"))
+    print(f"\nMigrated {moved} rows to the {target.name} store")
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="checklist_core", description="CheckList batch operations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="summarize stored logs").set_defaults(func=_cmd_status)
+    p = sub.add_parser("import", help="import a long-format CSV (timestamp, equipment_type, equipment_id, parameter, value)")
+    p.add_argument("csv")
+    p.add_argument("--stream", action="store_true", help=f"read in chunks (automatic from {STREAM_IMPORT_BYTES // 2**20} MB)")
+    p.add_argument("--chunk-rows", type=int, default=IMPORT_CHUNK_ROWS)
+    p.set_defaults(func=_cmd_import)
+    p = sub.add_parser("scan", help="fleet-wide anomaly scan")
+    p.add_argument("--type", choices=EQUIPMENT_TYPES)
+    p.add_argument("--z", type=float, default=3.0)
+    p.add_argument("--window", type=int, default=24)
+    p.add_argument("--only-anomalies", action="store_true")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=_cmd_scan)
+    p = sub.add_parser("backup", help="incremental snapshot of every log (or the given keys)")
+    p.add_argument("keys", nargs="*")
+    p.add_argument("--no-prune", action="store_true", help="skip the retention policy")
+    p.set_defaults(func=_cmd_backup)
+    p = sub.add_parser("restore", help="restore logs as of a UTC time from snapshots")
+    p.add_argument("keys", nargs="*")
+    p.add_argument("--as-of", help="ISO timestamp, UTC (default: newest snapshot)")
+    p.set_defaults(func=_cmd_restore)
+    sub.add_parser("compact", help="checkpoint the journal and compact the store").set_defaults(func=_cmd_compact)
+    p = sub.add_parser("migrate", help="copy CSV logs into the Parquet or SQLite store")
+    p.add_argument("--to", choices=["parquet", "sqlite"], default="parquet")
+    p.set_defaults(func=_cmd_migrate)
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    finally:
+        _journal().close()  # leave nothing for the next process to replay
+
+# Everything public that is defined here (not re-exported stdlib names or modules).
+__all__ = [name for name, value in globals().items()
+           if not name.startswith("_") and name != "annotations"
+           and not isinstance(value, (types.ModuleType, _LazyModule, type(threading.Lock())))
+           and not (callable(value) and getattr(value, "__module__", __name__) != __name__)]
+
+if __name__ == "__main__":
+    sys.exit(main())